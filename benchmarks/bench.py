@@ -0,0 +1,499 @@
+"""
+PixelFrame benchmark suite.
+
+Times the diff, composite, report and capture stages on deterministic
+synthetic screenshots, plus CLI startup, and reports latency percentiles, throughput and peak
+RSS for each case. Everything runs offline: images are generated locally and
+capture points Chromium at a static fixture site served from localhost.
+
+    python benchmarks/bench.py                     # full suite
+    python benchmarks/bench.py --quick             # skip the 4K DPR 2 page
+    python benchmarks/bench.py --cases diff        # only cases starting with "diff"
+    python benchmarks/bench.py --cases diff gate   # full diff vs pass/fail gating
+    python benchmarks/bench.py --cases startup     # CLI startup time per light command
+    python benchmarks/bench.py --check             # exit 1 on a regression
+
+Every case runs in a fresh process so its peak RSS is its own. Results are
+written as JSON and compared with the previous results file, if there is one.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent))
+
+RESULTS_VERSION = 1
+# Bump when the synthetic images change, so cached copies are regenerated
+IMAGES_VERSION = 1
+FIXTURE_DIR = ROOT / "fixture"
+
+# Synthetic screenshot sizes in device pixels: (width, height, full run only)
+SIZES = {
+    "phone": (1170, 2532, False),           # 390x844 viewport at DPR 3
+    "tablet": (2048, 2732, False),          # 1024x1366 viewport at DPR 2
+    "desktop-full": (1920, 5400, False),    # full-page desktop capture
+    "4k-full-dpr2": (7680, 12960, True),    # 3840-wide full page at DPR 2
+}
+
+# Screenshot encodings compared on the desktop-full image
+ENCODE_SIZE = "desktop-full"
+ENCODINGS = {
+    "png": {},
+    "png-1": {"compress_level": 1},
+    "png-9": {"compress_level": 9},
+    "webp-m0": {"format": "webp", "webp_method": 0},
+    "webp-m4": {"format": "webp", "webp_method": 4},
+}
+
+# Capture fixture breakpoints: (name, width, height, device_scale_factor)
+CAPTURE_BREAKPOINTS = [
+    ("phone", 390, 844, 3.0),
+    ("desktop", 1920, 1080, 1.0),
+]
+
+
+# --- Synthetic screenshots ---------------------------------------------------
+
+def _draw_page(width, height, seed):
+    """A page-like image: header bar, text-line blocks and gradient 'photos'."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (249, 250, 251))
+    draw = ImageDraw.Draw(image)
+    unit = max(1, width // 390)
+    draw.rectangle([0, 0, width, 64 * unit], fill=(17, 24, 39))
+
+    gradient = Image.linear_gradient("L")
+    y = 96 * unit
+    margin = 24 * unit
+    while y < height - 48 * unit:
+        if rng.random() < 0.3:
+            block_h = rng.randint(120, 320) * unit
+            tint = tuple(rng.randint(60, 230) for _ in range(3))
+            ramp = gradient.resize((width - 2 * margin, block_h))
+            photo = Image.merge("RGB", [ramp.point(lambda v, c=c: v * c // 255) for c in tint])
+            image.paste(photo, (margin, y))
+            y += block_h + 32 * unit
+        else:
+            for _ in range(rng.randint(2, 8)):
+                line_w = rng.randint(width // 3, width - 2 * margin)
+                draw.rectangle([margin, y, margin + line_w, y + 10 * unit], fill=(75, 85, 99))
+                y += 22 * unit
+            y += 24 * unit
+    return image
+
+
+def _perturb(image, seed):
+    """A 'changed' copy: a few blocks recoloured and one strip shifted."""
+    from PIL import ImageDraw
+
+    rng = random.Random(seed)
+    changed = image.copy()
+    draw = ImageDraw.Draw(changed)
+    width, height = changed.size
+    for _ in range(6):
+        x, y = rng.randrange(width // 2), rng.randrange(height - height // 20)
+        draw.rectangle([x, y, x + width // 4, y + height // 40], fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    top = rng.randrange(height // 2)
+    strip = changed.crop((0, top, width, top + height // 10))
+    changed.paste(strip, (width // 100, top))
+    return changed
+
+
+def _write_pair(width, height, seed, path1, path2):
+    image = _draw_page(width, height, seed)
+    image.save(path1)
+    _perturb(image, seed + 1).save(path2)
+
+
+def synthetic_pair(workdir, size):
+    """Paths of the (baseline, changed) screenshots for ``size``, generated once."""
+    width, height, _ = SIZES[size]
+    directory = workdir / "images" / f"v{IMAGES_VERSION}"
+    path1 = directory / "run1" / f"{size}.png"
+    path2 = directory / "run2" / f"{size}.png"
+    if not (path1.exists() and path2.exists()):
+        path1.parent.mkdir(parents=True, exist_ok=True)
+        path2.parent.mkdir(parents=True, exist_ok=True)
+        print(f"  generating {size} ({width}x{height})...", flush=True)
+        # In its own process so the parent's RSS stays small
+        _in_child(_write_pair, width, height, sum(map(ord, size)), path1, path2)
+    return path1, path2
+
+
+# --- Cases -------------------------------------------------------------------
+# A case's setup runs once (untimed) and returns a callable; each call of that
+# callable is one timed sample and returns the units of work it processed,
+# optionally with a dict of extra figures (e.g. output bytes) for the results.
+
+def _diff_case(workdir, size):
+    from pixelframe.engine.diff import generate_diff
+
+    img1, img2 = synthetic_pair(workdir, size)
+    out = workdir / "out" / f"diff_{size}.png"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    width, height, _ = SIZES[size]
+
+    def run():
+        generate_diff(img1, img2, out)
+        return width * height / 1e6
+    return run, "MP"
+
+
+def _gate_case(workdir, size):
+    from pixelframe.engine.gate import gate_diff
+
+    img1, img2 = synthetic_pair(workdir, size)
+    width, height, _ = SIZES[size]
+
+    def run():
+        gate = gate_diff(img1, img2, 95.0)
+        return width * height / 1e6, {"exact": gate.exact}
+    return run, "MP"
+
+
+def _sizes(quick):
+    return [name for name, (_, _, full) in SIZES.items() if not (quick and full)]
+
+
+def _screenshots(workdir, quick):
+    return [synthetic_pair(workdir, size)[0] for size in _sizes(quick)]
+
+
+def _clear_cache():
+    from pixelframe.engine.thumbcache import cache_root
+
+    shutil.rmtree(cache_root(), ignore_errors=True)
+
+
+def _composite_case(workdir, quick, cached):
+    from pixelframe.engine.composite import create_composite
+
+    paths = _screenshots(workdir, quick)
+    out = workdir / "out" / "composite.png"
+
+    def run():
+        if not cached:
+            _clear_cache()
+        create_composite(paths, out, breakpoint_names=[p.stem for p in paths])
+        return len(paths)
+    return run, "images"
+
+
+def _report_case(workdir, quick, assets):
+    from pixelframe.engine.capture import CaptureResult
+    from pixelframe.engine.composite import create_composite
+    from pixelframe.engine.config import Breakpoint, PixelFrameConfig
+    from pixelframe.engine.report import generate_report
+
+    run_path = workdir / "out" / f"report-{assets}"
+    screenshots = run_path / "screenshots"
+    screenshots.mkdir(parents=True, exist_ok=True)
+    results = []
+    for size in _sizes(quick):
+        source = synthetic_pair(workdir, size)[0]
+        width, height, _ = SIZES[size]
+        target = screenshots / source.name
+        shutil.copyfile(source, target)
+        results.append(CaptureResult(page="", breakpoint=Breakpoint(size, width, height), path=target))
+    grid = run_path / "composite" / "grid.png"
+    create_composite([r.path for r in results], grid)
+
+    config = PixelFrameConfig(
+        url="http://localhost/", output_dir=str(workdir / "out"), full_page=True,
+        breakpoints=[r.breakpoint for r in results],
+        report_assets=assets, report_formats=["html", "json"],
+    )
+
+    def run():
+        # Start cold, so thumbnails are rebuilt every sample
+        shutil.rmtree(run_path / "report", ignore_errors=True)
+        _clear_cache()
+        generate_report(config, run_path, {"": grid}, results)
+        return len(results)
+    return run, "images"
+
+
+def _encode_case(workdir, quick, settings):
+    from pixelframe.engine.capture import save_screenshot
+    from pixelframe.engine.config import ScreenshotConfig
+
+    source = synthetic_pair(workdir, ENCODE_SIZE)[0]
+    data = source.read_bytes()
+    settings = ScreenshotConfig(**settings)
+    target = workdir / "out" / f"encode.{settings.format}"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    width, height, _ = SIZES[ENCODE_SIZE]
+
+    def run():
+        path = save_screenshot(data, target, settings)
+        return width * height / 1e6, {"bytes": path.stat().st_size}
+    return run, "MP"
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _capture_case(workdir, quick):
+    from pixelframe.engine.browser import BrowserManager
+    from pixelframe.engine.capture import capture_screenshots
+    from pixelframe.engine.config import Breakpoint, PageConfig, PixelFrameConfig
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=str(FIXTURE_DIR)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    browser = BrowserManager()
+    try:
+        browser.start()
+    except Exception as e:
+        server.shutdown()
+        raise Skip(f"browser unavailable: {str(e).splitlines()[0]}")
+
+    config = PixelFrameConfig(
+        url=f"http://127.0.0.1:{server.server_address[1]}/",
+        output_dir=str(workdir / "out"),
+        full_page=True,
+        breakpoints=[Breakpoint(*bp) for bp in CAPTURE_BREAKPOINTS],
+        pages=[PageConfig("index", "index.html"), PageConfig("pricing", "pricing.html")],
+    )
+    run_path = workdir / "out" / "capture"
+
+    def run():
+        shutil.rmtree(run_path, ignore_errors=True)
+        return len(capture_screenshots(config, run_path, browser))
+    # The browser and server live until the case's process exits
+    return run, "screenshots"
+
+
+def _startup_case(workdir, quick, command):
+    from check_imports import LIGHT_COMMANDS, command_line
+
+    output = workdir / "out" / "startup"
+    output.mkdir(parents=True, exist_ok=True)
+    args = command_line(LIGHT_COMMANDS[command], output)
+
+    def run():
+        subprocess.run(args, cwd=ROOT.parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        return 1
+    return run, "starts"
+
+
+CASES = {
+    **{f"diff:{size}": (partial(_diff_case, size=size), full) for size, (_, _, full) in SIZES.items()},
+    **{f"gate:{size}": (partial(_gate_case, size=size), full) for size, (_, _, full) in SIZES.items()},
+    "composite": (partial(_composite_case, cached=False), False),
+    "composite:cached": (partial(_composite_case, cached=True), False),
+    "report:linked": (partial(_report_case, assets="linked"), False),
+    "report:thumbnails": (partial(_report_case, assets="thumbnails"), False),
+    "report:inline": (partial(_report_case, assets="inline"), False),
+    **{f"encode:{label}": (partial(_encode_case, settings=settings), False) for label, settings in ENCODINGS.items()},
+    "capture": (_capture_case, False),
+    **{f"startup:{command}": (partial(_startup_case, command=command), False) for command in ("import", "version", "devices", "help", "runs")},
+}
+
+
+class Skip(Exception):
+    """The case cannot run on this machine."""
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _run_case(name, workdir, quick, warmup, repeat):
+    """Body of a case process: set up, warm up, then time ``repeat`` samples."""
+    factory, _ = CASES[name]
+    kwargs = {} if name.startswith(("diff:", "gate:")) else {"quick": quick}
+    try:
+        run, unit = factory(workdir, **kwargs)
+    except Skip as e:
+        return {"skipped": str(e)}
+    setup_rss = _peak_rss_mb()
+    for _ in range(warmup):
+        run()
+    samples = []
+    units, info = 0, {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        units = run()
+        samples.append(time.perf_counter() - start)
+        if isinstance(units, tuple):
+            units, info = units
+    return {"samples": samples, "units": units, "unit": unit, "info": info, "setup_rss_mb": setup_rss, "peak_rss_mb": _peak_rss_mb()}
+
+
+def _in_child(fn, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+# --- Statistics and reporting ------------------------------------------------
+
+def percentile(samples, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(raw):
+    if "skipped" in raw:
+        return raw
+    samples_ms = [s * 1000 for s in raw["samples"]]
+    p50 = percentile(samples_ms, 50)
+    return {
+        "samples_ms": [round(s, 2) for s in samples_ms],
+        "p50_ms": round(p50, 2),
+        "p90_ms": round(percentile(samples_ms, 90), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+        "units": raw["units"],
+        "throughput": round(raw["units"] / (p50 / 1000), 3) if p50 else None,
+        "throughput_unit": f"{raw['unit']}/s",
+        "setup_rss_mb": raw["setup_rss_mb"],
+        "peak_rss_mb": raw["peak_rss_mb"],
+        **raw["info"],
+    }
+
+
+def environment():
+    import PIL
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    try:
+        from importlib.metadata import version
+        pixelframe_version = version("pixelframe")
+    except Exception:
+        pixelframe_version = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": multiprocessing.cpu_count(),
+        "pixelframe": pixelframe_version,
+        "pillow": PIL.__version__,
+        "numpy": numpy_version,
+    }
+
+
+def compare(current, previous, tolerance):
+    """Per-case relative change of p50 latency and peak RSS; returns (rows, regressions)."""
+    rows = []
+    regressions = []
+    for name, case in current["cases"].items():
+        before = previous.get("cases", {}).get(name)
+        if "skipped" in case or not before or "skipped" in before:
+            continue
+        deltas = {}
+        for metric in ("p50_ms", "peak_rss_mb"):
+            if before.get(metric):
+                deltas[metric] = (case[metric] - before[metric]) / before[metric] * 100
+                if deltas[metric] > tolerance:
+                    regressions.append(f"{name} {metric} +{deltas[metric]:.1f}%")
+        rows.append((name, deltas))
+    return rows, regressions
+
+
+def _print_results(results, deltas):
+    from rich.console import Console
+    from rich.table import Table
+
+    by_name = dict(deltas)
+    table = Table(title="PixelFrame benchmarks")
+    for column in ("Case", "p50 ms", "p90 ms", "p99 ms", "Throughput", "Peak RSS MB", "Output", "vs previous"):
+        table.add_column(column, justify="left" if column == "Case" else "right")
+    for name, case in results["cases"].items():
+        if "skipped" in case:
+            table.add_row(name, "[dim]skipped[/dim]", "", "", "", "", "", f"[dim]{case['skipped'][:60]}[/dim]")
+            continue
+        change = by_name.get(name, {})
+        change_text = ", ".join(
+            f"{'[red]' if d > 0 else '[green]'}{label} {d:+.1f}%[/]"
+            for label, d in (("time", change.get("p50_ms")), ("rss", change.get("peak_rss_mb")))
+            if d is not None
+        )
+        table.add_row(
+            name, f"{case['p50_ms']:.1f}", f"{case['p90_ms']:.1f}", f"{case['p99_ms']:.1f}",
+            f"{case['throughput']} {case['throughput_unit']}", f"{case['peak_rss_mb']:.0f}",
+            f"{case['bytes'] / 1024:.0f} KiB" if "bytes" in case else "", change_text,
+        )
+    Console().print(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Skip the 4K DPR 2 full page")
+    parser.add_argument("--cases", nargs="*", default=[], help="Only run cases whose name starts with one of these")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed samples per case")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs before sampling")
+    parser.add_argument("--workdir", type=Path, default=ROOT / ".work", help="Where images and outputs are kept")
+    parser.add_argument("--output", type=Path, default=None, help="Results file (default: <workdir>/results.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="Previous results to compare with (default: the existing --output)")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Allowed slowdown or RSS growth in percent")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if any case regressed beyond --tolerance")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir.resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    # Keep the thumbnail cache out of the user's, so cold cases can clear it
+    os.environ["PIXELFRAME_CACHE_DIR"] = str(workdir / "cache")
+    output = args.output or workdir / "results.json"
+    previous_path = args.compare or output
+    previous = json.loads(previous_path.read_text(encoding="utf-8")) if previous_path.exists() else None
+
+    selected = [
+        name for name, (_, full) in CASES.items()
+        if not (args.quick and full) and (not args.cases or any(name.startswith(c) for c in args.cases))
+    ]
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "quick": args.quick,
+        "repeat": args.repeat,
+        "environment": environment(),
+        "cases": {},
+    }
+    # Generate the synthetic screenshots up front, outside the measured processes
+    for size in _sizes(args.quick):
+        synthetic_pair(workdir, size)
+    for name in selected:
+        print(f"{name}...", flush=True)
+        raw = _in_child(_run_case, name, workdir, args.quick, args.warmup, args.repeat)
+        results["cases"][name] = summarize(raw)
+
+    rows, regressions = compare(results, previous, args.tolerance) if previous else ([], [])
+    _print_results(results, rows)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=1), encoding="utf-8")
+    print(f"Results written to {output}" + (f" (compared with {previous_path})" if previous else ""))
+
+    if regressions:
+        print(f"Regressions beyond {args.tolerance}%: " + "; ".join(regressions))
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Guard against slow CLI startup.
+
+Runs each lightweight command in a fresh interpreter and fails if it loaded
+one of the heavy dependencies. Those are only needed by the commands that
+capture, diff or render, which import them when they run.
+
+    python benchmarks/check_imports.py             # exit 1 if a command loads a heavy module
+    python benchmarks/check_imports.py --verbose   # also print each command's module count
+
+The same commands are timed by ``bench.py --cases startup``.
+"""
+from pathlib import Path
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+
+ROOT = Path(__file__).resolve().parent
+
+# Top-level packages a light command must not import
+HEAVY_MODULES = ("playwright", "PIL", "numpy", "jinja2")
+
+# Commands that must stay light; "{output}" is replaced by an empty output directory
+LIGHT_COMMANDS = {
+    "import": None,
+    "version": ["--version"],
+    "help": ["--help"],
+    "devices": ["devices", "list"],
+    "capture-help": ["capture", "run", "--help"],
+    "diff-help": ["diff", "run", "--help"],
+    "runs": ["runs", "list", "{output}"],
+}
+
+# Runs the CLI in-process, then reports which heavy packages ended up in sys.modules
+_PROBE = """
+import json, sys
+args = json.loads(sys.argv[1])
+if args is None:
+    import pixelframe.cli.main
+else:
+    from pixelframe.cli.main import app
+    try:
+        app(args, prog_name="pixelframe")
+    except SystemExit:
+        pass
+heavy = json.loads(sys.argv[2])
+loaded = sorted({name.split(".")[0] for name in sys.modules} & set(heavy))
+print("\\n" + json.dumps({"loaded": loaded, "modules": len(sys.modules)}))
+"""
+
+
+def command_line(args, output):
+    """The interpreter command line that runs ``args`` (None: just import the CLI)."""
+    if args is not None:
+        args = [a.replace("{output}", str(output)) for a in args]
+    return [sys.executable, "-c", _PROBE, json.dumps(args), json.dumps(HEAVY_MODULES)]
+
+
+def probe(args, output):
+    """Run one command in a fresh interpreter; returns {"loaded": [...], "modules": n}."""
+    proc = subprocess.run(
+        command_line(args, output), capture_output=True, text=True, cwd=ROOT.parent, check=False,
+    )
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        raise RuntimeError(f"probe failed:\n{proc.stderr or proc.stdout}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--verbose", action="store_true", help="Print the module count of every command")
+    args = parser.parse_args(argv)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as output:
+        for name, command in LIGHT_COMMANDS.items():
+            result = probe(command, output)
+            if result["loaded"]:
+                failures.append(f"{name}: imports {', '.join(result['loaded'])}")
+            if args.verbose or result["loaded"]:
+                print(f"{name:<14} {result['modules']:>4} modules  {'FAIL ' + ', '.join(result['loaded']) if result['loaded'] else 'ok'}")
+
+    if failures:
+        print("Light commands import heavy dependencies at startup; import them inside the command instead:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print(f"{len(LIGHT_COMMANDS)} light commands start without {', '.join(HEAVY_MODULES)}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,21 @@
 import typer
-from typing import Optional
-from rich.console import Console
-from rich.panel import Panel
-from rich.align import Align
+from dataclasses import asdict
+from typing import List, Optional
 
 from pixelframe import __version__
 from pixelframe.engine.logger import setup_logger
-from pixelframe.engine.config import PixelFrameConfig, DEFAULT_BREAKPOINTS, Breakpoint
+from pixelframe.engine.config import (
+    PixelFrameConfig, DEFAULT_BREAKPOINTS, DEFAULT_REPORT_FORMATS, ENGINES, REPORT_ASSETS, Breakpoint, parse_report_formats,
+    parse_network, parse_screenshot, parse_shard,
+)
 from pixelframe.engine.run_manager import create_run_directory
-from pixelframe.engine.browser import BrowserManager
-from pixelframe.engine.capture import capture_screenshots
-from pixelframe.engine.composite import create_composite
-from pixelframe.engine.report import generate_report
+from pixelframe.engine import timing
 from pixelframe.engine.devices import get_devices, list_devices
 
+# Playwright, Pillow, NumPy, Jinja2 and Rich are imported inside the commands that
+# use them, so `--version`, `--help` and `devices list` start without loading them.
+# benchmarks/check_imports.py guards this.
+
 # Root app
 app = typer.Typer(
     help="PixelFrame - The Professional Visual Regression & Responsive Testing Engine.",
@@ -23,6 +25,10 @@ app = typer.Typer(
 
 def version_callback(value: bool):
     if value:
+        from rich.console import Console
+        from rich.panel import Panel
+        from rich.align import Align
+
         console = Console()
         logo = """[bold cyan]
   _____ _          _ ______                         
@@ -73,6 +79,33 @@ def run_diff(
     ),
     open_report: bool = typer.Option(False, "--open-report", help="Open the generated HTML report in browser"),
     json_output: bool = typer.Option(False, "--json", help="Output final results as JSON for CI"),
+    backend: str = typer.Option("auto", "--backend", help="Diff backend: 'auto', 'numpy' or 'pil'"),
+    mode: str = typer.Option(
+        "pixel", "--mode",
+        help="How pixels are compared: 'pixel', 'tolerance', 'antialias' or 'ssim' (all but 'pixel' need NumPy)"
+    ),
+    tolerance: int = typer.Option(
+        8, "--tolerance", min=0, max=255, help="Largest per-channel difference (0-255) the 'tolerance' mode ignores"
+    ),
+    aa_threshold: float = typer.Option(
+        0.1, "--aa-threshold", min=0.0, max=1.0, help="Colour difference threshold (0-1) of the 'antialias' mode"
+    ),
+    tile_rows: int = typer.Option(
+        None, "--tile-rows", min=16,
+        help="Stream screenshots in bands of this many rows (NumPy backend). Automatic for very large pages."
+    ),
+    gate: bool = typer.Option(
+        False, "--gate",
+        help="Only prove each pair is above or below the threshold (NumPy). Failing pairs still get exact scores and overlays."
+    ),
+    jobs: int = typer.Option(1, "--jobs", "-j", min=1, help="Number of screenshot pairs to diff in parallel processes"),
+    use_hashes: bool = typer.Option(True, "--hash/--no-hash", help="Skip pairs whose file or pixel hashes match"),
+    report_assets: str = typer.Option(
+        "linked", "--report-assets",
+        help="How the report references images: 'linked', 'thumbnails' or 'inline' (self-contained)"
+    ),
+    shard: str = typer.Option(None, "--shard", help="Diff only this node's share of the pairs, e.g. 2/4 (see 'pixelframe merge')"),
+    trace: bool = typer.Option(False, "--trace", help="Also write a Chrome trace (trace.json) of the stage timings"),
 ):
     """
     Compare screenshots between two runs.
@@ -81,11 +114,35 @@ def run_diff(
     Returns exit code 1 if any comparison falls below the threshold.
     """
     from pathlib import Path
-    from pixelframe.engine.diff import generate_diff
-    from pixelframe.engine.report import _image_to_base64
-    from jinja2 import Environment, FileSystemLoader
-    from datetime import datetime
+    from pixelframe.engine.diff import BACKENDS, MODES, DiffMode
+    from pixelframe.engine.compare import diff_summary, plan_diffs, run_diffs, write_diff_report
+    from pixelframe.engine.manifest import RunManifest
     
+    if backend not in BACKENDS:
+        logger.error(f"Unknown diff backend '{backend}'. Expected one of: {', '.join(BACKENDS)}.")
+        raise typer.Exit(code=1)
+    if mode not in MODES:
+        logger.error(f"Unknown diff mode '{mode}'. Expected one of: {', '.join(MODES)}.")
+        raise typer.Exit(code=1)
+    if mode != "pixel" and backend == "pil":
+        logger.error(f"The '{mode}' diff mode requires the NumPy backend.")
+        raise typer.Exit(code=1)
+    diff_mode = DiffMode(mode, tolerance=tolerance, aa_threshold=aa_threshold)
+    if report_assets not in REPORT_ASSETS:
+        logger.error(f"Unknown report assets mode '{report_assets}'. Expected one of: {', '.join(REPORT_ASSETS)}.")
+        raise typer.Exit(code=1)
+    if tile_rows and backend == "pil":
+        logger.error("--tile-rows requires the NumPy backend.")
+        raise typer.Exit(code=1)
+    if gate and backend == "pil":
+        logger.error("--gate requires the NumPy backend.")
+        raise typer.Exit(code=1)
+    try:
+        shard = parse_shard(shard) if shard else None
+    except ValueError as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+
     logger.info(f"Visual diffing {run1} vs {run2}")
     p1 = Path(run1) / "screenshots"
     p2 = Path(run2) / "screenshots"
@@ -96,53 +153,51 @@ def run_diff(
         
     out_dir = Path(output) if output else Path(run2) / "diff"
     out_dir.mkdir(parents=True, exist_ok=True)
-    
-    diff_results = []
-    all_passed = True
-    
-    for img1_path in p1.glob("*.png"):
-        img2_path = p2 / img1_path.name
-        if not img2_path.exists():
-            logger.warning(f"Screenshot {img1_path.name} missing in run2. Skipping.")
-            continue
-            
-        diff_path = out_dir / f"diff_{img1_path.name}"
-        
-        logger.info(f"Diffing {img1_path.name}...")
-        similarity = generate_diff(img1_path, img2_path, diff_path)
-        
-        passed = similarity >= threshold
-        if not passed:
-            all_passed = False
-            
-        diff_results.append({
-            "name": img1_path.stem,
-            "similarity": similarity,
-            "passed": passed,
-            "img1_b64": _image_to_base64(img1_path),
-            "img2_b64": _image_to_base64(img2_path),
-            "diff_b64": _image_to_base64(diff_path)
-        })
-        
-    if not diff_results:
-        logger.error("No comparable screenshots found.")
-        raise typer.Exit(code=1)
-        
-    # Generate HTML report
-    templates_dir = Path(__file__).parent.parent / "templates"
-    env = Environment(loader=FileSystemLoader(templates_dir))
-    template = env.get_template("diff_report.html")
-    
-    html_content = template.render(
-        run1_name=Path(run1).name,
-        run2_name=Path(run2).name,
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        threshold=threshold,
-        diff_results=diff_results
-    )
-    
-    report_file = out_dir / "diff_report.html"
-    report_file.write_text(html_content, encoding="utf-8")
+    timing.record()
+    try:
+        manifest1 = RunManifest(p1)
+        manifest2 = manifest1 if p1.resolve() == p2.resolve() else RunManifest(p2)
+        plan = plan_diffs(p1, p2, out_dir, manifests=(manifest1, manifest2), shard=shard)
+        manifests = (manifest1, manifest2) if use_hashes else None
+
+        diff_results = []
+        all_passed = True
+
+        results = run_diffs(
+            plan.tasks, jobs=jobs, backend=backend, tile_rows=tile_rows, manifests=manifests,
+            assets=report_assets, mode=diff_mode, gate=threshold if gate else None,
+        )
+        for result in results:
+            passed = result.error is None and result.similarity >= threshold
+            if not passed:
+                all_passed = False
+
+            diff_results.append({
+                "name": result.name,
+                "similarity": result.similarity,
+                "passed": passed,
+                "error": result.error,
+                "identical": result.identical,
+                "masked": result.masked,
+                "gated": result.gated,
+                "img1": result.img1,
+                "img2": result.img2,
+                "diff": result.diff
+            })
+
+        # A shard can legitimately get no pairs when there are more shards than screenshots
+        if not diff_results and not (shard and plan.shard and plan.shard["total"]):
+            logger.error("No comparable screenshots found.")
+            raise typer.Exit(code=1)
+
+        # Generate HTML report (and diff_results.json for `pixelframe merge`)
+        with timing.span("diff.report"):
+            summary = diff_summary(Path(run1).name, Path(run2).name, threshold, diff_results, plan, diff_mode)
+            report_file = write_diff_report(out_dir, summary)
+        timings = _write_timings(out_dir, trace)
+    finally:
+        # Also on the early exits above
+        timing.stop()
     
     if open_report:
         import webbrowser
@@ -153,7 +208,15 @@ def run_diff(
         print(json.dumps({
             "status": "PASSED" if all_passed else "FAILED",
             "threshold": threshold,
+            "score": summary["score"],
             "breakpoints": len(diff_results),
+            "identical": sum(1 for r in diff_results if r["identical"]),
+            "gated": summary["gated"],
+            "errors": [{"name": r["name"], "error": r["error"]} for r in diff_results if r["error"]],
+            "added": plan.added,
+            "removed": plan.removed,
+            "shard": str(shard) if shard else None,
+            "timings": timings,
             "report_path": str(report_file.resolve())
         }))
     else:
@@ -163,14 +226,21 @@ def run_diff(
         logger.info(f"PixelFrame Engine: Diff report generated at {report_file}")
         
         console = Console()
-        table = Table(title="Visual Diff Results")
+        table = Table(title="Visual Diff Results" if mode == "pixel" else f"Visual Diff Results ({mode} mode)")
         table.add_column("Breakpoint", style="cyan")
         table.add_column("Similarity", justify="right")
         table.add_column("Status", justify="center")
         
         for r in diff_results:
+            if r['error']:
+                table.add_row(r['name'], "-", "[red]ERROR[/red]")
+                continue
             status_str = "[green]PASS[/green]" if r['passed'] else "[red]FAIL[/red]"
-            table.add_row(r['name'], f"{r['similarity']}%", status_str)
+            table.add_row(r['name'], f"{'>= ' if r['gated'] else ''}{r['similarity']}%", status_str)
+        for name in plan.added:
+            table.add_row(name, "-", "[yellow]ADDED[/yellow]")
+        for name in plan.removed:
+            table.add_row(name, "-", "[yellow]REMOVED[/yellow]")
             
         summary_panel = Panel(
             table, 
@@ -204,9 +274,79 @@ def run_capture(
     output: str = typer.Option("pixelframe-output", help="Output directory"),
     full_page: bool = typer.Option(True, help="Capture full page"),
     devices: str = typer.Option(None, help="Comma-separated list of devices to emulate"),
+    workers: int = typer.Option(None, "--workers", "-w", min=1, help="Number of breakpoints to capture concurrently"),
+    engine: str = typer.Option(None, "--engine", help="Capture engine: 'sync' or 'async'"),
+    report_assets: str = typer.Option(
+        None, "--report-assets",
+        help="How the report references images: 'linked', 'thumbnails' or 'inline' (self-contained)"
+    ),
+    report_format: str = typer.Option(
+        None, "--report-format",
+        help="Comma-separated report formats: html, pdf, json (default: html)"
+    ),
+    defer_pdf: bool = typer.Option(
+        False, "--defer-pdf",
+        help="Don't start the background PDF render; run 'pixelframe report render' later"
+    ),
+    screenshot_format: str = typer.Option(
+        None, "--screenshot-format",
+        help="Screenshot file format: 'png' (default) or 'webp' (lossless)"
+    ),
+    compress_level: int = typer.Option(
+        None, "--compress-level", min=0, max=9,
+        help="Re-encode PNG screenshots at this zlib level (default: keep Chromium's PNG)"
+    ),
+    store: bool = typer.Option(
+        None, "--store/--no-store",
+        help="Keep screenshots once in <output>/objects and hard-link them into the run"
+    ),
+    network: str = typer.Option(
+        None, "--network",
+        help="Response cache: 'live' (default), 'cache', 'record' or 'offline' (replay recorded responses only)"
+    ),
+    block: List[str] = typer.Option(
+        None, "--block",
+        help="Abort requests to hosts matching this pattern, e.g. '*.doubleclick.net' (repeatable)"
+    ),
+    har: str = typer.Option(None, "--har", help="Replay responses from this HAR file before the network"),
+    shard: str = typer.Option(
+        None, "--shard",
+        help="Capture only this node's share of the screenshots, e.g. 2/4 (combine with 'pixelframe merge')"
+    ),
+    shard_timings: str = typer.Option(
+        None, "--shard-timings",
+        help="Run whose capture times balance the shards; give every node the same one (default: equal weights)"
+    ),
+    incremental: bool = typer.Option(
+        None, "--incremental/--no-incremental",
+        help="Reuse earlier screenshots of pages whose DOM and styles are unchanged"
+    ),
+    since: str = typer.Option(
+        None, "--since",
+        help="With --incremental, reuse screenshots from this run only (default: the newest run with each one)"
+    ),
+    daemon: bool = typer.Option(
+        None, "--daemon/--no-daemon",
+        help="Capture on the running 'pixelframe daemon' (default: use it if one is running)"
+    ),
+    trace: bool = typer.Option(False, "--trace", help="Also write a Chrome trace (trace.json) of the stage timings"),
     open_report: bool = typer.Option(False, "--open-report", help="Open the generated HTML report in browser"),
     json_output: bool = typer.Option(False, "--json", help="Output final results as JSON for CI"),
 ):
+    if engine and engine not in ENGINES:
+        logger.error(f"Unknown engine '{engine}'. Expected one of: {', '.join(ENGINES)}.")
+        raise typer.Exit(code=1)
+    if report_assets and report_assets not in REPORT_ASSETS:
+        logger.error(f"Unknown report assets mode '{report_assets}'. Expected one of: {', '.join(REPORT_ASSETS)}.")
+        raise typer.Exit(code=1)
+    report_formats = None
+    if report_format:
+        try:
+            report_formats = parse_report_formats(report_format)
+        except ValueError as e:
+            logger.error(str(e))
+            raise typer.Exit(code=1)
+
     if config_file:
         from pixelframe.engine.config import load_config
         logger.info(f"Loading config from {config_file}")
@@ -219,6 +359,12 @@ def run_capture(
         # CLI overrides
         if url: config.url = url
         if output != "pixelframe-output": config.output_dir = output
+        if workers: config.workers = workers
+        if engine: config.engine = engine
+        if report_assets: config.report_assets = report_assets
+        if report_formats is not None: config.report_formats = report_formats
+        if store is not None: config.store = store
+        if incremental is not None: config.incremental = incremental
         
         if devices:
             device_names = [d.strip() for d in devices.split(",")]
@@ -264,46 +410,99 @@ def run_capture(
             output_dir=output,
             full_page=full_page,
             breakpoints=breakpoints,
+            workers=workers or 1,
+            engine=engine or "sync",
+            report_assets=report_assets or "linked",
+            report_formats=report_formats if report_formats is not None else list(DEFAULT_REPORT_FORMATS),
+            store=bool(store),
+            incremental=bool(incremental),
         )
 
-    run_path = create_run_directory(config.output_dir)
-    browser = BrowserManager()
-    browser.start()
+    if screenshot_format or compress_level is not None:
+        overrides = {"format": screenshot_format, "compress_level": compress_level}
+        try:
+            config.screenshot = parse_screenshot({
+                **asdict(config.screenshot), **{k: v for k, v in overrides.items() if v is not None}
+            })
+        except ValueError as e:
+            logger.error(str(e))
+            raise typer.Exit(code=1)
 
-    try:
-        image_paths = capture_screenshots(config, run_path, browser)
-        if not json_output: logger.info("PixelFrame Engine: Screenshots captured successfully.")
+    if network or block or har:
+        overrides = {"mode": network, "har": har, "block": [*config.network.block, *(block or [])]}
+        try:
+            config.network = parse_network({
+                **asdict(config.network), **{k: v for k, v in overrides.items() if v is not None}
+            })
+        except ValueError as e:
+            logger.error(str(e))
+            raise typer.Exit(code=1)
 
-        composite_path = run_path / "composite" / "grid.png"
-        breakpoint_labels = [
-            f"{bp.name.capitalize()} ({bp.width}×{bp.height})"
-            for bp in config.breakpoints
-        ]
-        create_composite(image_paths, composite_path, breakpoint_names=breakpoint_labels)
-        if not json_output: logger.info("PixelFrame Engine: Composite grid generated.")
-
-        generate_report(
-            config=config,
-            run_path=run_path,
-            composite_path=composite_path,
-            image_paths=image_paths,
-            browser_manager=browser,
+    if since:
+        from pathlib import Path
+        if not (Path(since) / "screenshots").is_dir():
+            logger.error(f"--since {since} is not a run directory.")
+            raise typer.Exit(code=1)
+        config.incremental = True
+        config.incremental_base = since
+
+    if shard:
+        try:
+            config.shard = parse_shard(shard, shard_timings)
+        except ValueError as e:
+            logger.error(str(e))
+            raise typer.Exit(code=1)
+
+    client = None
+    if daemon and (engine or workers):
+        logger.error("--engine and --workers do not apply on the daemon. Drop them, or use --no-daemon.")
+        raise typer.Exit(code=1)
+    # An engine or worker count chosen on the command line or in the config asks for a local browser
+    local = bool(engine or workers) or config.engine != "sync" or config.workers > 1
+    if daemon and local:
+        logger.warning(
+            f"PixelFrame Engine: Capturing on the daemon; the config's engine ({config.engine}) "
+            f"and workers ({config.workers}) do not apply there."
         )
-        if not json_output: logger.info("PixelFrame Engine: Interactive report generated successfully.")
-        
-        if open_report:
+    if daemon or (daemon is None and not local):
+        from pixelframe.engine.daemon import DaemonClient
+        client = DaemonClient.find()
+        if daemon and client is None:
+            logger.error("No PixelFrame daemon is running. Start one with `pixelframe daemon start`.")
+            raise typer.Exit(code=1)
+
+    suffix = f"-shard{config.shard.index}of{config.shard.count}" if config.shard else ""
+    run_path = create_run_directory(config.output_dir, suffix=suffix)
+    timing.record()
+    timings = None
+
+    try:
+        if client:
+            results, reports = _run_pipeline_daemon(client, config, run_path, json_output, defer_pdf)
+        elif config.engine == "async":
+            import asyncio
+            results, reports = asyncio.run(_run_pipeline_async(config, run_path, json_output, defer_pdf))
+        else:
+            results, reports = _run_pipeline(config, run_path, json_output, defer_pdf)
+        timings = _write_timings(run_path, trace)
+
+        if open_report and "html" in reports:
             import webbrowser
-            report_file = run_path / "report" / "report.html"
-            if report_file.exists():
-                webbrowser.open(f"file://{report_file.resolve()}")
+            webbrowser.open(f"file://{reports['html'].resolve()}")
                 
         if json_output:
             import json
             print(json.dumps({
                 "status": "PASSED",
                 "run_directory": str(run_path.resolve()),
+                "shard": str(config.shard) if config.shard else None,
                 "breakpoints": len(config.breakpoints),
-                "url": config.url
+                "pages": len(config.pages) or 1,
+                "screenshots": len(results),
+                "reused": sum(1 for r in results if r.reused),
+                "reports": {fmt: str(path.resolve()) for fmt, path in reports.items()},
+                "url": config.url,
+                "timings": timings
             }))
         else:
             from rich.console import Console
@@ -312,13 +511,17 @@ def run_capture(
             console = Console()
             summary = (
                 f"[bold cyan]URL:[/bold cyan] {config.url}\n"
-                f"[bold cyan]Breakpoints:[/bold cyan] {len(config.breakpoints)}\n"
+                f"[bold cyan]Pages:[/bold cyan] {len(config.pages) or 1}\n"
+                f"[bold cyan]Screenshots:[/bold cyan] {len(results)}\n"
                 f"[bold cyan]Output:[/bold cyan] [green]{run_path}[/green]\n"
                 f"[bold cyan]Status:[/bold cyan] [bold green]PASSED[/bold green]"
             )
             console.print(Panel(summary, title="PixelFrame Capture Summary", expand=False, border_style="blue"))
 
     except Exception as e:
+        # Unless the pipeline finished and only the summary failed
+        if timings is None:
+            _write_timings(run_path, trace)
         if json_output:
             import json
             print(json.dumps({"status": "FAILED", "error": str(e)}))
@@ -326,9 +529,450 @@ def run_capture(
             from rich.console import Console
             Console().print(f"[bold red]❌ Pipeline failed:[/bold red] {e}")
         raise typer.Exit(code=1)
+    finally:
+        timing.stop()
+
+
+def _write_timings(directory, trace=False):
+    """
+    Write the recorded stage timings (and optionally a Chrome trace); returns the summary.
+
+    The recorder keeps running; callers stop it in a ``finally``.
+    """
+    timings = timing.active()
+    timings.write(directory / timing.TIMINGS_NAME)
+    if trace:
+        timings.write_chrome_trace(directory / timing.TRACE_NAME)
+    return timings.summary()
+
+
+def _build_composites(results, run_path, json_output):
+    """Build one composite grid per page; returns {page name: composite path}."""
+    from pixelframe.engine.capture import group_by_page
+    from pixelframe.engine.composite import create_composite, composite_path
+    from pixelframe.engine.manifest import RunManifest
+
+    # Capture already hashed every screenshot; those hashes key the thumbnail cache
+    manifest = RunManifest(run_path / "screenshots")
+    composites = {}
+    for page_name, page_results in group_by_page(results).items():
+        grid_path = composite_path(run_path, page_name)
+        breakpoint_labels = [
+            f"{r.breakpoint.name.capitalize()} ({r.breakpoint.width}×{r.breakpoint.height})"
+            for r in page_results
+        ]
+        with timing.span("composite", track=page_name or None):
+            create_composite(
+                [r.path for r in page_results], grid_path, breakpoint_names=breakpoint_labels,
+                digests=[manifest.file_hash(r.path) for r in page_results],
+            )
+        composites[page_name] = grid_path
+    if not json_output: logger.info("PixelFrame Engine: Composite grid generated.")
+    return composites
+
+
+def _report(config, run_path, results, json_output, defer_pdf):
+    """Composite and report stage shared by both engines; returns {format: path}."""
+    from pixelframe.engine.report import generate_report
+
+    composites = _build_composites(results, run_path, json_output)
+    reports = generate_report(
+        config=config,
+        run_path=run_path,
+        composites=composites,
+        results=results,
+        defer_pdf=defer_pdf,
+    )
+    if not json_output: logger.info("PixelFrame Engine: Interactive report generated successfully.")
+    return reports
+
+
+def _run_pipeline(config, run_path, json_output, defer_pdf=False):
+    """Capture, composite and report on the sync engine."""
+    from pixelframe.engine.browser import BrowserManager
+    from pixelframe.engine.capture import capture_screenshots
+
+    browser = BrowserManager()
+    browser.start()
+
+    try:
+        results = capture_screenshots(config, run_path, browser, workers=config.workers)
+        if not json_output: logger.info("PixelFrame Engine: Screenshots captured successfully.")
     finally:
         browser.stop()
 
+    return results, _report(config, run_path, results, json_output, defer_pdf)
+
+
+async def _run_pipeline_async(config, run_path, json_output, defer_pdf=False):
+    """Capture, composite and report on the asyncio engine."""
+    from pixelframe.engine.browser import AsyncBrowserManager
+    from pixelframe.engine.capture import capture_screenshots_async
+
+    browser = AsyncBrowserManager()
+    await browser.start()
+
+    try:
+        results = await capture_screenshots_async(config, run_path, browser, concurrency=config.workers)
+        if not json_output: logger.info("PixelFrame Engine: Screenshots captured successfully.")
+    finally:
+        await browser.stop()
+
+    return results, _report(config, run_path, results, json_output, defer_pdf)
+
+
+def _run_pipeline_daemon(client, config, run_path, json_output, defer_pdf=False):
+    """Capture on the browser daemon, then composite and report here."""
+    from pixelframe.engine.capture import capture_screenshots_daemon
+
+    if not json_output: logger.info(f"PixelFrame Engine: Capturing on the daemon at 127.0.0.1:{client.port}")
+    results = capture_screenshots_daemon(config, run_path, client)
+    if not json_output: logger.info("PixelFrame Engine: Screenshots captured successfully.")
+
+    return results, _report(config, run_path, results, json_output, defer_pdf)
+
+
+report_app = typer.Typer(help="Render reports for an existing run.")
+app.add_typer(report_app, name="report")
+
+
+@report_app.command("render")
+def render_report(
+    run_dir: str = typer.Argument(..., help="Path to a capture run directory"),
+    report_format: str = typer.Option("pdf", "--format", help="Comma-separated report formats: html, pdf, json"),
+    report_assets: str = typer.Option(
+        None, "--report-assets",
+        help="How the report references images: 'linked', 'thumbnails' or 'inline' (self-contained)"
+    ),
+):
+    """
+    Render reports for a finished capture run.
+
+    Used for deferred PDFs. It works from the run's screenshot index, so no
+    pages are captured again.
+    """
+    from pathlib import Path
+    from pixelframe.engine.browser import BrowserManager
+    from pixelframe.engine.capture import group_by_page, load_run
+    from pixelframe.engine.composite import composite_path
+    from pixelframe.engine.report import render_html, render_json, render_pdf
+
+    run_path = Path(run_dir)
+    try:
+        formats = parse_report_formats(report_format)
+        config, results = load_run(run_path)
+    except (ValueError, RuntimeError) as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+    if report_assets:
+        if report_assets not in REPORT_ASSETS:
+            logger.error(f"Unknown report assets mode '{report_assets}'. Expected one of: {', '.join(REPORT_ASSETS)}.")
+            raise typer.Exit(code=1)
+        config.report_assets = report_assets
+
+    composites = {page_name: composite_path(run_path, page_name) for page_name in group_by_page(results)}
+    html_file = run_path / "report" / "report.html"
+
+    # A PDF prints the existing HTML unless that is missing or re-rendered here
+    if "html" in formats or ("pdf" in formats and not html_file.exists()):
+        html_file = render_html(config, run_path, composites, results)
+        logger.info(f"HTML report saved to {html_file}")
+    if "json" in formats:
+        logger.info(f"JSON report saved to {render_json(config, run_path, composites, results)}")
+    if "pdf" in formats:
+        browser = BrowserManager()
+        try:
+            browser.start()
+            render_pdf(html_file, browser)
+        except Exception as e:
+            logger.error(f"Failed to generate PDF: {e}")
+            raise typer.Exit(code=1)
+        finally:
+            browser.stop()
+
+
+@app.command("merge")
+def merge_shards(
+    inputs: List[str] = typer.Argument(..., help="The diff output directories, or capture run directories, of every shard"),
+    output: str = typer.Option(
+        ..., "--output", "-o",
+        help="Directory for the merged diff report, or output directory for the merged capture run"
+    ),
+    report_format: str = typer.Option("html", "--report-format", help="Merged capture report formats: html, pdf, json"),
+    json_output: bool = typer.Option(False, "--json", help="Output the merged verdict as JSON for CI"),
+):
+    """
+    Combine the outputs of sharded CI nodes into one report and one verdict.
+
+    Fails if a shard is missing, if screenshots were assigned to several
+    shards or to none, or (for diffs) if any comparison failed.
+    """
+    from pathlib import Path
+    from pixelframe.engine.merge import input_kind, merge_diffs, merge_runs
+
+    try:
+        kinds = {input_kind(path) for path in inputs}
+        formats = parse_report_formats(report_format)
+    except ValueError as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+    if len(kinds) > 1:
+        logger.error("Merge either diff outputs or capture runs, not both.")
+        raise typer.Exit(code=1)
+
+    if kinds == {"diff"}:
+        result = merge_diffs(inputs, output)
+        report = {"html": result.path / "diff_report.html"}
+    else:
+        from pixelframe.engine.capture import load_run
+
+        result = merge_runs(inputs, output)
+        config, results = load_run(result.path)
+        config.report_formats = formats
+        timing.record()
+        try:
+            report = _report(config, result.path, results, json_output, defer_pdf=False)
+            _write_timings(result.path)
+        finally:
+            timing.stop()
+
+    for problem in result.problems:
+        logger.error(f"PixelFrame Engine: Merge: {problem}")
+    status = "PASSED" if result.passed else "FAILED"
+
+    if json_output:
+        import json
+        summary = result.summary or {}
+        print(json.dumps({
+            "status": status,
+            "kind": result.kind,
+            "shards": result.shards,
+            "problems": result.problems,
+            "path": str(Path(result.path).resolve()),
+            "breakpoints": len(summary.get("results", [])) if result.summary else None,
+            "failed": [r["name"] for r in summary.get("results", []) if not r["passed"]],
+            "gated": summary.get("gated"),
+            "added": summary.get("added", []),
+            "removed": summary.get("removed", []),
+            "reports": {fmt: str(Path(path).resolve()) for fmt, path in report.items()},
+        }))
+    else:
+        from rich.console import Console
+        if result.summary:
+            failed = [r["name"] for r in result.summary["results"] if not r["passed"]]
+            detail = f"{len(result.summary['results']) - len(failed)}/{len(result.summary['results'])} comparisons passed"
+        else:
+            detail = f"run {result.path}"
+        Console().print(
+            f"Merged {result.shards} shard(s): {detail} — "
+            + ("[bold green]PASSED[/bold green]" if result.passed else "[bold red]FAILED[/bold red]")
+        )
+        for fmt, path in report.items():
+            logger.info(f"Merged {fmt.upper()} report: {path}")
+
+    if not result.passed:
+        raise typer.Exit(code=1)
+
+
+runs_app = typer.Typer(help="List, pin and garbage-collect run directories.")
+app.add_typer(runs_app, name="runs")
+
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+@runs_app.command("list")
+def list_runs_command(
+    output: str = typer.Argument("pixelframe-output", help="Output directory holding the runs"),
+):
+    """List the runs in an output directory, oldest first."""
+    from pixelframe.engine.retention import list_runs
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title=f"Runs in {output}")
+    table.add_column("Run", style="cyan")
+    table.add_column("Created")
+    table.add_column("Pinned", justify="center")
+    for run in list_runs(output):
+        table.add_row(run.path.name, run.created.isoformat(sep=" ", timespec="seconds"), "📌" if run.pinned else "")
+    Console().print(table)
+
+
+@runs_app.command("pin")
+def pin_run(
+    run_dir: str = typer.Argument(..., help="Run directory to keep, e.g. the current baseline"),
+    note: str = typer.Option("", "--note", help="Why the run is pinned"),
+):
+    """Exempt a run from 'pixelframe runs gc'."""
+    from pathlib import Path
+    from pixelframe.engine.retention import pin
+
+    if not Path(run_dir).is_dir():
+        logger.error(f"Run directory not found: {run_dir}")
+        raise typer.Exit(code=1)
+    pin(run_dir, note)
+    logger.info(f"Pinned {run_dir}")
+
+
+@runs_app.command("unpin")
+def unpin_run(run_dir: str = typer.Argument(..., help="Pinned run directory")):
+    """Let 'pixelframe runs gc' delete a run again."""
+    from pixelframe.engine.retention import unpin
+
+    unpin(run_dir)
+    logger.info(f"Unpinned {run_dir}")
+
+
+@runs_app.command("gc")
+def gc_runs(
+    output: str = typer.Argument("pixelframe-output", help="Output directory holding the runs"),
+    keep_last: int = typer.Option(None, "--keep-last", min=0, help="Keep the N newest runs"),
+    keep_newer_than: str = typer.Option(None, "--keep-newer-than", help="Keep runs younger than this, e.g. 36h, 7d, 2w"),
+    keep: Optional[List[str]] = typer.Option(None, "--keep", help="Also keep this run directory (repeatable)"),
+    thumbs_unused_for: str = typer.Option(
+        "30d", "--thumbs-unused-for", help="Also delete cached thumbnails not used for this long"
+    ),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only report what would be deleted"),
+    json_output: bool = typer.Option(False, "--json", help="Output the result as JSON"),
+):
+    """
+    Delete runs that no retention rule keeps, then unreferenced stored screenshots.
+
+    A run survives if it is pinned ('pixelframe runs pin'), passed to
+    --keep, among the --keep-last newest, or younger than --keep-newer-than.
+    The per-user thumbnail cache is pruned too: entries unused for
+    --thumbs-unused-for go, then the least recently used beyond 1 GiB.
+    """
+    from pixelframe.engine.retention import collect, parse_duration
+    from pixelframe.engine.thumbcache import ThumbnailCache
+    from rich.console import Console
+
+    if keep_last is None and keep_newer_than is None:
+        logger.error("Give at least one retention rule: --keep-last and/or --keep-newer-than.")
+        raise typer.Exit(code=1)
+    try:
+        max_age = parse_duration(keep_newer_than) if keep_newer_than else None
+        thumbs_max_age = parse_duration(thumbs_unused_for)
+    except ValueError as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+
+    result = collect(output, keep_last=keep_last, keep_newer_than=max_age, keep=keep or (), dry_run=dry_run)
+    cache = ThumbnailCache.default()
+    thumbs_deleted, thumbs_bytes = cache.prune(max_age=thumbs_max_age, dry_run=dry_run) if cache else (0, 0)
+
+    if json_output:
+        import json
+        print(json.dumps({
+            "dry_run": dry_run,
+            "deleted": [str(p) for p in result.deleted],
+            "kept": len(result.kept),
+            "objects_deleted": result.objects_deleted,
+            "reclaimed_bytes": result.reclaimed_bytes,
+            "thumbnails_deleted": thumbs_deleted,
+            "thumbnail_bytes": thumbs_bytes,
+        }))
+        return
+    verb = "Would delete" if dry_run else "Deleted"
+    for path in result.deleted:
+        logger.info(f"{verb} {path}")
+    Console().print(
+        f"{verb} [bold]{len(result.deleted)}[/bold] run(s) and [bold]{result.objects_deleted}[/bold] stored screenshot(s), "
+        f"kept {len(result.kept)}; {'would reclaim' if dry_run else 'reclaimed'} "
+        f"[bold green]{_format_bytes(result.reclaimed_bytes)}[/bold green]"
+    )
+    if thumbs_deleted:
+        Console().print(
+            f"{verb} [bold]{thumbs_deleted}[/bold] cached thumbnail(s), "
+            f"[bold green]{_format_bytes(thumbs_bytes)}[/bold green]"
+        )
+
+
+daemon_app = typer.Typer(help="Keep a warm browser running so repeated captures start instantly.")
+app.add_typer(daemon_app, name="daemon")
+
+
+@daemon_app.command("start")
+def start_daemon(
+    browsers: int = typer.Option(1, "--browsers", "-b", min=1, help="Browsers to keep warm; a job's breakpoints are spread over them"),
+    port: int = typer.Option(0, "--port", min=0, max=65535, help="Port on 127.0.0.1 to listen on (default: any free port)"),
+    foreground: bool = typer.Option(False, "--foreground", help="Serve from this process instead of detaching"),
+):
+    """
+    Start the capture daemon.
+
+    While it runs, `capture run` sends its screenshots to it instead of
+    launching Chromium. Each screenshot still gets a fresh browser context.
+    """
+    from pixelframe.engine.daemon import CaptureDaemon, DaemonClient, spawn, state_file
+
+    if state_file() is None:
+        logger.error("Daemons are disabled by PIXELFRAME_DAEMON=off.")
+        raise typer.Exit(code=1)
+    running = DaemonClient.find()
+    if running:
+        logger.error(f"A PixelFrame daemon is already running (pid {running.pid}, port {running.port}).")
+        raise typer.Exit(code=1)
+
+    if not foreground:
+        try:
+            client = spawn(browsers=browsers, port=port)
+        except RuntimeError as e:
+            logger.error(str(e))
+            raise typer.Exit(code=1)
+        logger.info(f"PixelFrame daemon started (pid {client.pid}, port {client.port}).")
+        return
+
+    import signal
+    import sys
+    # Let `kill` run the same cleanup as `daemon stop`
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        CaptureDaemon(browsers=browsers, port=port).serve_forever()
+    except (RuntimeError, OSError) as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+
+
+@daemon_app.command("status")
+def daemon_status(json_output: bool = typer.Option(False, "--json", help="Output the status as JSON")):
+    """Show whether a daemon is running and how busy it is."""
+    from pixelframe.engine.daemon import DaemonClient
+
+    client = DaemonClient.find()
+    status = client.status() if client else None
+    if json_output:
+        import json
+        print(json.dumps({"running": bool(status), **(status or {})}))
+    elif status:
+        print(
+            f"PixelFrame daemon {status['version']}: pid {status['pid']}, port {client.port}, "
+            f"{status['browsers']} browser(s), {status['jobs']} job(s) served, "
+            f"{status['queued']} task(s) queued, up {status['uptime_s']:.0f}s"
+        )
+    else:
+        print("No PixelFrame daemon is running.")
+    if not status:
+        raise typer.Exit(code=1)
+
+
+@daemon_app.command("stop")
+def stop_daemon():
+    """Stop the running daemon once its queued captures are done."""
+    from pixelframe.engine.daemon import DaemonClient
+
+    client = DaemonClient.find()
+    if client is None:
+        logger.info("No PixelFrame daemon is running.")
+        return
+    client.stop()
+    logger.info(f"PixelFrame daemon (pid {client.pid}) stopping.")
+
 
 def main():
     app()
@@ -1,4 +1,4 @@
-from playwright.sync_api import sync_playwright
+from pixelframe.engine.timing import span
 
 class BrowserManager:
     def __init__(self):
@@ -6,8 +6,11 @@ class BrowserManager:
         self.browser = None
 
     def start(self):
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=True)
+        from playwright.sync_api import sync_playwright
+
+        with span("browser.launch"):
+            self.playwright = sync_playwright().start()
+            self.browser = self.playwright.chromium.launch(headless=True)
 
     def stop(self):
         if self.browser:
@@ -30,4 +33,41 @@ class BrowserManager:
         }
         if user_agent:
             options["user_agent"] = user_agent
-        return self.browser.new_page(**options)
\ No newline at end of file
+        return self.browser.new_page(**options)
+
+class AsyncBrowserManager:
+    """asyncio counterpart of BrowserManager, backed by playwright.async_api."""
+
+    def __init__(self):
+        self.playwright = None
+        self.browser = None
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+
+        with span("browser.launch"):
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(headless=True)
+
+    async def stop(self):
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+
+    async def new_page(
+        self, width: int, height: int,
+        device_scale_factor: float = 1.0,
+        is_mobile: bool = False,
+        has_touch: bool = False,
+        user_agent: str = None
+    ):
+        options = {
+            "viewport": {"width": width, "height": height},
+            "device_scale_factor": device_scale_factor,
+            "is_mobile": is_mobile,
+            "has_touch": has_touch,
+        }
+        if user_agent:
+            options["user_agent"] = user_agent
+        return await self.browser.new_page(**options)
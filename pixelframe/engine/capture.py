@@ -1,16 +1,278 @@
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, List, Optional
+import asyncio
+import io
 import logging
+import os
+import queue
+import threading
+import time
+
+from PIL import Image
+
+from pixelframe.engine.config import (
+    Breakpoint, NetworkConfig, PageConfig, PixelFrameConfig, Region, ScreenshotConfig, WaitConfig, resolve_pages
+)
+from pixelframe.engine.diff import _image_size
+from pixelframe.engine.incremental import earlier_fingerprints, page_fingerprint, page_fingerprint_async, reuse
+from pixelframe.engine.manifest import RunManifest, file_digest
+from pixelframe.engine.network import ResponseCache, resolve_network
+from pixelframe.engine.shard import capture_weights, select, shard_info, unit_name
+from pixelframe.engine.readiness import wait_for_ready, wait_for_ready_async
+from pixelframe.engine.regions import resolve_regions, resolve_regions_async
+from pixelframe.engine.store import ObjectStore
+from pixelframe.engine.timing import span
 
 logger = logging.getLogger("pixelframe")
 
-def capture_screenshots(config, run_path, browser_manager):
-    screenshots_path = run_path / "screenshots"
-    screenshots_path.mkdir(parents=True, exist_ok=True)
-    image_paths = []
 
-    for bp in config.breakpoints:
-        logger.info(f"Capturing {bp.name} ({bp.width}x{bp.height})")
+@dataclass
+class CaptureTask:
+    """One page × breakpoint unit of work."""
+    page: str
+    url: str
+    breakpoint: Breakpoint
+    full_page: bool
+    wait: WaitConfig
+    file_path: Path
+    screenshot: ScreenshotConfig = field(default_factory=ScreenshotConfig)
+    network: NetworkConfig = field(default_factory=NetworkConfig)
+    # Diff masks and regions of this breakpoint, resolved to pixels before the screenshot
+    mask: List[Region] = field(default_factory=list)
+    regions: List[Region] = field(default_factory=list)
+    # Fingerprint the page, and reuse ``previous`` (see incremental.earlier_fingerprints) if it matches
+    incremental: bool = False
+    previous: Optional[dict] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.page}/{self.breakpoint.name}" if self.page else self.breakpoint.name
+
+
+@dataclass
+class CaptureResult:
+    page: str
+    breakpoint: Breakpoint
+    path: Path
+    wait_ms: float = 0.0
+    capture_ms: float = 0.0
+    # Time spent re-encoding Chromium's PNG (0 when it is saved as is)
+    encode_ms: float = 0.0
+    fingerprint: Optional[str] = None
+    # The earlier screenshot this one links to, when the page was unchanged
+    reused: Optional[dict] = None
+    # Pixel boxes of the diff masks and regions (see regions.resolve_regions)
+    regions: Optional[dict] = None
+
+
+def group_by_page(results) -> Dict[str, List[CaptureResult]]:
+    """Group capture results by page name, preserving capture order."""
+    groups = {}
+    for result in results:
+        groups.setdefault(result.page, []).append(result)
+    return groups
+
+
+def plan_captures(config, screenshots_path) -> List[CaptureTask]:
+    """
+    Expand the config into an ordered list of capture tasks.
+
+    Multi-page suites are namespaced as ``screenshots/<page>/<breakpoint>.png``;
+    single-URL runs keep the flat ``screenshots/<breakpoint>.png`` layout. The
+    extension follows ``config.screenshot.format``. With ``config.shard`` only
+    this node's share of the tasks is returned. With ``config.incremental``
+    each task carries the earlier screenshot its fingerprint is checked against.
+    """
+    tasks = []
+    network = resolve_network(config)
+    for page in resolve_pages(config):
+        page_dir = screenshots_path / page.name if page.name else screenshots_path
+        page_dir.mkdir(parents=True, exist_ok=True)
+        for bp in page.breakpoints:
+            tasks.append(CaptureTask(
+                page=page.name,
+                url=page.url,
+                breakpoint=bp,
+                full_page=page.full_page,
+                wait=page.wait,
+                file_path=page_dir / f"{bp.name}.{config.screenshot.format}",
+                screenshot=config.screenshot,
+                network=network,
+                mask=[r for r in page.mask if r.applies_to(bp)],
+                regions=[r for r in page.regions if r.applies_to(bp)],
+            ))
+    if config.shard:
+        names = [unit_name(task.file_path.relative_to(screenshots_path)) for task in tasks]
+        # Without explicit timings every unit weighs the same
+        weights = capture_weights(config.shard.timings)
+        keep = select(names, config.shard, weights)
+        logger.info(f"Shard {config.shard}: capturing {len(keep)} of {len(tasks)} screenshots")
+        tasks = [task for task, name in zip(tasks, names) if name in keep]
+    if config.incremental:
+        names = [unit_name(task.file_path.relative_to(screenshots_path)) for task in tasks]
+        earlier = earlier_fingerprints(config.output_dir, names, config.incremental_base)
+        for task, name in zip(tasks, names):
+            task.incremental = True
+            task.previous = earlier.get(name)
+        logger.info(f"Incremental: {len(earlier)} of {len(tasks)} screenshots have an earlier fingerprint to match")
+    return tasks
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+# WebP stores each dimension in 14 bits
+WEBP_MAX_SIZE = 16383
+
+
+def save_screenshot(data, path, settings) -> Path:
+    """
+    Write Chromium's PNG ``data`` to ``path`` as ``settings`` ask.
+
+    Returns the path actually written: a page too large for WebP, or for
+    Pillow's decompression-bomb guard, is kept as the PNG Chromium produced.
+    """
+    path = Path(path)
+    if settings.format == "png" and settings.compress_level is None:
+        path.write_bytes(data)
+        return path
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if settings.format == "webp" and max(img.size) > WEBP_MAX_SIZE:
+                logger.warning(f"PixelFrame Engine: {path.name} is {img.width}x{img.height}, too large for WebP; saving it as PNG")
+                path = path.with_suffix(".png")
+            if path.suffix == ".webp":
+                img.save(path, "WEBP", lossless=True, method=settings.webp_method)
+            elif settings.compress_level is not None:
+                img.save(path, "PNG", compress_level=settings.compress_level)
+            else:
+                path.write_bytes(data)
+    except Image.DecompressionBombError as e:
+        logger.warning(f"PixelFrame Engine: Not re-encoding {path.name}: {e}")
+        path = path.with_suffix(".png")
+        path.write_bytes(data)
+    return path
+
+
+def write_run_index(config, screenshots_path, results, tasks=()):
+    """
+    Record every captured screenshot in the run's manifest.
 
+    ``diff run`` reads this index to pair screenshots, spot added and removed
+    breakpoints and skip unchanged files without opening any image. With
+    ``config.store`` each screenshot is also moved into the output's object
+    store and replaced by a hard link, and the entry names its object. A
+    sharded run also records which ``tasks`` were its share.
+    """
+    manifest = RunManifest(screenshots_path)
+    manifest.url = config.url
+    page_urls = {page.name: page.url for page in resolve_pages(config)}
+    store = ObjectStore.for_output(config.output_dir) if config.store else None
+    for r in results:
+        bp = r.breakpoint
+        stored = {}
+        if r.reused:
+            # Same file as the earlier screenshot: carry its hashes over instead of reading it again
+            stored = {"sha256": r.reused["sha256"], "reused": r.reused["run"]}
+            if r.reused.get("pixels"):
+                stored["pixels"] = r.reused["pixels"]
+        if r.fingerprint:
+            stored["fingerprint"] = r.fingerprint
+        if r.regions:
+            stored.update(r.regions)
+        if store:
+            digest = stored.get("sha256") or file_digest(r.path)
+            key = store.put(r.path, digest)
+            if key:
+                stored.update(sha256=digest, object=key)
+        manifest.record_capture(
+            r.path,
+            _image_size(r.path),
+            page=r.page,
+            url=page_urls.get(r.page, config.url),
+            breakpoint=bp.name,
+            viewport=[bp.width, bp.height],
+            device_scale_factor=bp.device_scale_factor,
+            capture_ms=r.capture_ms,
+            wait_ms=r.wait_ms,
+            format=r.path.suffix.lstrip(".").lower(),
+            encode_ms=r.encode_ms,
+            **stored,
+        )
+    # What the configured encoding cost this run, to weigh formats against each other
+    manifest.encoding = {
+        "format": config.screenshot.format,
+        "compress_level": config.screenshot.compress_level,
+        "webp_method": config.screenshot.webp_method if config.screenshot.format == "webp" else None,
+        "screenshots": len(results),
+        "bytes": sum(r.path.stat().st_size for r in results),
+        "capture_ms": round(sum(r.capture_ms for r in results), 1),
+        "encode_ms": round(sum(r.encode_ms for r in results), 1),
+    }
+    if config.shard:
+        units = [unit_name(Path(t.file_path).relative_to(screenshots_path)) for t in tasks]
+        total = sum(len(page.breakpoints) for page in resolve_pages(config))
+        manifest.shard = shard_info(config.shard, units, total)
+    if store and (store.added or store.deduplicated):
+        manifest.store = Path(os.path.relpath(store.root, screenshots_path)).as_posix()
+        logger.info(
+            f"PixelFrame Engine: Stored {store.added} new screenshot(s), {store.deduplicated} unchanged "
+            f"({store.bytes_saved / (1 << 20):.1f} MB deduplicated) in {store.root}"
+        )
+    reused = sum(1 for r in results if r.reused)
+    if reused:
+        logger.info(f"PixelFrame Engine: Reused {reused} unchanged screenshot(s) from earlier runs")
+    manifest.save()
+
+
+def load_run(run_path):
+    """
+    Rebuild the config and capture results of a finished run from its index,
+    e.g. to render its report again later.
+    """
+    run_path = Path(run_path)
+    manifest = RunManifest(run_path / "screenshots")
+    if not manifest.indexed:
+        raise RuntimeError(f"PixelFrame Engine: {run_path} has no capture index (screenshots/manifest.json).")
+
+    results, breakpoints, page_urls = [], {}, {}
+    for key, entry in manifest.files.items():
+        path = manifest.root / key
+        if "breakpoint" not in entry or not path.exists():
+            continue
+        width, height = entry["viewport"]
+        bp = breakpoints.setdefault(entry["breakpoint"], Breakpoint(
+            entry["breakpoint"], width, height, device_scale_factor=entry.get("device_scale_factor", 1.0)
+        ))
+        results.append(CaptureResult(
+            entry.get("page", ""), bp, path,
+            entry.get("wait_ms", 0.0), entry.get("capture_ms", 0.0), entry.get("encode_ms", 0.0),
+        ))
+        if entry.get("page"):
+            page_urls.setdefault(entry["page"], entry.get("url"))
+
+    if not results:
+        raise RuntimeError(f"PixelFrame Engine: No indexed screenshots found in {run_path}.")
+
+    config = PixelFrameConfig(
+        url=manifest.url or "",
+        output_dir=str(run_path.parent),
+        full_page=True,
+        breakpoints=list(breakpoints.values()),
+        pages=[PageConfig(name, url) for name, url in page_urls.items()],
+    )
+    return config, results
+
+
+def _capture_task(task, browser_manager, network=None) -> Optional[CaptureResult]:
+    """Capture a single task. Returns None on failure."""
+    bp = task.breakpoint
+    logger.info(f"Capturing {task.label} ({bp.width}x{bp.height})")
+    start = time.perf_counter()
+
+    with span("browser.context", track=task.label):
         page = browser_manager.new_page(
             width=bp.width, 
             height=bp.height,
@@ -19,30 +281,226 @@ def capture_screenshots(config, run_path, browser_manager):
             has_touch=bp.has_touch,
             user_agent=bp.user_agent
         )
+    try:
+        if network:
+            network.attach(page)
+        # Use 'load' which is more reliable than 'networkidle', and extend timeout
+        with span("navigate", track=task.label):
+            response = page.goto(task.url, wait_until="load", timeout=45000)
+        
+        if response and response.status >= 400:
+            logger.warning(f"PixelFrame Engine: HTTP {response.status} encountered on {task.url}")
+        
+        with span("ready", track=task.label):
+            wait_ms = wait_for_ready(page, task.wait, label=task.label)
+        logger.info(f"{task.label} ready after {wait_ms} ms")
+
+        regions = resolve_regions(page, task)
+        fingerprint = None
+        if task.incremental:
+            with span("fingerprint", track=task.label):
+                fingerprint = page_fingerprint(page, task)
+            path = reuse(task, fingerprint)
+            if path:
+                logger.info(f"{task.label} unchanged since {task.previous['run']}, reusing its screenshot")
+                return CaptureResult(task.page, bp, path, wait_ms, _elapsed_ms(start), 0.0, fingerprint, task.previous, regions)
+
+        with span("screenshot", track=task.label):
+            data = page.screenshot(full_page=task.full_page)
+        encode_start = time.perf_counter()
+        with span("encode", track=task.label):
+            path = save_screenshot(data, task.file_path, task.screenshot)
+        return CaptureResult(
+            task.page, bp, path, wait_ms, _elapsed_ms(start), _elapsed_ms(encode_start), fingerprint, regions=regions,
+        )
+    except Exception as e:
+        logger.error(f"PixelFrame Engine: Failed to capture {task.label}: {e}")
+        return None
+    finally:
+        page.close()
+
+
+def _capture_parallel(tasks, browser_manager, workers, network=None):
+    """
+    Capture tasks concurrently from a shared work queue.
+
+    Playwright's sync API is bound to the thread that started it, so every
+    extra worker thread launches and owns its own browser. The calling thread
+    drains the same queue with the browser it was given. Results are stored by
+    task index so the output order never depends on scheduling.
+    """
+    from pixelframe.engine.browser import BrowserManager
+
+    work = queue.Queue()
+    for idx, task in enumerate(tasks):
+        work.put((idx, task))
+    results = [None] * len(tasks)
+
+    def drain(manager):
+        while True:
+            try:
+                idx, task = work.get_nowait()
+            except queue.Empty:
+                return
+            results[idx] = _capture_task(task, manager, network)
+
+    def worker():
+        manager = BrowserManager()
+        try:
+            manager.start()
+            drain(manager)
+        except Exception as e:
+            logger.error(f"PixelFrame Engine: Capture worker failed: {e}")
+        finally:
+            manager.stop()
+
+    threads = [
+        threading.Thread(target=worker, name=f"pixelframe-capture-{i}", daemon=True)
+        for i in range(1, workers)
+    ]
+    for t in threads:
+        t.start()
+    drain(browser_manager)
+    for t in threads:
+        t.join()
+
+    return results
+
+
+def _run_network(tasks) -> Optional[ResponseCache]:
+    """The response cache every page of this run goes through, if any."""
+    return ResponseCache.for_network(tasks[0].network) if tasks else None
+
+
+def capture_screenshots(config, run_path, browser_manager, workers=1) -> List[CaptureResult]:
+    tasks = plan_captures(config, run_path / "screenshots")
+
+    network = _run_network(tasks)
+    workers = max(1, min(workers, len(tasks)))
+    if workers > 1:
+        logger.info(f"Capturing {len(tasks)} screenshots with {workers} workers")
+        results = _capture_parallel(tasks, browser_manager, workers, network)
+    else:
+        results = [_capture_task(task, browser_manager, network) for task in tasks]
+
+    captured = [r for r in results if r is not None]
+
+    if not captured:
+        raise RuntimeError("PixelFrame Engine: No screenshots were captured successfully. Aborting.")
+
+    if network:
+        logger.info(network.summary())
+    with span("index"):
+        write_run_index(config, run_path / "screenshots", captured, tasks)
+    return captured
+
+
+def capture_screenshots_daemon(config, run_path, client) -> List[CaptureResult]:
+    """
+    Capture on a running ``pixelframe daemon`` through ``client`` (a DaemonClient).
+
+    Tasks are planned here and the run is indexed here; the daemon only drives
+    its warm browsers.
+    """
+    tasks = plan_captures(config, run_path / "screenshots")
+
+    with span("daemon.capture"):
+        results = client.capture(tasks)
+    for task, result in zip(tasks, results):
+        if result is None:
+            logger.error(f"PixelFrame Engine: Failed to capture {task.label} (see the daemon log)")
+
+    captured = [r for r in results if r is not None]
+
+    if not captured:
+        raise RuntimeError("PixelFrame Engine: No screenshots were captured successfully. Aborting.")
+
+    with span("index"):
+        write_run_index(config, run_path / "screenshots", captured, tasks)
+    return captured
+
+
+async def _capture_task_async(task, browser_manager, semaphore, network=None) -> Optional[CaptureResult]:
+    """Async variant of _capture_task; holds a semaphore slot while the page is open."""
+    async with semaphore:
+        bp = task.breakpoint
+        logger.info(f"Capturing {task.label} ({bp.width}x{bp.height})")
+        start = time.perf_counter()
+
+        with span("browser.context", track=task.label):
+            page = await browser_manager.new_page(
+                width=bp.width,
+                height=bp.height,
+                device_scale_factor=bp.device_scale_factor,
+                is_mobile=bp.is_mobile,
+                has_touch=bp.has_touch,
+                user_agent=bp.user_agent
+            )
         try:
-            from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+            if network:
+                await network.attach_async(page)
+            with span("navigate", track=task.label):
+                response = await page.goto(task.url, wait_until="load", timeout=45000)
 
-            # Use 'load' which is more reliable than 'networkidle', and extend timeout
-            response = page.goto(config.url, wait_until="load", timeout=45000)
-            
             if response and response.status >= 400:
-                logger.warning(f"PixelFrame Engine: HTTP {response.status} encountered on {config.url}")
-            
-            # Additional small buffer for JS frameworks to paint
-            page.wait_for_timeout(1500)
-
-            file_path = screenshots_path / f"{bp.name}.png"
-            page.screenshot(
-                path=str(file_path),
-                full_page=config.full_page
+                logger.warning(f"PixelFrame Engine: HTTP {response.status} encountered on {task.url}")
+
+            with span("ready", track=task.label):
+                wait_ms = await wait_for_ready_async(page, task.wait, label=task.label)
+            logger.info(f"{task.label} ready after {wait_ms} ms")
+
+            regions = await resolve_regions_async(page, task)
+            fingerprint = None
+            if task.incremental:
+                with span("fingerprint", track=task.label):
+                    fingerprint = await page_fingerprint_async(page, task)
+                path = reuse(task, fingerprint)
+                if path:
+                    logger.info(f"{task.label} unchanged since {task.previous['run']}, reusing its screenshot")
+                    return CaptureResult(
+                        task.page, bp, path, wait_ms, _elapsed_ms(start), 0.0, fingerprint, task.previous, regions,
+                    )
+
+            with span("screenshot", track=task.label):
+                data = await page.screenshot(full_page=task.full_page)
+            # Re-encoding is CPU-bound; keep it off the event loop
+            encode_start = time.perf_counter()
+            with span("encode", track=task.label):
+                path = await asyncio.to_thread(save_screenshot, data, task.file_path, task.screenshot)
+            return CaptureResult(
+                task.page, bp, path, wait_ms, _elapsed_ms(start), _elapsed_ms(encode_start), fingerprint,
+                regions=regions,
             )
-            image_paths.append(file_path)
         except Exception as e:
-            logger.error(f"PixelFrame Engine: Failed to capture {bp.name}: {e}")
+            logger.error(f"PixelFrame Engine: Failed to capture {task.label}: {e}")
+            return None
         finally:
-            page.close()
+            await page.close()
+
+
+async def capture_screenshots_async(config, run_path, browser_manager, concurrency=1) -> List[CaptureResult]:
+    """
+    Capture every page and breakpoint on a single AsyncBrowserManager.
+
+    Every task gets its own page (and browser context); at most
+    ``concurrency`` of them are open at any time.
+    """
+    tasks = plan_captures(config, run_path / "screenshots")
+
+    network = _run_network(tasks)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = await asyncio.gather(*(
+        _capture_task_async(task, browser_manager, semaphore, network)
+        for task in tasks
+    ))
+
+    captured = [r for r in results if r is not None]
 
-    if not image_paths:
+    if not captured:
         raise RuntimeError("PixelFrame Engine: No screenshots were captured successfully. Aborting.")
 
-    return image_paths
\ No newline at end of file
+    if network:
+        logger.info(network.summary())
+    with span("index"):
+        write_run_index(config, run_path / "screenshots", captured, tasks)
+    return captured
@@ -0,0 +1,392 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+import logging
+
+from pixelframe.engine.config import SCREENSHOT_FORMATS
+from pixelframe.engine.diff import DiffMask, DiffMode, generate_diff, _image_size
+from pixelframe.engine.gate import gate_diff
+from pixelframe.engine.manifest import pixel_digest
+from pixelframe.engine.report import image_asset
+from pixelframe.engine.shard import select, shard_info, unit_name
+from pixelframe.engine.store import same_object
+from pixelframe.engine import timing
+from pixelframe.engine.timing import span
+
+logger = logging.getLogger("pixelframe")
+
+# Written to every diff output directory; `pixelframe merge` combines them
+DIFF_RESULTS_NAME = "diff_results.json"
+DIFF_REPORT_NAME = "diff_report.html"
+
+_SUFFIXES = {f".{fmt}" for fmt in SCREENSHOT_FORMATS}
+
+
+@dataclass
+class DiffTask:
+    """One screenshot pair to compare."""
+    name: str
+    img1_path: Path
+    img2_path: Path
+    diff_path: Path
+    # Directory of the diff report the images are referenced from
+    report_dir: Path
+    # Compare decoded-pixel hashes before diffing; cached digests ride along
+    hash_pixels: bool = False
+    pixels: Tuple[Optional[str], Optional[str]] = (None, None)
+    # Image sizes from the capture index, when known
+    sizes: Tuple[Optional[tuple], Optional[tuple]] = (None, None)
+    # Pixels to compare, from the masks and regions recorded at capture
+    mask: Optional[DiffMask] = None
+
+
+@dataclass
+class DiffResult:
+    name: str
+    similarity: Optional[float] = None
+    # image_asset() references for the report; diff is None for identical pairs
+    img1: Optional[dict] = None
+    img2: Optional[dict] = None
+    diff: Optional[dict] = None
+    error: Optional[str] = None
+    # True when the pair was short-circuited by a hash match; no diff image is written
+    identical: bool = False
+    # True when only part of the pair was compared (see DiffTask.mask)
+    masked: bool = False
+    # True when the pair passed the --gate check (see gate.gate_diff): similarity
+    # is then a proven lower bound, and no diff image is written
+    gated: bool = False
+    pixels: Tuple[Optional[str], Optional[str]] = (None, None)
+    # Timing spans recorded in a worker process, merged by the parent
+    spans: list = field(default_factory=list)
+
+
+@dataclass
+class DiffPlan:
+    tasks: List[DiffTask]
+    # Screenshot names (page/breakpoint) present in only one of the runs
+    added: List[str]
+    removed: List[str]
+    # The share of the screenshots this plan covers, when sharded (see shard.shard_info)
+    shard: Optional[dict] = None
+
+
+def _listing(screenshots, manifest):
+    """
+    Screenshots of a run as ``{name: relative path}``, from its capture index
+    when it has one. Names drop the extension, so a PNG baseline pairs with
+    a WebP run.
+    """
+    if manifest is not None and manifest.indexed:
+        keys = [key for key in manifest.files if (screenshots / key).is_file()]
+    else:
+        keys = [
+            path.relative_to(screenshots).as_posix() for path in screenshots.rglob("*")
+            if path.suffix.lower() in _SUFFIXES
+        ]
+    return {unit_name(key): key for key in keys}
+
+
+def plan_diffs(screenshots1: Path, screenshots2: Path, out_dir: Path, manifests=None, shard=None) -> DiffPlan:
+    """
+    Pair up screenshots present in both runs, in a stable sorted order.
+
+    Runs are listed from their manifest index when capture wrote one, and by
+    scanning ``screenshots/`` otherwise. Multi-page runs namespace screenshots
+    as ``screenshots/<page>/<breakpoint>.png``; the diff overlay (always a
+    PNG) mirrors that layout under ``out_dir``.
+
+    A run captured with ``--shard`` only holds its share, so the pairs are
+    limited to that share instead of reporting the rest as removed. ``shard``
+    splits the pairs themselves, weighted by file size.
+
+    Each pair compares the union of the masks and regions both runs recorded
+    for it at capture.
+    """
+    manifest1, manifest2 = manifests or (None, None)
+    listing1 = _listing(screenshots1, manifest1)
+    listing2 = _listing(screenshots2, manifest2)
+
+    info = None
+    if manifest2 is not None and manifest2.shard:
+        info = manifest2.shard
+        scope = set(info["units"])
+        listing1 = {name: key for name, key in listing1.items() if name in scope}
+        listing2 = {name: key for name, key in listing2.items() if name in scope}
+    if shard:
+        names = listing1.keys() | listing2.keys()
+        weights = {
+            name: (screenshots1 / listing1[name] if name in listing1 else screenshots2 / listing2[name]).stat().st_size
+            for name in names
+        }
+        keep = select(names, shard, weights)
+        info = shard_info(shard, keep, len(names))
+        logger.info(f"Shard {shard}: diffing {len(keep)} of {len(names)} screenshots")
+        listing1 = {name: key for name, key in listing1.items() if name in keep}
+        listing2 = {name: key for name, key in listing2.items() if name in keep}
+
+    def entry(manifest, key):
+        return manifest.files.get(key, {}) if manifest is not None else {}
+
+    tasks = []
+    for name in sorted(listing1.keys() & listing2.keys()):
+        rel = Path(name)
+        tasks.append(DiffTask(
+            name=name,
+            img1_path=screenshots1 / listing1[name],
+            img2_path=screenshots2 / listing2[name],
+            diff_path=out_dir / rel.parent / f"diff_{rel.name}.png",
+            report_dir=out_dir,
+            mask=DiffMask.from_entries(entry(manifest1, listing1[name]), entry(manifest2, listing2[name])),
+        ))
+
+    removed = sorted(listing1.keys() - listing2.keys())
+    added = sorted(listing2.keys() - listing1.keys())
+    for name in removed:
+        logger.warning(f"Screenshot {name} missing in run2. Skipping.")
+    return DiffPlan(tasks, added, removed, info)
+
+
+def _identical_result(task, assets, same_bytes=False, pixels=(None, None)) -> DiffResult:
+    with span("diff.assets", track=task.name):
+        img1 = image_asset(task.img1_path, task.report_dir, assets)
+        # Byte-identical inline pairs share one data URI instead of encoding it twice
+        if same_bytes and assets == "inline":
+            img2 = img1
+        else:
+            img2 = image_asset(task.img2_path, task.report_dir, assets)
+    return DiffResult(
+        name=task.name, similarity=100.0, img1=img1, img2=img2, identical=True, masked=task.mask is not None, pixels=pixels,
+    )
+
+
+def _pixel_hashes(task):
+    """Fill in missing pixel digests, unless the sizes already prove the pair differs."""
+    h1, h2 = task.pixels
+    size1 = task.sizes[0] or _image_size(task.img1_path)
+    size2 = task.sizes[1] or _image_size(task.img2_path)
+    if tuple(size1) != tuple(size2):
+        return h1, h2
+    return h1 or pixel_digest(task.img1_path), h2 or pixel_digest(task.img2_path)
+
+
+def _diff_task(task, backend, tile_rows, assets, mode=None, gate=None) -> DiffResult:
+    """Diff one pair and prepare its report images. Never raises, so one bad pair cannot sink a pool."""
+    logger.info(f"Diffing {task.name}...")
+    try:
+        with span("diff", track=task.name):
+            pixels = (None, None)
+            if task.hash_pixels:
+                with span("diff.pixel_hash"):
+                    pixels = _pixel_hashes(task)
+            if pixels[0] is not None and pixels[0] == pixels[1]:
+                logger.info(f"{task.name}: pixels identical, skipping diff")
+                return _identical_result(task, assets, pixels=pixels)
+
+            if gate is not None:
+                verdict = gate_diff(task.img1_path, task.img2_path, gate, tile_rows=tile_rows, mask=task.mask, mode=mode)
+                if verdict.passed:
+                    logger.info(f"{task.name}: at least {verdict.low}% similar, skipping overlay")
+                    with span("diff.assets"):
+                        images = [image_asset(path, task.report_dir, assets) for path in (task.img1_path, task.img2_path)]
+                    return DiffResult(
+                        name=task.name, similarity=verdict.low, img1=images[0], img2=images[1],
+                        masked=task.mask is not None, gated=True, pixels=pixels,
+                    )
+
+            task.diff_path.parent.mkdir(parents=True, exist_ok=True)
+            similarity = generate_diff(
+                task.img1_path, task.img2_path, task.diff_path, backend=backend, tile_rows=tile_rows, mask=task.mask, mode=mode,
+            )
+            with span("diff.assets"):
+                images = [image_asset(path, task.report_dir, assets) for path in (task.img1_path, task.img2_path, task.diff_path)]
+            return DiffResult(
+                name=task.name, similarity=similarity, img1=images[0], img2=images[1], diff=images[2],
+                masked=task.mask is not None, pixels=pixels,
+            )
+    except Exception as e:
+        logger.error(f"PixelFrame Engine: Failed to diff {task.name}: {e}")
+        return DiffResult(name=task.name, error=str(e))
+
+
+def _diff_task_in_worker(task, *options) -> DiffResult:
+    """_diff_task for pool processes: records timing spans and ships them back."""
+    recorder = timing.record()
+    result = _diff_task(task, *options)
+    result.spans = recorder.spans
+    return result
+
+
+def _diff_pool(pending, jobs, options, results):
+    """
+    Fill ``results`` for the ``(index, task)`` pairs in ``pending`` from a process pool.
+
+    Returns the indexes left unfinished because a worker process died (out of
+    memory, a crash in a native decoder, ...). Such a crash breaks the whole
+    pool, so the caller has to resubmit them.
+    """
+    lost = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+        futures = [(idx, task, pool.submit(_diff_task_in_worker, task, *options)) for idx, task in pending]
+        for idx, task, future in futures:
+            try:
+                results[idx] = future.result()
+                if timing.active():
+                    timing.active().extend(results[idx].spans)
+            except BrokenProcessPool:
+                lost.append(idx)
+            except Exception as e:
+                results[idx] = DiffResult(name=task.name, error=str(e))
+    return lost
+
+
+def _same_object(task, manifests):
+    """Both screenshots are the same object in the store (or links to one file)."""
+    object1 = manifests[0].entry(task.img1_path).get("object")
+    if object1 and object1 == manifests[1].entry(task.img2_path).get("object"):
+        return True
+    return same_object(task.img1_path, task.img2_path)
+
+
+def _short_circuit(tasks, manifests, assets, results):
+    """
+    Resolve byte-identical pairs from the run manifests without decoding.
+
+    Runs sharing an object store need not even hash: the same object on both
+    sides is identical by construction.
+
+    Returns the ``(index, task)`` pairs that still need a worker; those carry
+    any cached pixel digests for the second-tier check.
+    """
+    manifest1, manifest2 = manifests
+    pending = []
+    for idx, task in enumerate(tasks):
+        with span("diff.hash", track=task.name):
+            same_file = (
+                _same_object(task, manifests)
+                or manifest1.file_hash(task.img1_path) == manifest2.file_hash(task.img2_path)
+            )
+        if same_file:
+            logger.info(f"{task.name}: files identical, skipping diff")
+            results[idx] = _identical_result(task, assets, same_bytes=True)
+            continue
+        task.hash_pixels = True
+        task.pixels = (manifest1.pixel_hash(task.img1_path), manifest2.pixel_hash(task.img2_path))
+        task.sizes = (
+            manifest1.entry(task.img1_path).get("image_size"),
+            manifest2.entry(task.img2_path).get("image_size"),
+        )
+        pending.append((idx, task))
+    return pending
+
+
+def _record_pixels(tasks, manifests, results):
+    manifest1, manifest2 = manifests
+    for task, result in zip(tasks, results):
+        h1, h2 = result.pixels
+        if h1:
+            manifest1.record_pixel_hash(task.img1_path, h1)
+        if h2:
+            manifest2.record_pixel_hash(task.img2_path, h2)
+    manifest1.save()
+    if manifest2 is not manifest1:
+        manifest2.save()
+
+
+def run_diffs(
+    tasks, jobs=1, backend="auto", tile_rows=None, manifests=None, assets="linked", mode: Optional[DiffMode] = None,
+    gate: Optional[float] = None,
+) -> List[DiffResult]:
+    """
+    Compare every task and return results in task order.
+
+    With ``manifests`` (a RunManifest per run) pairs whose file hashes match
+    short-circuit to 100% without decoding, and the rest are checked against
+    decoded-pixel hashes before a full diff; new digests are written back.
+
+    ``assets`` is the report mode (see config.REPORT_ASSETS) the images are
+    prepared for, and ``mode`` the comparison (see diff.MODES; "pixel" by
+    default). Pairs with identical pixels score 100 in every mode. With a
+    ``gate`` threshold, pairs are first checked against it with gate_diff();
+    only those that fail get an exact score and a diff image. With ``jobs``
+    > 1 the pairs are spread over a process pool, since diffing, thumbnailing
+    and base64 encoding are CPU-bound. A pair that fails comes back as a
+    DiffResult with ``error`` set instead of aborting the run. If a worker
+    process dies, unfinished pairs are resubmitted; once a round makes no
+    progress the rest run one per pool so only the culprit is lost.
+    """
+    results = [None] * len(tasks)
+    options = (backend, tile_rows, assets, mode, gate)
+    pending = _short_circuit(tasks, manifests, assets, results) if manifests else list(enumerate(tasks))
+
+    if jobs <= 1 or len(pending) <= 1:
+        for idx, task in pending:
+            results[idx] = _diff_task(task, *options)
+        pending = []
+
+    while pending:
+        lost = _diff_pool(pending, jobs, options, results)
+        if not lost:
+            break
+        logger.warning(f"PixelFrame Engine: A diff worker crashed; retrying {len(lost)} comparison(s)")
+        if len(lost) < len(pending):
+            pending = [(idx, tasks[idx]) for idx in lost]
+            continue
+        for idx in lost:
+            if _diff_pool([(idx, tasks[idx])], 1, options, results):
+                logger.error(f"PixelFrame Engine: Diff worker crashed on {tasks[idx].name}")
+                results[idx] = DiffResult(name=tasks[idx].name, error="diff worker process crashed")
+        break
+
+    if manifests:
+        _record_pixels(tasks, manifests, results)
+    return results
+
+
+def diff_summary(run1_name, run2_name, threshold, diff_results, plan, mode: Optional[DiffMode] = None) -> dict:
+    """The content of diff_results.json: every result plus what `pixelframe merge` needs."""
+    from datetime import datetime
+
+    return {
+        "version": 1,
+        "status": "PASSED" if all(r["passed"] for r in diff_results) else "FAILED",
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "run1": run1_name,
+        "run2": run2_name,
+        "threshold": threshold,
+        "score": (mode or DiffMode()).describe(),
+        "results": diff_results,
+        # Their similarity is a lower bound, not an exact score
+        "gated": sum(1 for r in diff_results if r.get("gated")),
+        "added": plan.added,
+        "removed": plan.removed,
+        "shard": plan.shard,
+    }
+
+
+def write_diff_report(out_dir, summary) -> Path:
+    """Write diff_results.json and render it as the HTML diff report; returns the report path."""
+    import json
+    from jinja2 import Environment, FileSystemLoader
+
+    out_dir = Path(out_dir)
+    (out_dir / DIFF_RESULTS_NAME).write_text(json.dumps(summary, indent=1), encoding="utf-8")
+
+    templates_dir = Path(__file__).parent.parent / "templates"
+    env = Environment(loader=FileSystemLoader(templates_dir))
+    template = env.get_template("diff_report.html")
+    report_file = out_dir / DIFF_REPORT_NAME
+    report_file.write_text(template.render(
+        run1_name=summary["run1"],
+        run2_name=summary["run2"],
+        timestamp=summary["created"],
+        threshold=summary["threshold"],
+        score=summary.get("score"),
+        gated=summary.get("gated", 0),
+        diff_results=summary["results"],
+        added=summary["added"],
+        removed=summary["removed"],
+    ), encoding="utf-8")
+    return report_file
@@ -1,6 +1,12 @@
 from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
 import logging
+import math
+
+from pixelframe.engine.diff import TILED_MIN_PIXELS, _image_size
+from pixelframe.engine.manifest import file_digest
+from pixelframe.engine.pngstream import PNGBandReader, UnsupportedPNG
+from pixelframe.engine.thumbcache import ThumbnailCache
 
 logger = logging.getLogger("pixelframe")
 
@@ -16,6 +22,16 @@ LABEL_COLOR = (220, 220, 220)
 BORDER_COLOR = (70, 70, 70)
 FADE_COLOR = BG_COLOR
 
+# Reach of Pillow's LANCZOS filter in output pixels
+_LANCZOS_SUPPORT = 3
+# Screenshots are box-reduced by an integer factor while decoding as long as
+# they stay at least this many times the tile width; LANCZOS does the rest.
+# Same trade-off as Pillow's resize(reducing_gap=3).
+_REDUCING_GAP = 3
+# Thumbnail cache key of a scaled, cropped grid tile
+TILE_VARIANT = f"grid-{THUMB_WIDTH}x{MAX_THUMB_HEIGHT}.png"
+_DEFAULT = object()
+
 
 def _get_font(size=16):
     """Try to load a clean font, fall back to default."""
@@ -28,31 +44,103 @@ def _get_font(size=16):
             return ImageFont.load_default()
 
 
-def _crop_and_fade(img, max_height):
-    """Crop a tall image and add a gradient fade at the bottom to signal continuation."""
-    if img.height <= max_height:
-        return img
-
-    cropped = img.crop((0, 0, img.width, max_height))
-
-    # Draw a gradient fade at the bottom 60px
+def _fade_bottom(img):
+    """Draw a gradient fade over the bottom 60px to signal that the image continues."""
     fade_height = 60
-    overlay = Image.new("RGBA", (cropped.width, fade_height))
+    overlay = Image.new("RGBA", (img.width, fade_height))
     draw = ImageDraw.Draw(overlay)
 
     for y in range(fade_height):
         alpha = int(255 * (y / fade_height))
         draw.line(
-            [(0, y), (cropped.width, y)],
+            [(0, y), (img.width, y)],
             fill=(*FADE_COLOR, alpha)
         )
 
-    cropped = cropped.convert("RGBA")
-    cropped.paste(overlay, (0, max_height - fade_height), overlay)
-    return cropped.convert("RGB")
+    img = img.convert("RGBA")
+    img.paste(overlay, (0, img.height - fade_height), overlay)
+    return img.convert("RGB")
 
 
-def create_composite(image_paths, output_path, breakpoint_names=None):
+def _open_top(path, rows, factor):
+    """
+    Decode the top ``rows`` rows of a screenshot, reduced about ``factor`` times.
+
+    Tall or very large PNGs are inflated only as far as those rows and
+    box-reduced band by band, so memory follows the band instead of the page
+    (and the decompression-bomb guard is never hit). Streaming costs about
+    twice as much per row as Pillow's decoder, so small screenshots that are
+    mostly needed anyway are decoded whole. JPEGs are decoded at a smaller
+    DCT scale. Returns the RGB image and its actual scale.
+    """
+    width, height = _image_size(path)
+    try:
+        if width * height <= TILED_MIN_PIXELS and rows * 2 > height:
+            raise UnsupportedPNG("small enough to decode whole")
+        reader = PNGBandReader(path)
+    except UnsupportedPNG:
+        img = Image.open(path)
+        if img.format == "JPEG":
+            img.draft("RGB", (img.width // factor, img.height // factor))
+        scale = width / img.width
+        top_rows = math.ceil(rows / scale)
+        top = img.crop((0, 0, img.width, top_rows)) if top_rows < img.height else img
+        if top.mode != "RGB":
+            top = top.convert("RGB")
+        extra = max(1, int(factor / scale))
+        return (top.reduce(extra), scale * extra) if extra > 1 else (top, scale)
+
+    top = Image.new("RGB", (math.ceil(width / factor), math.ceil(rows / factor)))
+    for y, band in reader.bands(factor * 64):
+        if y >= rows:
+            break
+        band = band.convert("RGB")
+        top.paste(band.reduce(factor) if factor > 1 else band, (0, y // factor))
+    return top, factor
+
+
+def _tile(path):
+    """
+    Scale a screenshot to THUMB_WIDTH and cut it at MAX_THUMB_HEIGHT.
+
+    Only the source rows that end up in the tile (plus the resampling
+    filter's reach) are decoded, and wide screenshots are box-reduced while
+    decoding so LANCZOS runs on a few times the tile size, not the page.
+    """
+    width, height = _image_size(path)
+    full_height = int(height * THUMB_WIDTH / width)
+    tile_height = min(full_height, MAX_THUMB_HEIGHT)
+    # Source rows covered by the tile, at the same vertical scale as resizing the whole image
+    source_rows = tile_height * height / full_height
+    rows = min(height, math.ceil(source_rows + _LANCZOS_SUPPORT * height / full_height) + 1)
+
+    factor = max(1, int(width / THUMB_WIDTH / _REDUCING_GAP))
+    top, scale = _open_top(path, rows, factor)
+    tile = top.resize((THUMB_WIDTH, tile_height), Image.LANCZOS, box=(0, 0, width / scale, source_rows / scale))
+    return _fade_bottom(tile) if full_height > MAX_THUMB_HEIGHT else tile
+
+
+def _cached_tile(path, digest, cache):
+    if cache is None:
+        return _tile(path)
+    digest = digest or file_digest(path)
+    cached = cache.lookup(digest, TILE_VARIANT)
+    if cached:
+        with Image.open(cached) as img:
+            img.load()
+            return img
+    tile = _tile(path)
+    cache.store(tile, digest, TILE_VARIANT, compress_level=1)
+    return tile
+
+
+def composite_path(run_path, page_name=""):
+    """Location of a page's composite grid inside a run directory."""
+    composite_dir = Path(run_path) / "composite"
+    return (composite_dir / page_name if page_name else composite_dir) / "grid.png"
+
+
+def create_composite(image_paths, output_path, breakpoint_names=None, digests=None, cache=_DEFAULT):
     """
     Create a well-organized composite grid image from screenshots.
 
@@ -60,6 +148,10 @@ def create_composite(image_paths, output_path, breakpoint_names=None):
         image_paths: List of paths to screenshot images.
         output_path: Path to save the composite image.
         breakpoint_names: Optional list of label strings for each image.
+        digests: Optional sha256 of each image (e.g. from the run manifest),
+            used as thumbnail cache keys instead of hashing the files again.
+        cache: ThumbnailCache for the scaled tiles; the user cache by
+            default, None to always rebuild them.
     """
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -68,14 +160,19 @@ def create_composite(image_paths, output_path, breakpoint_names=None):
         logger.warning("No images to create composite from.")
         return output_path
 
-    images = []
-    for p in image_paths:
+    if cache is _DEFAULT:
+        cache = ThumbnailCache.default()
+    digests = digests or [None] * len(image_paths)
+
+    # Scale each image to THUMB_WIDTH, cropped if too tall
+    processed = []
+    for p, digest in zip(image_paths, digests):
         try:
-            images.append(Image.open(p))
+            processed.append(_cached_tile(p, digest, cache))
         except Exception as e:
             logger.error(f"Failed to open image {p}: {e}")
 
-    if not images:
+    if not processed:
         raise RuntimeError("No valid images to create composite from.")
 
     # Generate default labels if not provided
@@ -83,21 +180,12 @@ def create_composite(image_paths, output_path, breakpoint_names=None):
         breakpoint_names = [Path(p).stem for p in image_paths]
 
     # Ensure we have the right number of labels
-    while len(breakpoint_names) < len(images):
+    while len(breakpoint_names) < len(processed):
         breakpoint_names.append(f"View {len(breakpoint_names) + 1}")
 
     font = _get_font(16)
     title_font = _get_font(14)
 
-    # Resize each image to THUMB_WIDTH, then crop if too tall
-    processed = []
-    for img in images:
-        ratio = THUMB_WIDTH / img.width
-        new_height = int(img.height * ratio)
-        resized = img.resize((THUMB_WIDTH, new_height), Image.LANCZOS)
-        cropped = _crop_and_fade(resized, MAX_THUMB_HEIGHT)
-        processed.append(cropped)
-
     # Calculate grid layout — auto columns based on count
     count = len(processed)
     if count <= 2:
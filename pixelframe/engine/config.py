@@ -1,6 +1,7 @@
-import yaml
+import re
 from pathlib import Path
-from dataclasses import dataclass
+from urllib.parse import urljoin, urlsplit
+from dataclasses import dataclass, field, fields
 from typing import List, Tuple, Optional
 from pixelframe.engine.devices import get_devices
 
@@ -14,14 +15,152 @@ class Breakpoint:
     has_touch: bool = False
     user_agent: Optional[str] = None
 
+@dataclass
+class WaitConfig:
+    """
+    Readiness strategy applied after the 'load' event, before each screenshot.
+
+    All checks share a single ``timeout`` budget (ms); ``delay`` is an extra
+    fixed sleep for pages that need it.
+    """
+    network_idle: bool = False
+    fonts: bool = True
+    images: bool = True
+    stable_frames: int = 3
+    selector: Optional[str] = None
+    predicate: Optional[str] = None
+    delay: int = 0
+    timeout: int = 15000
+
+@dataclass
+class ScreenshotConfig:
+    """
+    How screenshots are written to disk.
+
+    Chromium always hands back a PNG. With the defaults it is saved as is;
+    otherwise it is re-encoded: PNG at zlib ``compress_level`` (0-9), or
+    lossless WebP, where ``webp_method`` (0-6) trades encode time for size.
+    """
+    format: str = "png"
+    compress_level: Optional[int] = None
+    webp_method: int = 4
+
+@dataclass
+class NetworkConfig:
+    """
+    Request interception during capture.
+
+    ``mode`` picks how responses are served (see NETWORK_MODES). Recorded
+    responses live in ``cache_dir`` (default ``<output_dir>/network-cache``).
+    ``har`` is a HAR file replayed before the network on a cache miss.
+    Requests to hosts matching a ``block`` pattern (e.g. ``*.doubleclick.net``)
+    are aborted in every mode.
+    """
+    mode: str = "live"
+    cache_dir: Optional[str] = None
+    har: Optional[str] = None
+    block: List[str] = field(default_factory=list)
+
+@dataclass
+class Shard:
+    """
+    This node's share of a run split across ``count`` CI nodes (``index`` is 1-based).
+
+    ``timings`` is a run directory whose capture times weigh the assignment;
+    by default the newest indexed run in the output directory is used.
+    """
+    index: int
+    count: int
+    timings: Optional[str] = None
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+@dataclass
+class Region:
+    """
+    An area of the page that diffs ignore (``mask``) or are limited to (``regions``).
+
+    Either a CSS ``selector``, resolved to the boxes of its matching elements
+    at capture time, or an explicit ``rect`` ``[x, y, width, height]`` in CSS
+    pixels of the page. ``breakpoints`` limits it to those breakpoint names.
+    """
+    selector: Optional[str] = None
+    rect: Optional[List[float]] = None
+    breakpoints: List[str] = field(default_factory=list)
+
+    def applies_to(self, breakpoint) -> bool:
+        return not self.breakpoints or breakpoint.name.lower() in (name.lower() for name in self.breakpoints)
+
+@dataclass
+class PageConfig:
+    """
+    One route of a multi-page suite.
+
+    ``breakpoints``, ``wait`` and ``full_page`` override the suite-wide
+    settings when set; ``mask`` and ``regions`` add to the suite-wide ones.
+    """
+    name: str
+    url: str
+    breakpoints: Optional[List[Breakpoint]] = None
+    wait: Optional[WaitConfig] = None
+    full_page: Optional[bool] = None
+    mask: List[Region] = field(default_factory=list)
+    regions: List[Region] = field(default_factory=list)
+
 @dataclass
 class PixelFrameConfig:
     url: str
     output_dir: str
     full_page: bool
     breakpoints: List[Breakpoint]
+    workers: int = 1
+    engine: str = "sync"
+    report_assets: str = "linked"
+    report_formats: List[str] = field(default_factory=lambda: list(DEFAULT_REPORT_FORMATS))
+    # Keep screenshots once in <output_dir>/objects and hard-link them into runs
+    store: bool = False
+    wait: WaitConfig = field(default_factory=WaitConfig)
+    screenshot: ScreenshotConfig = field(default_factory=ScreenshotConfig)
+    network: NetworkConfig = field(default_factory=NetworkConfig)
+    pages: List[PageConfig] = field(default_factory=list)
+    # Areas diffs ignore, and areas diffs are limited to (see Region)
+    mask: List[Region] = field(default_factory=list)
+    regions: List[Region] = field(default_factory=list)
+    # Capture only this node's share of the screenshots
+    shard: Optional[Shard] = None
+    # Reuse earlier screenshots of pages whose fingerprint has not changed
+    incremental: bool = False
+    # Run to reuse screenshots from (default: the newest run with a fingerprint for each)
+    incremental_base: Optional[str] = None
 
 
+# Capture engines: "sync" drives playwright.sync_api (optionally from a pool of
+# threads), "async" runs every page on one playwright.async_api browser.
+ENGINES = ("sync", "async")
+
+# How reports reference images: "linked" points at the files already on disk,
+# "thumbnails" at downscaled copies that link to the originals, and "inline"
+# embeds base64 data URIs into a single self-contained HTML file.
+REPORT_ASSETS = ("linked", "thumbnails", "inline")
+
+# Report outputs. The PDF is printed from the HTML by a background process
+# (or later by `pixelframe report render`), never on the capture path.
+REPORT_FORMATS = ("html", "pdf", "json")
+
+# PDF is opt-in: it is printed by a background Chromium process that a CI job
+# may kill before it finishes
+DEFAULT_REPORT_FORMATS = ("html",)
+
+# Network modes: "live" loads everything from the network; "cache" serves
+# recorded responses and records misses, so only the first breakpoint of the
+# first run downloads; "record" always downloads and re-records; "offline"
+# serves recorded responses and fails any request that was not recorded.
+NETWORK_MODES = ("live", "cache", "record", "offline")
+
+# Screenshot file formats. WebP is always written lossless, so diffs are exact.
+SCREENSHOT_FORMATS = ("png", "webp")
+
 DEFAULT_BREAKPOINTS = [
     Breakpoint("mobile", 375, 812),
     Breakpoint("tablet", 768, 1024),
@@ -29,23 +168,153 @@ DEFAULT_BREAKPOINTS = [
     Breakpoint("desktop", 1920, 1080),
 ]
 
-def load_config(path: str) -> PixelFrameConfig:
-    p = Path(path)
-    if not p.exists():
-        raise FileNotFoundError(f"Config file not found: {path}")
-    
-    with open(p, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-        
-    if not data:
-        raise ValueError(f"Config file {path} is empty or invalid.")
-        
-    if "url" not in data:
-        raise ValueError("Config file must specify a 'url'.")
-        
-    output_dir = data.get("output", data.get("output_dir", "pixelframe-output"))
-    full_page = data.get("full_page", True)
-    
+def parse_report_formats(value) -> List[str]:
+    """Accept a list or a comma-separated string of report formats."""
+    if isinstance(value, str):
+        value = value.split(",")
+    formats = [str(f).strip().lower() for f in value if str(f).strip()]
+    unknown = [f for f in formats if f not in REPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown report format(s) {', '.join(unknown)}. Expected any of: {', '.join(REPORT_FORMATS)}.")
+    return formats
+
+
+def parse_screenshot(data) -> ScreenshotConfig:
+    """Build a ScreenshotConfig from the YAML 'screenshot' value: a format name or a mapping."""
+    if data is None:
+        return ScreenshotConfig()
+    if isinstance(data, str):
+        data = {"format": data}
+    if not isinstance(data, dict):
+        raise ValueError("'screenshot' must be a format name or a mapping.")
+
+    known = {f.name for f in fields(ScreenshotConfig)}
+    unknown = set(data) - known
+    if unknown:
+        raise ValueError(f"Unknown 'screenshot' option(s): {', '.join(sorted(unknown))}.")
+    screenshot = ScreenshotConfig(**data)
+    screenshot.format = str(screenshot.format).lower()
+    if screenshot.format not in SCREENSHOT_FORMATS:
+        raise ValueError(f"Unknown screenshot format '{screenshot.format}'. Expected one of: {', '.join(SCREENSHOT_FORMATS)}.")
+    if screenshot.compress_level is not None and not 0 <= screenshot.compress_level <= 9:
+        raise ValueError("'screenshot.compress_level' must be between 0 and 9.")
+    if not 0 <= screenshot.webp_method <= 6:
+        raise ValueError("'screenshot.webp_method' must be between 0 and 6.")
+    return screenshot
+
+
+def parse_network(data) -> NetworkConfig:
+    """Build a NetworkConfig from the YAML 'network' value: a mode name or a mapping."""
+    if data is None:
+        return NetworkConfig()
+    if isinstance(data, str):
+        data = {"mode": data}
+    if not isinstance(data, dict):
+        raise ValueError("'network' must be a mode name or a mapping.")
+
+    known = {f.name for f in fields(NetworkConfig)}
+    unknown = set(data) - known
+    if unknown:
+        raise ValueError(f"Unknown 'network' option(s): {', '.join(sorted(unknown))}.")
+    network = NetworkConfig(**data)
+    network.mode = str(network.mode).lower()
+    if network.mode not in NETWORK_MODES:
+        raise ValueError(f"Unknown network mode '{network.mode}'. Expected one of: {', '.join(NETWORK_MODES)}.")
+    if isinstance(network.block, str):
+        network.block = [network.block]
+    network.block = [str(host).strip().lower() for host in network.block if str(host).strip()]
+    return network
+
+
+def parse_regions(data, key="mask") -> List[Region]:
+    """
+    Parse a 'mask' or 'regions' list. Entries are CSS selectors, or mappings
+    with a ``selector`` or a ``rect`` and optional ``breakpoints``.
+    """
+    if data is None:
+        return []
+    if not isinstance(data, list):
+        raise ValueError(f"'{key}' must be a list of selectors or rects.")
+    regions = []
+    for entry in data:
+        if isinstance(entry, str):
+            entry = {"selector": entry}
+        if not isinstance(entry, dict):
+            raise ValueError(f"Each '{key}' entry must be a selector or a mapping.")
+        unknown = set(entry) - {f.name for f in fields(Region)}
+        if unknown:
+            raise ValueError(f"Unknown '{key}' option(s): {', '.join(sorted(unknown))}.")
+        region = Region(**entry)
+        if (region.selector is None) == (region.rect is None):
+            raise ValueError(f"Each '{key}' entry needs exactly one of 'selector' or 'rect'.")
+        if region.rect is not None:
+            if (
+                not isinstance(region.rect, list) or len(region.rect) != 4
+                or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in region.rect)
+                or region.rect[2] <= 0 or region.rect[3] <= 0
+            ):
+                raise ValueError(f"Invalid '{key}' rect {region.rect}. Use [x, y, width, height] with a positive size.")
+        if isinstance(region.breakpoints, str):
+            region.breakpoints = [region.breakpoints]
+        regions.append(region)
+    return regions
+
+
+def parse_shard(value, timings=None) -> Shard:
+    """Parse ``--shard i/N`` (1 <= i <= N)."""
+    match = re.match(r"^\s*(\d+)\s*/\s*(\d+)\s*$", str(value))
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise ValueError(f"Invalid shard '{value}'. Use i/N with 1 <= i <= N, e.g. 2/4.")
+    return Shard(int(match.group(1)), int(match.group(2)), timings)
+
+
+def parse_wait(data) -> WaitConfig:
+    """
+    Build a WaitConfig from the YAML 'wait' value.
+
+    A bare number is treated as the legacy fixed sleep in milliseconds.
+    """
+    if data is None:
+        return WaitConfig()
+    if isinstance(data, (int, float)) and not isinstance(data, bool):
+        return WaitConfig(fonts=False, images=False, stable_frames=0, delay=int(data))
+    if not isinstance(data, dict):
+        raise ValueError("'wait' must be a number of milliseconds or a mapping.")
+
+    known = {f.name for f in fields(WaitConfig)}
+    unknown = set(data) - known
+    if unknown:
+        raise ValueError(f"Unknown 'wait' option(s): {', '.join(sorted(unknown))}.")
+    return WaitConfig(**data)
+
+def resolve_pages(config: PixelFrameConfig) -> List[PageConfig]:
+    """
+    Return the pages to capture with every override filled in.
+
+    A config without 'pages' is a single unnamed page at ``config.url``, which
+    keeps the flat ``screenshots/<breakpoint>.png`` layout.
+    """
+    pages = config.pages or [PageConfig(name="", url=config.url)]
+    return [
+        PageConfig(
+            name=page.name,
+            url=urljoin(config.url or "", page.url),
+            breakpoints=page.breakpoints or config.breakpoints,
+            wait=page.wait or config.wait,
+            full_page=config.full_page if page.full_page is None else page.full_page,
+            mask=config.mask + page.mask,
+            regions=config.regions + page.regions,
+        )
+        for page in pages
+    ]
+
+def page_slug(path: str) -> str:
+    """Turn a route such as '/docs/getting-started' into a directory-safe name."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "-", path).strip("-.")
+    return slug or "index"
+
+def _parse_breakpoints(data) -> List[Breakpoint]:
+    """Parse 'devices' or 'breakpoints' from a config mapping. Empty when neither is set."""
     breakpoints = []
     
     if "devices" in data:
@@ -87,13 +356,92 @@ def load_config(path: str) -> PixelFrameConfig:
                 device_scale_factor=scale, is_mobile=is_mobile, 
                 has_touch=has_touch, user_agent=user_agent
             ))
-            
+
+    return breakpoints
+
+def _parse_pages(data, base_url) -> List[PageConfig]:
+    pages = []
+    for entry in data:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        if not isinstance(entry, dict):
+            raise ValueError("Each entry in 'pages' must be a path or a mapping.")
+
+        target = entry.get("url", entry.get("path"))
+        if not target:
+            raise ValueError("Each page must specify a 'path' or 'url'.")
+        if not base_url and "://" not in target:
+            raise ValueError(f"Page '{target}' is relative but the config has no base 'url'.")
+
+        pages.append(PageConfig(
+            name=page_slug(entry.get("name") or urlsplit(target).path),
+            url=target,
+            breakpoints=_parse_breakpoints(entry) or None,
+            wait=parse_wait(entry["wait"]) if "wait" in entry else None,
+            full_page=entry.get("full_page"),
+            mask=parse_regions(entry.get("mask"), "mask"),
+            regions=parse_regions(entry.get("regions"), "regions"),
+        ))
+
+    names = [p.name for p in pages]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate page name(s): {', '.join(duplicates)}. Give them explicit 'name's.")
+    return pages
+
+def load_config(path: str) -> PixelFrameConfig:
+    import yaml
+
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Config file not found: {path}")
+    
+    with open(p, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+        
+    if not data:
+        raise ValueError(f"Config file {path} is empty or invalid.")
+        
+    if "url" not in data and "pages" not in data:
+        raise ValueError("Config file must specify a 'url' or a list of 'pages'.")
+        
+    output_dir = data.get("output", data.get("output_dir", "pixelframe-output"))
+    full_page = data.get("full_page", True)
+    workers = int(data.get("workers", 1))
+    if workers < 1:
+        raise ValueError("'workers' must be at least 1.")
+    engine = data.get("engine", "sync")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Expected one of: {', '.join(ENGINES)}.")
+    report_assets = data.get("report_assets", "linked")
+    if report_assets not in REPORT_ASSETS:
+        raise ValueError(f"Unknown report_assets '{report_assets}'. Expected one of: {', '.join(REPORT_ASSETS)}.")
+    report_formats = parse_report_formats(data.get("report_formats", list(DEFAULT_REPORT_FORMATS)))
+    wait = parse_wait(data.get("wait"))
+    screenshot = parse_screenshot(data.get("screenshot"))
+    network = parse_network(data.get("network"))
+    
+    breakpoints = _parse_breakpoints(data)
     if not breakpoints:
         breakpoints = DEFAULT_BREAKPOINTS
+
+    pages = _parse_pages(data.get("pages") or [], data.get("url"))
         
     return PixelFrameConfig(
-        url=data["url"],
+        url=data.get("url", ""),
         output_dir=output_dir,
         full_page=full_page,
-        breakpoints=breakpoints
-    )
\ No newline at end of file
+        breakpoints=breakpoints,
+        workers=workers,
+        engine=engine,
+        report_assets=report_assets,
+        report_formats=report_formats,
+        store=bool(data.get("store", False)),
+        incremental=bool(data.get("incremental", False)),
+        wait=wait,
+        screenshot=screenshot,
+        network=network,
+        pages=pages,
+        mask=parse_regions(data.get("mask"), "mask"),
+        regions=parse_regions(data.get("regions"), "regions"),
+    )
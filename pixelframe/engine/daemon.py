@@ -0,0 +1,380 @@
+"""
+Long-lived capture daemon that keeps Chromium warm between runs.
+
+``pixelframe daemon start`` launches its browsers once and serves capture
+jobs on a localhost HTTP port. ``capture run`` finds it through a state file
+and sends the capture tasks it planned there instead of launching Chromium
+itself; compositing and reporting still happen in the CLI process. Every task
+gets its own page and browser context, closed when the screenshot is saved, so
+jobs share nothing but the browser process.
+
+The state file holds the port and a random token that every request must
+carry, and is readable only by its owner.
+"""
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional
+import http.client
+import json
+import logging
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import threading
+import time
+
+from pixelframe import __version__
+from pixelframe.engine.config import Breakpoint, NetworkConfig, Region, ScreenshotConfig, WaitConfig
+from pixelframe.engine.thumbcache import user_cache_dir
+
+logger = logging.getLogger("pixelframe")
+
+# Path of the daemon state file; "off" stops `capture run` from looking for a daemon
+DAEMON_ENV = "PIXELFRAME_DAEMON"
+STATE_NAME = "daemon.json"
+LOG_NAME = "daemon.log"
+TOKEN_HEADER = "X-PixelFrame-Token"
+
+
+def state_file() -> Optional[Path]:
+    """Where a running daemon advertises itself, or None if daemons are disabled."""
+    configured = os.environ.get(DAEMON_ENV)
+    if configured:
+        return None if configured.lower() == "off" else Path(configured)
+    return user_cache_dir() / STATE_NAME
+
+
+def _task_to_dict(task) -> dict:
+    data = asdict(task)
+    # The daemon may run in another working directory
+    data["file_path"] = str(Path(task.file_path).resolve())
+    return data
+
+
+def _task_from_dict(data):
+    from pixelframe.engine.capture import CaptureTask
+
+    return CaptureTask(
+        page=data["page"],
+        url=data["url"],
+        breakpoint=Breakpoint(**data["breakpoint"]),
+        full_page=data["full_page"],
+        wait=WaitConfig(**data["wait"]),
+        file_path=Path(data["file_path"]),
+        screenshot=ScreenshotConfig(**data["screenshot"]),
+        network=NetworkConfig(**data.get("network", {})),
+        mask=[Region(**r) for r in data.get("mask", [])],
+        regions=[Region(**r) for r in data.get("regions", [])],
+        incremental=data.get("incremental", False),
+        previous=data.get("previous"),
+    )
+
+
+class _Job:
+    """The tasks of one capture request, its response cache and the results collected so far."""
+
+    def __init__(self, tasks):
+        from pixelframe.engine.capture import _run_network
+
+        self.tasks = tasks
+        # Per job, so neither cache counters nor state carry over between jobs
+        self.network = _run_network(tasks)
+        self.results = [None] * len(tasks)
+        self.finished = threading.Event()
+        self._left = len(tasks)
+        self._lock = threading.Lock()
+        if not tasks:
+            self.finished.set()
+
+    def complete(self, idx, result):
+        self.results[idx] = result
+        with self._lock:
+            self._left -= 1
+            if not self._left:
+                self.finished.set()
+
+
+class CaptureDaemon:
+    """
+    A pool of warm browsers behind a localhost HTTP endpoint.
+
+    Each browser is owned by one thread (Playwright's sync API is bound to the
+    thread that started it). Tasks from all jobs share one FIFO queue, so a
+    job's breakpoints are spread over every idle browser.
+    """
+
+    def __init__(self, browsers=1, port=0, state_path=None):
+        self.browsers = max(1, browsers)
+        self.state_path = Path(state_path or state_file())
+        self.token = secrets.token_hex(16)
+        self.tasks = queue.Queue()
+        self.jobs = 0
+        self.started = time.time()
+        self._workers = []
+        self._ready = threading.Semaphore(0)
+        self._errors = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        # server_close() then waits for in-flight jobs to be answered
+        self.server.daemon_threads = False
+        self.server.owner = self
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def _worker(self):
+        from pixelframe.engine.browser import BrowserManager
+        from pixelframe.engine.capture import _capture_task
+
+        manager = BrowserManager()
+        try:
+            manager.start()
+        except Exception as e:
+            self._errors.append(e)
+            return
+        finally:
+            self._ready.release()
+        try:
+            while True:
+                item = self.tasks.get()
+                if item is None:
+                    return
+                job, idx, task = item
+                result = None
+                try:
+                    if not manager.browser or not manager.browser.is_connected():
+                        logger.warning("PixelFrame Engine: Daemon browser disconnected, relaunching")
+                        try:
+                            manager.stop()
+                        except Exception:
+                            pass
+                        manager = BrowserManager()
+                        manager.start()
+                    result = _capture_task(task, manager, job.network)
+                except Exception as e:
+                    logger.error(f"PixelFrame Engine: Failed to capture {task.label}: {e}")
+                finally:
+                    job.complete(idx, result)
+        finally:
+            manager.stop()
+
+    def submit(self, tasks) -> list:
+        """Queue ``tasks`` and wait for them; returns a CaptureResult or None per task."""
+        job = _Job(tasks)
+        self.jobs += 1
+        for idx, task in enumerate(tasks):
+            self.tasks.put((job, idx, task))
+        job.finished.wait()
+        if job.network:
+            logger.info(job.network.summary())
+        return job.results
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "version": __version__,
+            "browsers": self.browsers,
+            "jobs": self.jobs,
+            "queued": self.tasks.qsize(),
+            "uptime_s": round(time.time() - self.started, 1),
+        }
+
+    def _write_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(f"{self.state_path.name}.{os.getpid()}.tmp")
+        # Created owner-only: the token is all that guards the port
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "port": self.port, "token": self.token, "version": __version__}, f)
+        tmp.replace(self.state_path)
+
+    def _remove_state(self):
+        try:
+            if json.loads(self.state_path.read_text(encoding="utf-8")).get("pid") == os.getpid():
+                self.state_path.unlink()
+        except (OSError, ValueError):
+            pass
+
+    def serve_forever(self):
+        """Launch the browsers, advertise the port and serve until shut down."""
+        for i in range(self.browsers):
+            thread = threading.Thread(target=self._worker, name=f"pixelframe-daemon-{i}", daemon=True)
+            thread.start()
+            self._workers.append(thread)
+        for _ in self._workers:
+            self._ready.acquire()
+        try:
+            if self._errors:
+                raise RuntimeError(f"PixelFrame Engine: Could not launch the daemon's browser: {self._errors[0]}")
+            self._write_state()
+            logger.info(f"PixelFrame Engine: Daemon serving {self.browsers} browser(s) on 127.0.0.1:{self.port}")
+            self.server.serve_forever()
+        finally:
+            self._remove_state()
+            self.server.server_close()
+            for _ in self._workers:
+                self.tasks.put(None)
+            for thread in self._workers:
+                thread.join(timeout=30)
+
+    def shutdown(self):
+        # serve_forever() must be stopped from another thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = f"PixelFrame/{__version__}"
+    # Per socket operation, so a stalled client cannot hold up shutdown
+    timeout = 60
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        if secrets.compare_digest(self.headers.get(TOKEN_HEADER, ""), self.server.owner.token):
+            return True
+        self._reply(403, {"error": "invalid token"})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == "/status":
+            self._reply(200, self.server.owner.status())
+        else:
+            self._reply(404, {"error": f"unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        daemon = self.server.owner
+        if self.path == "/shutdown":
+            self._reply(200, {"stopping": True})
+            daemon.shutdown()
+            return
+        if self.path != "/capture":
+            self._reply(404, {"error": f"unknown endpoint {self.path}"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            tasks = [_task_from_dict(t) for t in payload["tasks"]]
+        except (KeyError, TypeError, ValueError) as e:
+            self._reply(400, {"error": f"invalid capture job: {e}"})
+            return
+        results = daemon.submit(tasks)
+        self._reply(200, {"results": [
+            None if r is None else {
+                "path": str(r.path), "wait_ms": r.wait_ms, "capture_ms": r.capture_ms, "encode_ms": r.encode_ms,
+                "fingerprint": r.fingerprint, "reused": r.reused, "regions": r.regions,
+            }
+            for r in results
+        ]})
+
+    def log_message(self, format, *args):
+        logger.debug(f"daemon: {format % args}")
+
+
+class DaemonClient:
+    """Talks to a running CaptureDaemon."""
+
+    def __init__(self, port, token, pid=None):
+        self.port = port
+        self.token = token
+        self.pid = pid
+
+    @classmethod
+    def find(cls) -> Optional["DaemonClient"]:
+        """The daemon advertised in the state file, if it is running and answers."""
+        path = state_file()
+        if path is None:
+            return None
+        try:
+            state = json.loads(path.read_text(encoding="utf-8"))
+            client = cls(state["port"], state["token"], state.get("pid"))
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            status = client.status(timeout=2)
+        except (OSError, RuntimeError, http.client.HTTPException):
+            # Left behind by a daemon that was killed
+            return None
+        if status.get("version") != __version__:
+            logger.warning(
+                f"PixelFrame Engine: Ignoring daemon {status.get('version')} (this is {__version__}); "
+                f"restart it with `pixelframe daemon stop && pixelframe daemon start`"
+            )
+            return None
+        return client
+
+    def _request(self, method, path, payload=None, timeout=None) -> dict:
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=timeout)
+        try:
+            body = None if payload is None else json.dumps(payload).encode()
+            conn.request(method, path, body=body, headers={TOKEN_HEADER: self.token, "Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = json.loads(response.read() or b"{}")
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise RuntimeError(f"PixelFrame Engine: Daemon refused {path}: {data.get('error', response.status)}")
+        return data
+
+    def status(self, timeout=None) -> dict:
+        return self._request("GET", "/status", timeout=timeout)
+
+    def stop(self):
+        self._request("POST", "/shutdown", {}, timeout=10)
+
+    def capture(self, tasks) -> list:
+        """Capture ``tasks`` on the daemon; returns a CaptureResult or None per task, in order."""
+        from pixelframe.engine.capture import CaptureResult
+
+        data = self._request("POST", "/capture", {"tasks": [_task_to_dict(t) for t in tasks]})
+        results = []
+        for task, result in zip(tasks, data["results"]):
+            if result is None:
+                results.append(None)
+                continue
+            # Keep the caller's (possibly relative) path; only the suffix can change
+            path = Path(task.file_path).with_suffix(Path(result["path"]).suffix)
+            results.append(CaptureResult(
+                task.page, task.breakpoint, path, result["wait_ms"], result["capture_ms"], result["encode_ms"],
+                result.get("fingerprint"), result.get("reused"), result.get("regions"),
+            ))
+        return results
+
+
+def spawn(browsers=1, port=0, timeout=60.0) -> DaemonClient:
+    """Start a detached daemon and wait until it answers."""
+    path = state_file()
+    if path is None:
+        raise RuntimeError(f"PixelFrame Engine: Daemons are disabled (${DAEMON_ENV}=off).")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    log_file = path.with_name(LOG_NAME)
+    with open(log_file, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "pixelframe.cli.main", "daemon", "start", "--foreground",
+             "--browsers", str(browsers), "--port", str(port)],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        client = DaemonClient.find()
+        if client and client.pid == process.pid:
+            return client
+        if process.poll() is not None:
+            raise RuntimeError(f"PixelFrame Engine: Daemon exited during startup; see {log_file}")
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"PixelFrame Engine: Daemon did not start within {timeout:.0f}s; see {log_file}")
@@ -1,20 +1,207 @@
 from PIL import Image, ImageChops, ImageEnhance, ImageDraw
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
+from typing import List, Optional
 import logging
 
+from pixelframe.engine.pngstream import PNGBandReader, PNGWriter, UnsupportedPNG
+from pixelframe.engine.timing import span
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is an optional accelerator (pip install "pixelframe[fast]")
+    np = None
+
 logger = logging.getLogger("pixelframe")
 
-def generate_diff(img1_path: Path, img2_path: Path, output_path: Path) -> float:
+# "auto" picks numpy when it is installed and falls back to the pure-PIL path.
+BACKENDS = ("auto", "numpy", "pil")
+
+# Rows handled per vectorized pass in the numpy backend. Bounds the size of the
+# int temporaries without noticeably changing throughput.
+CHUNK_ROWS = 512
+
+# Above this many pixels per image, "auto" streams both PNGs band by band
+# instead of decoding them whole (roughly a 4K-wide page at DPR 2 that is
+# ~5000 px tall).
+TILED_MIN_PIXELS = 40_000_000
+
+# Grayscale blocks the tiled diff may keep between its two passes. Past this,
+# the second pass re-streams both images instead.
+TILED_GRAY_CACHE = 64 << 20
+
+# Overlay colour of pixels a mask keeps out of the comparison
+MASK_COLOR = (160, 160, 160)
+
+# How pixels are judged changed (see DiffMode):
+#   "pixel"     - the original score: a pixel is changed when its grayscale
+#                 difference, contrast-stretched 5x around the image's mean
+#                 difference, is above zero.
+#   "tolerance" - changed when any channel differs by more than ``tolerance``.
+#   "antialias" - pixelmatch: changed when the YIQ colour difference exceeds
+#                 ``aa_threshold``, unless the pixel is detected as anti-aliasing.
+#   "ssim"      - structural similarity of 8x8 luma blocks.
+MODES = ("pixel", "tolerance", "antialias", "ssim")
+
+# Overlay colour of differences the antialias mode discounts
+AA_COLOR = (255, 255, 0)
+
+# Side of the square blocks the ssim mode scores
+SSIM_BLOCK = 8
+
+
+@dataclass
+class DiffMode:
+    """A comparison algorithm and its parameters."""
+    name: str = "pixel"
+    # "tolerance": the largest per-channel difference (0-255) still counted as unchanged
+    tolerance: int = 8
+    # "antialias": pixelmatch's colour threshold (0-1); 0.1 is its default
+    aa_threshold: float = 0.1
+
+    def describe(self) -> dict:
+        """What a similarity score means under this mode, for JSON output."""
+        meaning = {
+            "pixel": "Percent of compared pixels whose grayscale difference, contrast-stretched 5x around "
+                     "the mean difference, is zero.",
+            "tolerance": f"Percent of compared pixels where no channel differs by more than {self.tolerance} (of 255).",
+            "antialias": f"Percent of compared pixels whose YIQ colour difference is within {self.aa_threshold} "
+                         "(pixelmatch scale, 0-1). Differences detected as anti-aliasing count as unchanged.",
+            "ssim": f"Mean structural similarity (SSIM) of {SSIM_BLOCK}x{SSIM_BLOCK} luma blocks, as a percent, "
+                    "weighted by compared pixels per block. Negative block SSIM counts as 0.",
+        }[self.name]
+        parameters = {"tolerance": {"tolerance": self.tolerance}, "antialias": {"aa_threshold": self.aa_threshold}}
+        return {"mode": self.name, "parameters": parameters.get(self.name, {}), "unit": "percent", "meaning": meaning}
+
+
+@dataclass
+class DiffMask:
+    """
+    The pixels a diff compares. Boxes are ``(left, top, right, bottom)`` in
+    image pixels.
+
+    With ``regions`` (even an empty list) only pixels inside one of them are
+    compared; without, the whole image is. Pixels inside an ``ignore`` box
+    never are. Masked pixels count neither as changed nor as unchanged.
+    """
+    regions: Optional[List[tuple]] = None
+    ignore: List[tuple] = field(default_factory=list)
+
+    @classmethod
+    def from_entries(cls, *entries) -> Optional["DiffMask"]:
+        """
+        The union of the ``mask`` and ``regions`` boxes that capture recorded
+        for one screenshot in each run's manifest, or None if there are none.
+        """
+        regions, ignore = None, []
+        for entry in entries:
+            if entry.get("regions") is not None:
+                regions = (regions or []) + [_box(b) for b in entry["regions"]]
+            ignore += [_box(b) for b in entry.get("mask", ())]
+        if regions is None and not ignore:
+            return None
+        return cls(regions, ignore)
+
+    def image(self, size) -> Image.Image:
+        """An "L" image of ``size``: 255 where pixels are compared, 0 where they are masked."""
+        mask = Image.new("L", size, 255 if self.regions is None else 0)
+        for boxes, value in ((self.regions or (), 255), (self.ignore, 0)):
+            for box in boxes:
+                box = _clip(box, size)
+                if box:
+                    mask.paste(value, box)
+        return mask
+
+    def band(self, top, bottom, width):
+        """Bool array of the compared pixels in rows ``[top, bottom)``, or None when all of them are."""
+        def hits(boxes):
+            return [b for b in boxes if b[1] < bottom and b[3] > top and b[0] < width and b[2] > 0]
+
+        regions, ignore = hits(self.regions or ()), hits(self.ignore)
+        if self.regions is None and not ignore:
+            return None
+        include = np.full((bottom - top, width), self.regions is None)
+        for boxes, value in ((regions, True), (ignore, False)):
+            for left, y0, right, y1 in boxes:
+                include[max(y0, top) - top:min(y1, bottom) - top, max(left, 0):right] = value
+        return include
+
+
+def _box(rect):
+    """``[x, y, width, height]`` from a manifest as a ``(left, top, right, bottom)`` box."""
+    x, y, width, height = rect
+    return (x, y, x + width, y + height)
+
+
+def _clip(box, size):
+    left, top, right, bottom = max(box[0], 0), max(box[1], 0), min(box[2], size[0]), min(box[3], size[1])
+    return (left, top, right, bottom) if right > left and bottom > top else None
+
+
+def _nothing_to_compare():
+    return ValueError("The diff regions and masks leave no pixels to compare.")
+
+
+def generate_diff(
+    img1_path: Path, img2_path: Path, output_path: Path,
+    backend: str = "auto", tile_rows: int = None, mask: DiffMask = None, mode: DiffMode = None
+) -> float:
     """
     Compare two images and save a diff image showing highlighted differences.
     Returns the similarity percentage.
+
+    Both backends produce the same score and the same overlay; the numpy one
+    does it in a few vectorized passes instead of a chain of full-size images.
+    With ``tile_rows`` (or automatically for huge images) the numpy backend
+    streams both PNGs in bands of that many rows, so memory is bounded by the
+    band rather than the page height.
+
+    With a ``mask`` only the pixels it includes are compared and scored, and
+    the numpy backend skips the rows and columns it excludes altogether.
+    Masked pixels are painted MASK_COLOR in the overlay.
+
+    Modes other than "pixel" (see MODES) need the numpy backend. Their
+    score does not depend on image-wide statistics, so they are computed in
+    a single pass over bands of rows, streamed for huge images.
     """
     if not img1_path.exists() or not img2_path.exists():
         logger.error("Missing image for diffing.")
         return 0.0
 
-    img1 = Image.open(img1_path).convert("RGB")
-    img2 = Image.open(img2_path).convert("RGB")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown diff backend '{backend}'. Expected one of: {', '.join(BACKENDS)}.")
+    if mode is not None and mode.name not in MODES:
+        raise ValueError(f"Unknown diff mode '{mode.name}'. Expected one of: {', '.join(MODES)}.")
+    scored = mode is not None and mode.name != "pixel"
+    if backend == "auto":
+        backend = "numpy" if np is not None or scored else "pil"
+    if backend == "pil" and scored:
+        raise ValueError(f"The '{mode.name}' diff mode requires the numpy backend.")
+    if backend == "pil":
+        if tile_rows:
+            raise ValueError("Tiled diffing requires the numpy backend.")
+        return _diff_pil(img1_path, img2_path, output_path, mask)
+
+    if np is None:
+        raise RuntimeError("The numpy diff backend requires NumPy: pip install 'pixelframe[fast]'")
+
+    if tile_rows is None:
+        tile_rows = _auto_tile_rows(img1_path, img2_path)
+    if scored:
+        return _diff_scored(img1_path, img2_path, output_path, tile_rows, mask, mode)
+    if tile_rows:
+        try:
+            return _diff_tiled(img1_path, img2_path, output_path, tile_rows, mask)
+        except UnsupportedPNG as e:
+            logger.info(f"Falling back to whole-image diff: {e}")
+    return _diff_numpy(img1_path, img2_path, output_path, mask)
+
+
+def _diff_pil(img1_path: Path, img2_path: Path, output_path: Path, mask: DiffMask = None) -> float:
+    with span("diff.decode"):
+        img1 = Image.open(img1_path).convert("RGB")
+        img2 = Image.open(img2_path).convert("RGB")
 
     # If dimensions mismatch, crop/pad to the maximum size of both
     max_w = max(img1.width, img2.width)
@@ -30,35 +217,57 @@ def generate_diff(img1_path: Path, img2_path: Path, output_path: Path) -> float:
         new_img2.paste(img2, (0, 0))
         img2 = new_img2
 
+    compared = mask.image((max_w, max_h)) if mask else None
+    if compared is not None and not compared.getbbox():
+        raise _nothing_to_compare()
+
     # Calculate difference
-    diff = ImageChops.difference(img1, img2)
+    with span("diff.compare"):
+        diff = ImageChops.difference(img1, img2)
+        if compared is not None:
+            diff.paste(0, None, ImageChops.invert(compared))
 
-    # Calculate similarity score
-    # difference returns an image where pixel values represent the absolute difference.
-    # We sum up the differences and calculate the percentage of changed pixels.
-    bbox = diff.getbbox()
+        # Calculate similarity score
+        # difference returns an image where pixel values represent the absolute difference.
+        # We sum up the differences and calculate the percentage of changed pixels.
+        bbox = diff.getbbox()
     if not bbox:
         # Images are exactly identical
-        diff.save(output_path)
+        with span("diff.encode"):
+            diff.save(output_path)
         return 100.0
 
-    # To visualize diffs clearly, we convert to grayscale, then colorize differences as red
-    diff_gray = diff.convert("L")
-    
-    # Enhance the difference so it's very visible
-    diff_gray = ImageEnhance.Contrast(diff_gray).enhance(5.0)
-    
-    # Create a red overlay where differences exist
-    red_mask = Image.new("RGB", (max_w, max_h), (255, 0, 0))
-    
-    # Fade the base image (img2) to 30% opacity to use as a backdrop
-    base_faded = Image.blend(img2, Image.new("RGB", (max_w, max_h), (255, 255, 255)), 0.7)
-    
-    # Composite the red highlights over the faded base image
-    diff_composite = Image.composite(red_mask, base_faded, diff_gray)
-    
-    diff_composite.save(output_path)
-    
+    with span("diff.compare"):
+        # To visualize diffs clearly, we convert to grayscale, then colorize differences as red
+        diff_gray = diff.convert("L")
+
+        if compared is None:
+            # Enhance the difference so it's very visible
+            diff_gray = ImageEnhance.Contrast(diff_gray).enhance(5.0)
+        else:
+            # The same enhancement, with the mean taken over the compared pixels only
+            hist = diff_gray.histogram(compared)
+            lut = _contrast_table(hist, sum(hist))
+            diff_gray = diff_gray.point(lut)
+
+        # Create a red overlay where differences exist
+        red_mask = Image.new("RGB", (max_w, max_h), (255, 0, 0))
+
+        # Fade the base image (img2) to 30% opacity to use as a backdrop
+        base_faded = Image.blend(img2, Image.new("RGB", (max_w, max_h), (255, 255, 255)), 0.7)
+
+        # Composite the red highlights over the faded base image
+        diff_composite = Image.composite(red_mask, base_faded, diff_gray)
+        if compared is not None:
+            diff_composite.paste(MASK_COLOR, None, ImageChops.invert(compared))
+
+    with span("diff.encode"):
+        diff_composite.save(output_path)
+
+    if compared is not None:
+        identical_pixels = sum(n for v, n in zip(lut, hist) if v == 0)
+        return round(identical_pixels / sum(hist) * 100.0, 2)
+
     # Rough similarity calculation based on non-zero pixels in grayscale diff
     histogram = diff_gray.histogram()
     # The first element is the number of fully black pixels (no difference)
@@ -68,6 +277,568 @@ def generate_diff(img1_path: Path, img2_path: Path, output_path: Path) -> float:
     
     return round(similarity, 2)
 
+
+# The PIL path scores a pixel as unchanged when the 5x contrast-enhanced
+# grayscale difference is 0, i.e. when 5 * v <= 4 * mean(v). The helpers below
+# reproduce those exact semantics from a 256-bin histogram of v.
+
+def _contrast_table(hist, total):
+    """Point table equivalent to ImageEnhance.Contrast(gray).enhance(5.0), as a list."""
+    mean = int(sum(i * int(n) for i, n in enumerate(hist)) / total + 0.5)
+    return [min(max(5 * i - 4 * mean, 0), 255) for i in range(256)]
+
+
+def _contrast_lut(hist, total):
+    """_contrast_table as a NumPy lookup array."""
+    return np.array(_contrast_table(hist, total), dtype=np.uint8)
+
+
+def _similarity_from_histogram(hist, total, lut):
+    identical_pixels = int(hist[lut == 0].sum())
+    similarity = (identical_pixels / total) * 100.0
+    return round(similarity, 2)
+
+
+@lru_cache(maxsize=None)
+def _fade_lut():
+    """
+    Point table for the faded img2 backdrop of the overlay.
+
+    Built by running the PIL path's Image.blend over every input value once,
+    so it is bit-identical to it on any Pillow version.
+    """
+    ramp = Image.frombytes("L", (256, 1), bytes(range(256)))
+    return list(Image.blend(ramp, Image.new("L", (256, 1), 255), 0.7).getdata()) * 3
+
+
+def _open_rgb(path, size):
+    """Decode an image as RGB, padded with white to ``size`` like the PIL path."""
+    img = Image.open(path)
+    img = img.convert("RGB") if img.mode != "RGB" else img
+    img.load()
+    if img.size != size:
+        padded = Image.new("RGB", size, (255, 255, 255))
+        padded.paste(img, (0, 0))
+        img = padded
+    return img
+
+
+def _pixels(img, box):
+    """(h, w, 3) array for one region of a decoded image."""
+    return np.asarray(img.crop(box))
+
+
+def _changed_box(a, b, include=None):
+    """(top, bottom, left, right) of the (included) pixels that differ between a and b, or None."""
+    if include is not None:
+        ne = (a != b).any(axis=2) & include
+        rows = np.flatnonzero(ne.any(axis=1))
+        if not rows.size:
+            return None
+        cols = np.flatnonzero(ne.any(axis=0))
+        return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    ne = (a != b).reshape(a.shape[0], -1)
+    rows = np.flatnonzero(ne.any(axis=1))
+    if not rows.size:
+        return None
+    cols = np.flatnonzero(ne.any(axis=0).reshape(-1, 3).any(axis=1))
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+
+def _band_columns(include, width):
+    """The ``[left, right)`` columns of a band worth comparing, or None when it is fully masked."""
+    if include is None:
+        return 0, width
+    cols = np.flatnonzero(include.any(axis=0))
+    if not cols.size:
+        return None
+    return int(cols[0]), int(cols[-1]) + 1
+
+
+def _compare_band(a, b, include):
+    """
+    The changed box of one band and the grayscale difference inside it, or None.
+
+    Masked pixels of the block are zeroed (the lookup table keeps 0 at 0, so
+    they never turn red); the histogram counts only compared pixels.
+    """
+    box = _changed_box(a, b, include)
+    if box is None:
+        return None
+    top, bottom, left, right = box
+    gray = _gray_difference(a[top:bottom, left:right], b[top:bottom, left:right])
+    if include is None:
+        return box, gray, np.bincount(gray.ravel(), minlength=256), gray.size
+    inside = include[top:bottom, left:right]
+    gray[~inside] = 0
+    return box, gray, np.bincount(gray[inside], minlength=256), int(inside.sum())
+
+
+def _paint_masked(overlay, include, origin=(0, 0)):
+    """Paint the masked pixels of a band (``include`` False) MASK_COLOR."""
+    if include is not None and not include.all():
+        overlay.paste(MASK_COLOR, origin + (origin[0] + include.shape[1], origin[1] + include.shape[0]),
+                      Image.fromarray(np.where(include, 0, 255).astype(np.uint8)))
+
+
+def _gray_difference(a, b):
+    """Grayscale of |a - b|, matching ImageChops.difference(...).convert("L")."""
+    d = np.maximum(a, b)
+    d -= np.minimum(a, b)
+    gray = d[..., 0] * np.uint32(19595)
+    gray += d[..., 1] * np.uint32(38470)
+    gray += d[..., 2] * np.uint32(7471)
+    gray += 0x8000
+    gray >>= 16
+    return gray.astype(np.uint8)
+
+
+def _image_size(path):
+    # Read PNG dimensions from IHDR: Pillow's decompression-bomb guard refuses
+    # to even open the tallest full-page captures.
+    try:
+        return PNGBandReader(path).size
+    except UnsupportedPNG:
+        with Image.open(path) as img:
+            return img.size
+
+
+def _auto_tile_rows(img1_path, img2_path):
+    """The band height huge images are streamed in, or 0 to decode them whole."""
+    largest = max(w * h for w, h in (_image_size(img1_path), _image_size(img2_path)))
+    return CHUNK_ROWS if largest > TILED_MIN_PIXELS else 0
+
+
+def _diff_numpy(img1_path: Path, img2_path: Path, output_path: Path, mask: DiffMask = None) -> float:
+    size1, size2 = _image_size(img1_path), _image_size(img2_path)
+    size = (max(size1[0], size2[0]), max(size1[1], size2[1]))
+    width, height = size
+    with span("diff.decode"):
+        img1 = _open_rgb(img1_path, size)
+        img2 = _open_rgb(img2_path, size)
+
+    # Pixels are pulled out one band of rows at a time, and only the bounding
+    # box of the changes within a band is ever converted to grayscale;
+    # everything outside it has a difference of 0. Masked rows and columns
+    # are never pulled out at all.
+    hist = np.zeros(256, dtype=np.int64)
+    blocks = []
+    total = counted = 0
+    with span("diff.compare"):
+        for y in range(0, height, CHUNK_ROWS):
+            bottom = min(y + CHUNK_ROWS, height)
+            include = mask.band(y, bottom, width) if mask else None
+            columns = _band_columns(include, width)
+            if columns is None:
+                continue
+            left, right = columns
+            if include is not None:
+                include = include[:, left:right]
+            total += (bottom - y) * (right - left) if include is None else int(include.sum())
+            band = (left, y, right, bottom)
+            compared = _compare_band(_pixels(img1, band), _pixels(img2, band), include)
+            if compared is None:
+                continue
+            (top, _, x, _), gray, block_hist, pixels = compared
+            hist += block_hist
+            counted += pixels
+            blocks.append((y + top, left + x, gray))
+    del img1
+    if not total:
+        raise _nothing_to_compare()
+
+    if not blocks:
+        # Images are exactly identical
+        del img2
+        with span("diff.encode"):
+            Image.new("RGB", size).save(output_path)
+        return 100.0
+
+    hist[0] += total - counted
+    lut = _contrast_lut(hist, total)
+
+    # The faded backdrop is a single point() pass; red is then painted through
+    # the enhanced mask only inside the changed boxes.
+    with span("diff.compare"):
+        overlay = img2.point(_fade_lut())
+        del img2
+        for y, x, gray in blocks:
+            h, w = gray.shape
+            overlay.paste((255, 0, 0), (x, y, x + w, y + h), Image.fromarray(lut[gray]))
+        if mask:
+            for y in range(0, height, CHUNK_ROWS):
+                _paint_masked(overlay, mask.band(y, min(y + CHUNK_ROWS, height), width), (0, y))
+    with span("diff.encode"):
+        overlay.save(output_path)
+
+    return _similarity_from_histogram(hist, total, lut)
+
+
+def _padded_bands(reader, size, rows):
+    """
+    Yield ``(y, pixels)`` RGB bands of exactly the rows of ``size``, padded with
+    white where the image is narrower or shorter than the comparison canvas.
+    """
+    width, height = size
+    source = reader.bands(rows)
+    for y in range(0, height, rows):
+        count = min(rows, height - y)
+        band = next(source, None) if y < reader.size[1] else None
+        if band is not None and band[1].size == (width, count):
+            yield y, np.asarray(band[1].convert("RGB"))
+            continue
+        pixels = np.full((count, width, 3), 255, dtype=np.uint8)
+        if band is not None:
+            part = np.asarray(band[1].convert("RGB"))
+            pixels[:part.shape[0], :part.shape[1]] = part
+        yield y, pixels
+
+
+def _band_pairs(reader1, reader2, size, rows):
+    for (y, a), (_, b) in zip(_padded_bands(reader1, size, rows), _padded_bands(reader2, size, rows)):
+        yield y, a, b
+
+
+def _diff_tiled(img1_path: Path, img2_path: Path, output_path: Path, tile_rows: int, mask: DiffMask = None) -> float:
+    """
+    Streaming variant of _diff_numpy for very tall screenshots.
+
+    The score needs the mean difference of the whole image before any overlay
+    pixel can be coloured, so rendering is a second pass. The grayscale blocks
+    of the first pass are kept while they fit in TILED_GRAY_CACHE bytes; in
+    that case the second pass only streams img2. Otherwise both PNGs are
+    streamed again and the changed bands recomputed.
+    """
+    reader1, reader2 = PNGBandReader(img1_path), PNGBandReader(img2_path)
+    size = (max(reader1.size[0], reader2.size[0]), max(reader1.size[1], reader2.size[1]))
+    width, height = size
+
+    def band_mask(y, rows):
+        include = mask.band(y, y + rows, width) if mask else None
+        columns = _band_columns(include, width)
+        if columns is None:
+            return include, None, None
+        left, right = columns
+        return include, columns, None if include is None else include[:, left:right]
+
+    def compare(y, a, b):
+        include, columns, cropped = band_mask(y, a.shape[0])
+        if columns is None:
+            return None, 0
+        left, right = columns
+        pixels = a.shape[0] * (right - left) if cropped is None else int(cropped.sum())
+        compared = _compare_band(a[:, left:right], b[:, left:right], cropped)
+        if compared is None:
+            return None, pixels
+        (top, bottom, x0, x1), gray, block_hist, counted = compared
+        return ((top, bottom, left + x0, left + x1), gray, block_hist, counted), pixels
+
+    hist = np.zeros(256, dtype=np.int64)
+    changed = {}
+    cache, cached_bytes = {}, 0
+    total = counted = 0
+    # Decoding and comparing are interleaved band by band, so they are timed
+    # together as "scan" (pass 1) and "render" (pass 2, including the encode).
+    with span("diff.scan"):
+        for y, a, b in _band_pairs(reader1, reader2, size, tile_rows):
+            compared, pixels = compare(y, a, b)
+            total += pixels
+            if compared is None:
+                continue
+            box, gray, block_hist, block_pixels = compared
+            hist += block_hist
+            counted += block_pixels
+            changed[y] = box
+            if cache is not None:
+                cache[y] = gray
+                cached_bytes += gray.nbytes
+                if cached_bytes > TILED_GRAY_CACHE:
+                    cache = None
+    if not total:
+        raise _nothing_to_compare()
+
+    with span("diff.render"), PNGWriter(output_path, width, height) as writer:
+        if not changed:
+            # Images are exactly identical
+            for y in range(0, height, tile_rows):
+                writer.write(np.zeros((min(tile_rows, height - y), width, 3), dtype=np.uint8))
+            return 100.0
+
+        hist[0] += total - counted
+        lut = _contrast_lut(hist, total)
+
+        if cache is not None:
+            bands = ((y, None, b) for y, b in _padded_bands(reader2, size, tile_rows))
+        else:
+            bands = _band_pairs(reader1, reader2, size, tile_rows)
+
+        for y, a, b in bands:
+            overlay = Image.fromarray(b).point(_fade_lut())
+            if y in changed:
+                top, bottom, left, right = changed[y]
+                if cache is not None:
+                    gray = cache.pop(y)
+                else:
+                    gray = compare(y, a, b)[0][1]
+                overlay.paste((255, 0, 0), (left, top, right, bottom), Image.fromarray(lut[gray]))
+            _paint_masked(overlay, band_mask(y, b.shape[0])[0])
+            writer.write(np.asarray(overlay))
+
+    return _similarity_from_histogram(hist, total, lut)
+
+
+def _with_halo(bands, halo):
+    """
+    Yield ``(y, a, b, ext_a, ext_b, above)`` for each band pair: the band, and
+    the band extended by up to ``halo`` rows of its neighbours on each side,
+    ``above`` of them on top. Bands are buffered one ahead to see below them.
+    """
+    previous = pending = None
+    for band in bands:
+        if pending is not None:
+            yield _extend(pending, previous, band, halo)
+            previous = pending
+        pending = band
+    if pending is not None:
+        yield _extend(pending, previous, None, halo)
+
+
+def _extend(band, previous, following, halo):
+    y, a, b = band
+    if not halo:
+        return y, a, b, a, b, 0
+    above = 0 if previous is None else min(halo, previous[1].shape[0])
+    parts_a, parts_b = [a], [b]
+    if above:
+        parts_a.insert(0, previous[1][-above:])
+        parts_b.insert(0, previous[2][-above:])
+    if following is not None:
+        parts_a.append(following[1][:halo])
+        parts_b.append(following[2][:halo])
+    return y, a, b, np.concatenate(parts_a), np.concatenate(parts_b), above
+
+
+def _tolerance_kernel(a, b, include, mode, **_):
+    """Changed pixels: any channel differs by more than the tolerance."""
+    d = np.maximum(a, b)
+    d -= np.minimum(a, b)
+    changed = d.max(axis=2) > mode.tolerance
+    if include is not None:
+        changed &= include
+    return int(changed.sum()), [((255, 0, 0), changed)]
+
+
+def _yiq_delta(p, q):
+    """pixelmatch's colorDelta() between RGB arrays ``p`` and ``q``, without its sign."""
+    p, q = p.astype(np.float64), q.astype(np.float64)
+    r1, g1, b1 = p[..., 0], p[..., 1], p[..., 2]
+    r2, g2, b2 = q[..., 0], q[..., 1], q[..., 2]
+    y = (r1 * 0.29889531 + g1 * 0.58662247 + b1 * 0.11448223) - (r2 * 0.29889531 + g2 * 0.58662247 + b2 * 0.11448223)
+    i = (r1 * 0.59597799 - g1 * 0.27417610 - b1 * 0.32180189) - (r2 * 0.59597799 - g2 * 0.27417610 - b2 * 0.32180189)
+    q = (r1 * 0.21147017 - g1 * 0.52261711 + b1 * 0.31114694) - (r2 * 0.21147017 - g2 * 0.52261711 + b2 * 0.31114694)
+    return 0.5053 * y * y + 0.299 * i * i + 0.1957 * q * q
+
+
+def _luma(rgb):
+    rgb = rgb.astype(np.float64)
+    return rgb[..., 0] * 0.29889531 + rgb[..., 1] * 0.58662247 + rgb[..., 2] * 0.11448223
+
+
+# Neighbour offsets in pixelmatch's loop order (x outer, y inner), which decides ties
+_NEIGHBOURS_DY = (-1, 0, 1, -1, 1, -1, 0, 1)
+_NEIGHBOURS_DX = (-1, -1, -1, 0, 0, 1, 1, 1)
+
+# Candidate pixels checked for anti-aliasing per vectorized pass
+_AA_CHUNK = 1 << 18
+
+
+def _neighbours(ys, xs, shape):
+    ny, nx = ys[:, None] + _NEIGHBOURS_DY, xs[:, None] + _NEIGHBOURS_DX
+    valid = (ny >= 0) & (ny < shape[0]) & (nx >= 0) & (nx < shape[1])
+    return np.clip(ny, 0, shape[0] - 1), np.clip(nx, 0, shape[1] - 1), valid
+
+
+def _on_border(ys, xs, shape, row0, height):
+    # pixelmatch counts a pixel on the image border as having one identical neighbour
+    rows = ys - row0
+    return ((xs == 0) | (xs == shape[1] - 1) | (rows == 0) | (rows == height - 1)).astype(np.int64)
+
+
+def _many_siblings(img, ys, xs, row0, height):
+    """pixelmatch's hasManySiblings(): more than two neighbours identical to the pixel."""
+    ny, nx, valid = _neighbours(ys, xs, img.shape)
+    same = (img[ny, nx] == img[ys, xs][:, None]).all(axis=2) & valid
+    return _on_border(ys, xs, img.shape, row0, height) + same.sum(axis=1) > 2
+
+
+def _antialiased(img, other, ys, xs, row0, height):
+    """
+    pixelmatch's antialiased() for the pixels at ``(ys, xs)`` of ``img``.
+
+    ``img`` may be a band with its halo: ``row0`` is the array row of image
+    row 0, and ``height`` the image height, for the border rule.
+    """
+    ny, nx, valid = _neighbours(ys, xs, img.shape)
+    delta = np.where(valid, _luma(img[ys, xs])[:, None] - _luma(img[ny, nx]), 0.0)
+    zeroes = _on_border(ys, xs, img.shape, row0, height) + (valid & (delta == 0)).sum(axis=1)
+    low, high = delta.argmin(axis=1), delta.argmax(axis=1)
+    index = np.arange(len(ys))
+    result = (zeroes <= 2) & (delta[index, low] < 0) & (delta[index, high] > 0)
+    # Only the darkest or brightest neighbour decides, if it sits in a flat area of both images
+    found = np.flatnonzero(result)
+    flat = np.zeros(len(found), dtype=bool)
+    for pick in (low[found], high[found]):
+        py, px = ny[found, pick], nx[found, pick]
+        flat |= _many_siblings(img, py, px, row0, height) & _many_siblings(other, py, px, row0, height)
+    result[found] = flat
+    return result
+
+
+def _antialias_kernel(a, b, include, mode, ext_a, ext_b, row, col, row0, height, **_):
+    """
+    pixelmatch: changed beyond the colour threshold, and not anti-aliasing.
+
+    ``a`` and ``b`` start at ``(row, col)`` of the halo bands ``ext_a`` and
+    ``ext_b``, which hold image row 0 at ``row0``.
+    """
+    over = _yiq_delta(a, b) > 35215 * mode.aa_threshold * mode.aa_threshold
+    if include is not None:
+        over &= include
+    rows, cols = np.nonzero(over)
+    smoothed = np.zeros(len(rows), dtype=bool)
+    for start in range(0, len(rows), _AA_CHUNK):
+        ys, xs = rows[start:start + _AA_CHUNK] + row, cols[start:start + _AA_CHUNK] + col
+        smoothed[start:start + _AA_CHUNK] = (
+            _antialiased(ext_a, ext_b, ys, xs, row0, height) | _antialiased(ext_b, ext_a, ys, xs, row0, height)
+        )
+    changed = over.copy()
+    changed[rows[smoothed], cols[smoothed]] = False
+    return int(changed.sum()), [(AA_COLOR, over & ~changed), ((255, 0, 0), changed)]
+
+
+def _ssim_kernel(a, b, include, **_):
+    """
+    Block SSIM over the blocks of the band. Returns the compared pixels
+    lost to dissimilarity, sum(n * (1 - ssim)), and a red layer whose
+    opacity follows 1 - ssim.
+    """
+    k = SSIM_BLOCK
+    h, w = a.shape[:2]
+    ph, pw = -h % k, -w % k
+    weights = np.ones((h, w)) if include is None else include.astype(np.float64)
+    x = np.pad(_luma(a), ((0, ph), (0, pw)))
+    v = np.pad(_luma(b), ((0, ph), (0, pw)))
+    weights = np.pad(weights, ((0, ph), (0, pw)))
+
+    def blocks(values):
+        return values.reshape((h + ph) // k, k, (w + pw) // k, k).sum(axis=(1, 3))
+
+    n = blocks(weights)
+    safe = np.maximum(n, 1)
+    mx, mv = blocks(weights * x) / safe, blocks(weights * v) / safe
+    sxx = blocks(weights * x * x) / safe - mx * mx
+    svv = blocks(weights * v * v) / safe - mv * mv
+    sxv = blocks(weights * x * v) / safe - mx * mv
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    ssim = ((2 * mx * mv + c1) * (2 * sxv + c2)) / ((mx * mx + mv * mv + c1) * (sxx + svv + c2))
+    ssim = np.clip(ssim, 0, 1)
+    lost = float((n * (1 - ssim)).sum())
+    opacity = np.repeat(np.repeat(np.round((1 - ssim) * 255), k, axis=0), k, axis=1)[:h, :w].astype(np.uint8)
+    if include is not None:
+        opacity[~include] = 0
+    return lost, [((255, 0, 0), opacity)]
+
+
+_KERNELS = {"tolerance": _tolerance_kernel, "antialias": _antialias_kernel, "ssim": _ssim_kernel}
+
+
+def _scored_rows(tile_rows):
+    """Band height of the scored modes: ``tile_rows`` (or CHUNK_ROWS) rounded up to whole SSIM blocks."""
+    return -(-max(tile_rows or CHUNK_ROWS, SSIM_BLOCK) // SSIM_BLOCK) * SSIM_BLOCK
+
+
+def _band_source(img1_path, img2_path, tile_rows, rows):
+    """
+    The comparison canvas size, and a function that yields ``(y, a, b)`` bands
+    of ``rows`` rows each time it is called. Bands are streamed from the PNGs
+    with ``tile_rows``, or cut from both images decoded once otherwise.
+    """
+    if tile_rows:
+        try:
+            reader1, reader2 = PNGBandReader(img1_path), PNGBandReader(img2_path)
+            size = (max(reader1.size[0], reader2.size[0]), max(reader1.size[1], reader2.size[1]))
+            return size, lambda: _band_pairs(reader1, reader2, size, rows)
+        except UnsupportedPNG as e:
+            logger.info(f"Falling back to whole-image diff: {e}")
+    size1, size2 = _image_size(img1_path), _image_size(img2_path)
+    size = (max(size1[0], size2[0]), max(size1[1], size2[1]))
+    with span("diff.decode"):
+        img1, img2 = _open_rgb(img1_path, size), _open_rgb(img2_path, size)
+
+    def bands():
+        for y in range(0, size[1], rows):
+            box = (0, y, size[0], min(y + rows, size[1]))
+            yield y, _pixels(img1, box), _pixels(img2, box)
+
+    return size, bands
+
+
+def _score_band(mode, a, b, include, box, ext_a, ext_b, above, y, height):
+    """
+    Run the mode's kernel on the changed ``box`` of one band (see _with_halo
+    for the rest). Returns the pixels lost, the box actually scored, which
+    the ssim mode grows to whole blocks, and the overlay layers.
+    """
+    top, bottom, left, right = box
+    if mode.name == "ssim":
+        top, left = top - top % SSIM_BLOCK, left - left % SSIM_BLOCK
+        bottom = min(-(-bottom // SSIM_BLOCK) * SSIM_BLOCK, a.shape[0])
+        right = min(-(-right // SSIM_BLOCK) * SSIM_BLOCK, a.shape[1])
+    area = np.s_[top:bottom, left:right]
+    lost, layers = _KERNELS[mode.name](
+        a[area], b[area], None if include is None else include[area], mode=mode,
+        ext_a=ext_a, ext_b=ext_b, row=above + top, col=left, row0=above - y, height=height,
+    )
+    return lost, (top, bottom, left, right), layers
+
+
+def _diff_scored(img1_path, img2_path, output_path, tile_rows, mask, mode) -> float:
+    """
+    The "tolerance", "antialias" and "ssim" modes, in one pass over bands of rows.
+
+    Bands are streamed from the PNGs with ``tile_rows``, or cut from the
+    decoded images otherwise. Rows are rounded up to whole SSIM blocks, so
+    both give the same result. Only the box around the changed (compared)
+    pixels of a band is handed to the mode's kernel; everything else is
+    unchanged. The overlay is written band by band as it is scored.
+    """
+    size, bands = _band_source(img1_path, img2_path, tile_rows, _scored_rows(tile_rows))
+    width, height = size
+    halo = 2 if mode.name == "antialias" else 0
+
+    total, lost = 0, 0.0
+    with span("diff.scan"), PNGWriter(output_path, width, height) as writer:
+        for y, a, b, ext_a, ext_b, above in _with_halo(bands(), halo):
+            include = mask.band(y, y + a.shape[0], width) if mask else None
+            total += a.shape[0] * width if include is None else int(include.sum())
+            overlay = Image.fromarray(b).point(_fade_lut())
+            box = _changed_box(a, b, include)
+            if box is not None:
+                band_lost, (top, bottom, left, right), layers = _score_band(
+                    mode, a, b, include, box, ext_a, ext_b, above, y, height,
+                )
+                lost += band_lost
+                for color, layer in layers:
+                    if layer.any():
+                        alpha = layer.astype(np.uint8) * 255 if layer.dtype == bool else layer
+                        overlay.paste(color, (left, top, right, bottom), Image.fromarray(alpha))
+            _paint_masked(overlay, include)
+            writer.write(np.asarray(overlay))
+    if not total:
+        raise _nothing_to_compare()
+    return round((total - lost) / total * 100.0, 2)
+
+
 def create_side_by_side(img1_path: Path, img2_path: Path, diff_path: Path, output_path: Path, label1: str, label2: str):
     """Create a 3-panel side-by-side composite."""
     images = [Image.open(p) for p in (img1_path, img2_path, diff_path)]
@@ -0,0 +1,203 @@
+"""
+Pass/fail gating without a full diff.
+
+``diff run --gate`` only needs to know whether each pair scores at or above
+the threshold. gate_diff() makes up to three passes over the bands of both
+images, and stops as soon as the similarity range it has proven lies entirely
+on one side of the threshold:
+
+1. Bands of both images are compared 8 bytes at a time. Equal words prove
+   their pixels unchanged; only the pixels under unequal words are checked
+   one by one.
+2. The changed pixels are scored at full resolution. This is exact, and
+   cheap, for the "pixel" and "tolerance" modes. For "antialias" and "ssim",
+   each band first only contributes an upper bound: its changed pixels, or
+   the compared pixels of the SSIM blocks they touch.
+3. If that does not settle it, the kernels of those two modes run on the
+   changed boxes, band by band.
+
+There is no downsampled pyramid: averaging can cancel out a change, so a
+smaller image could never prove a pass. Nothing is ever painted or encoded.
+run_diffs() runs the full diff for the pairs that fail, so they get an exact
+score and an overlay. A pair that passes keeps the lower bound as its score.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import logging
+
+from pixelframe.engine.diff import (
+    DiffMask, DiffMode, SSIM_BLOCK,
+    _auto_tile_rows, _band_source, _gray_difference, _nothing_to_compare, _score_band, _scored_rows, _with_halo,
+)
+from pixelframe.engine.timing import span
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is an optional accelerator (pip install "pixelframe[fast]")
+    np = None
+
+logger = logging.getLogger("pixelframe")
+
+# Past one unequal word in this many, pixels are compared one by one outright
+_DENSE_WORDS = 16
+
+
+@dataclass
+class Gate:
+    """The verdict of gate_diff() and the similarity range (percent) it proved."""
+    passed: bool
+    low: float
+    high: float
+
+    @property
+    def exact(self) -> bool:
+        """The similarity was computed exactly (``low == high``)."""
+        return self.low == self.high
+
+
+def _changed_pixels(a, b, include):
+    """Flat indexes of the (included) pixels that differ between bands ``a`` and ``b``."""
+    fa, fb = a.reshape(-1), b.reshape(-1)
+    whole = fa.size - fa.size % 8
+    words = np.flatnonzero(fa[:whole].view(np.uint64) != fb[:whole].view(np.uint64))
+    if words.size * _DENSE_WORDS > whole // 8:
+        ne = (fa != fb).reshape(-1, 3)
+        changed = np.flatnonzero(ne[:, 0] | ne[:, 1] | ne[:, 2])
+    else:
+        tail = np.flatnonzero(fa[whole:] != fb[whole:]) + whole
+        first = np.concatenate([words * 8, tail]) // 3
+        last = np.concatenate([words * 8 + 7, tail]) // 3
+        # A word spans three or four pixels
+        candidates = np.unique(np.concatenate([first, np.minimum(first + 1, last), np.minimum(first + 2, last), last]))
+        pa, pb = a.reshape(-1, 3)[candidates], b.reshape(-1, 3)[candidates]
+        changed = candidates[(pa != pb).any(axis=1)]
+    if include is not None:
+        changed = changed[include.reshape(-1)[changed]]
+    return changed
+
+
+def _block_area(rows, cols, include, shape):
+    """Compared pixels in the SSIM blocks holding the pixels at ``(rows, cols)``, an upper bound on their loss."""
+    height, width = shape
+    k = SSIM_BLOCK
+    across = -(-width // k)
+    blocks = np.unique((rows // k) * across + cols // k)
+    if include is None:
+        top, left = blocks // across * k, blocks % across * k
+        return int((np.minimum(k, height - top) * np.minimum(k, width - left)).sum())
+    padded = np.pad(include, ((0, -height % k), (0, -width % k)))
+    counts = padded.reshape(padded.shape[0] // k, k, -1, k).sum(axis=(1, 3)).reshape(-1)
+    return int(counts[blocks].sum())
+
+
+def _stretched_loss(hist, seen, unseen):
+    """
+    Bounds on how many of the pixels in ``hist`` the "pixel" mode counts as
+    changed. Its cutoff depends on the mean difference over every compared
+    pixel, which is only known once the ``unseen`` ones have been read.
+    """
+    d = np.arange(256)
+    total = seen + unseen
+    difference = int((hist * d).sum())
+    lowest = int(difference / total + 0.5)
+    highest = int((difference + 255 * unseen) / total + 0.5)
+    return int(hist[5 * d > 4 * highest].sum()), int(hist[5 * d > 4 * lowest].sum())
+
+
+def _loss_range(mode, hist, lost, pending, seen, unseen):
+    if mode.name == "pixel":
+        return _stretched_loss(hist, seen, unseen)
+    return lost, lost + sum(bound for bound, _ in pending.values())
+
+
+def _similarity_range(seen, unseen, lost_low, lost_high):
+    """
+    The similarity range, rounded like the score, when ``seen`` compared
+    pixels lost between ``lost_low`` and ``lost_high``, and up to ``unseen``
+    more are still to be read.
+    """
+    total = seen + unseen
+    return round((seen - lost_high) / total * 100.0, 2), round((total - lost_low) / total * 100.0, 2)
+
+
+def _verdict(low, high, threshold) -> Optional[bool]:
+    if low >= threshold:
+        return True
+    if high < threshold:
+        return False
+    return None
+
+
+def gate_diff(
+    img1_path: Path, img2_path: Path, threshold: float,
+    tile_rows: int = None, mask: DiffMask = None, mode: DiffMode = None,
+) -> Gate:
+    """
+    Decide whether the pair's similarity (as generate_diff() would score it)
+    is at least ``threshold``, without computing more of it than that takes.
+
+    ``tile_rows``, ``mask`` and ``mode`` are as for generate_diff(); huge
+    images are streamed, and an early verdict stops reading them.
+    """
+    if np is None:
+        raise RuntimeError("Gated diffing requires NumPy: pip install 'pixelframe[fast]'")
+    if not img1_path.exists() or not img2_path.exists():
+        # Left to generate_diff() to report
+        return Gate(False, 0.0, 0.0)
+    mode = mode or DiffMode()
+    if tile_rows is None:
+        tile_rows = _auto_tile_rows(img1_path, img2_path)
+    size, bands = _band_source(img1_path, img2_path, tile_rows, _scored_rows(tile_rows))
+    width, height = size
+
+    seen = 0
+    hist = np.zeros(256, dtype=np.int64)
+    lost = 0
+    # Bands "antialias" and "ssim" still have to score: y -> (loss bound, changed box)
+    pending = {}
+    with span("diff.gate"):
+        scan = bands()
+        for y, a, b in scan:
+            include = mask.band(y, y + a.shape[0], width) if mask else None
+            seen += a.shape[0] * width if include is None else int(include.sum())
+            unseen = (height - y - a.shape[0]) * width
+            changed = _changed_pixels(a, b, include)
+            if changed.size:
+                pa, pb = a.reshape(-1, 3)[changed], b.reshape(-1, 3)[changed]
+                rows, cols = changed // width, changed % width
+                if mode.name == "pixel":
+                    hist += np.bincount(_gray_difference(pa, pb), minlength=256)
+                elif mode.name == "tolerance":
+                    lost += int(((np.maximum(pa, pb) - np.minimum(pa, pb)).max(axis=1) > mode.tolerance).sum())
+                else:
+                    bound = changed.size if mode.name == "antialias" else _block_area(rows, cols, include, a.shape[:2])
+                    pending[y] = (bound, (rows.min(), rows.max() + 1, cols.min(), cols.max() + 1))
+            if not seen:
+                continue
+            low, high = _similarity_range(seen, unseen, *_loss_range(mode, hist, lost, pending, seen, unseen))
+            verdict = _verdict(low, high, threshold)
+            if verdict is not None:
+                scan.close()
+                return Gate(verdict, low, high)
+        if not seen:
+            raise _nothing_to_compare()
+
+        # Only "antialias" and "ssim" get here, with bands left to score
+        halo = 2 if mode.name == "antialias" else 0
+        known, unknown = 0.0, sum(bound for bound, _ in pending.values())
+        scan = _with_halo(bands(), halo)
+        for y, a, b, ext_a, ext_b, above in scan:
+            if y not in pending:
+                continue
+            bound, box = pending.pop(y)
+            include = mask.band(y, y + a.shape[0], width) if mask else None
+            known += _score_band(mode, a, b, include, box, ext_a, ext_b, above, y, height)[0]
+            unknown -= bound
+            low, high = _similarity_range(seen, 0, known, known + unknown)
+            verdict = _verdict(low, high, threshold)
+            if verdict is not None and pending:
+                scan.close()
+                return Gate(verdict, low, high)
+    score = round((seen - known) / seen * 100.0, 2)
+    return Gate(score >= threshold, score, score)
@@ -0,0 +1,151 @@
+"""
+Incremental capture: reuse an earlier run's screenshot when a page is unchanged.
+
+After the readiness wait, and before the screenshot, each page is
+fingerprinted in the browser. The fingerprint covers the DOM and its text,
+each element's box, the computed styles that affect how it is painted,
+loaded images and fonts, and the sizes of loaded resources. It also
+includes the capture settings. If the fingerprint equals the one recorded
+for the same screenshot in an earlier run, that run's image is hard-linked
+into the new run, and no screenshot is taken or encoded.
+
+Content the DOM does not describe cannot be fingerprinted. A page with a
+canvas, video, iframe, embed or object element is always captured in full.
+"""
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, Optional
+import hashlib
+import json
+import logging
+
+from pixelframe.engine.manifest import RunManifest
+from pixelframe.engine.shard import unit_name
+from pixelframe.engine.store import link_or_copy
+
+logger = logging.getLogger("pixelframe")
+
+# Bump when the fingerprint script changes, so old fingerprints never match
+FINGERPRINT_VERSION = 1
+
+# Computed properties that change pixels without moving any box
+_PAINT_PROPERTIES = [
+    "display", "visibility", "opacity", "color", "background-color", "background-image",
+    "background-position", "background-size", "background-repeat", "border-top-color",
+    "border-right-color", "border-bottom-color", "border-left-color", "border-top-style",
+    "border-right-style", "border-bottom-style", "border-left-style", "border-radius",
+    "box-shadow", "outline", "font-family", "font-size", "font-weight", "font-style",
+    "line-height", "letter-spacing", "text-align", "text-decoration", "text-transform",
+    "text-shadow", "white-space", "transform", "filter", "clip-path", "mix-blend-mode",
+    "z-index", "overflow", "object-fit", "object-position", "list-style", "content",
+]
+
+# Returns null for pages whose pixels the DOM does not describe
+_SCRIPT = """(properties) => {
+    if (document.querySelector("canvas, video, iframe, embed, object")) return null;
+    const root = document.documentElement;
+    const parts = [innerWidth, innerHeight, devicePixelRatio, root.scrollWidth, root.scrollHeight].join("|");
+    const out = [parts];
+    const styles = (style) => properties.map((p) => style.getPropertyValue(p)).join("|");
+    const visit = (start) => {
+        const walker = document.createTreeWalker(start, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT);
+        for (let node = walker.currentNode; node; node = walker.nextNode()) {
+            if (node.nodeType === Node.TEXT_NODE) {
+                out.push("#" + node.nodeValue);
+                continue;
+            }
+            if (node.nodeType !== Node.ELEMENT_NODE) continue;
+            const rect = node.getBoundingClientRect();
+            const attributes = Array.from(node.attributes, (a) => a.name + "=" + a.value).join(" ");
+            out.push([node.tagName, attributes, rect.x + scrollX, rect.y + scrollY, rect.width, rect.height].join("|"));
+            out.push(styles(getComputedStyle(node)));
+            for (const pseudo of ["::before", "::after"]) {
+                const style = getComputedStyle(node, pseudo);
+                if (style.content !== "none" && style.content !== "normal") out.push(pseudo + styles(style));
+            }
+            if (node.tagName === "IMG") out.push([node.currentSrc, node.naturalWidth, node.naturalHeight, node.complete].join("|"));
+            if (node.shadowRoot) {
+                out.push("#shadow");
+                visit(node.shadowRoot);
+            }
+        }
+    };
+    visit(root);
+    const resources = performance.getEntriesByType("resource").map((e) => e.name + "|" + e.decodedBodySize);
+    const fonts = Array.from(document.fonts).filter((f) => f.status === "loaded").map((f) => [f.family, f.weight, f.style].join("|"));
+    return out.concat(resources.sort(), fonts.sort()).join("\\n");
+}"""
+
+
+def _digest(task, state) -> Optional[str]:
+    if state is None:
+        return None
+    settings = [
+        FINGERPRINT_VERSION, task.url, asdict(task.breakpoint), task.full_page, task.screenshot.format,
+    ]
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    digest.update(state.encode())
+    return digest.hexdigest()
+
+
+def page_fingerprint(page, task) -> Optional[str]:
+    """Fingerprint of a ready playwright.sync_api page, or None if it cannot be fingerprinted."""
+    return _digest(task, page.evaluate(_SCRIPT, _PAINT_PROPERTIES))
+
+
+async def page_fingerprint_async(page, task) -> Optional[str]:
+    return _digest(task, await page.evaluate(_SCRIPT, _PAINT_PROPERTIES))
+
+
+def earlier_fingerprints(output_dir, units, since=None) -> Dict[str, dict]:
+    """
+    The newest fingerprinted screenshot of each unit in earlier runs.
+
+    Runs in ``output_dir`` are searched newest first, or only the run
+    ``since`` when it is given. Each value holds the fingerprint, the
+    screenshot's absolute path and hashes, and the run it came from.
+    """
+    from pixelframe.engine.retention import list_runs
+
+    if since:
+        runs = [Path(since)]
+    else:
+        runs = [run.path for run in reversed(list_runs(output_dir))]
+    wanted = set(units)
+    found = {}
+    for run_path in runs:
+        manifest = RunManifest(run_path / "screenshots")
+        for key in list(manifest.files):
+            name = unit_name(key)
+            path = manifest.root / key
+            if name not in wanted or name in found or not path.is_file():
+                continue
+            # Reset, and so skipped, if the file was changed after it was indexed
+            entry = manifest.entry(path)
+            if entry.get("fingerprint") and "sha256" in entry:
+                found[name] = {
+                    "fingerprint": entry["fingerprint"],
+                    "path": str(path.resolve()),
+                    "sha256": entry["sha256"],
+                    "pixels": entry.get("pixels"),
+                    "run": run_path.name,
+                }
+        if len(found) == len(wanted):
+            break
+    return found
+
+
+def reuse(task, fingerprint) -> Optional[Path]:
+    """Link the earlier screenshot into ``task``'s place if ``fingerprint`` matches it; returns the new path."""
+    previous = task.previous
+    if not fingerprint or not previous or previous["fingerprint"] != fingerprint:
+        return None
+    source = Path(previous["path"])
+    # The earlier run may have kept a PNG where WebP was asked for
+    path = Path(task.file_path).with_suffix(source.suffix)
+    try:
+        link_or_copy(source, path)
+    except OSError as e:
+        logger.warning(f"PixelFrame Engine: Could not reuse {source}, capturing {task.label} again: {e}")
+        return None
+    return path
@@ -1,8 +1,38 @@
-from rich.console import Console
-from rich.logging import RichHandler
 import logging
 
-console = Console()
+_console = None
+
+
+def get_console():
+    """The Rich console log output goes to, created on first use."""
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
+
+
+def __getattr__(name):
+    # `console` used to be created at import time; keep it importable
+    if name == "console":
+        return get_console()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _DeferredRichHandler(logging.Handler):
+    """Imports Rich and builds the real RichHandler only when the first record is logged."""
+
+    def __init__(self):
+        super().__init__()
+        self._handler = None
+
+    def emit(self, record):
+        if self._handler is None:
+            from rich.logging import RichHandler
+            self._handler = RichHandler(rich_tracebacks=True, console=get_console())
+            self._handler.setFormatter(self.formatter)
+        self._handler.emit(record)
+
 
 def setup_logger():
     """Set up the PixelFrame logger with Rich handler. Idempotent — safe to call multiple times."""
@@ -13,11 +43,11 @@ def setup_logger():
         return logger
 
     logger.setLevel(logging.INFO)
-    handler = RichHandler(rich_tracebacks=True, console=console)
+    handler = _DeferredRichHandler()
     handler.setFormatter(logging.Formatter("%(message)s"))
     logger.addHandler(handler)
 
     # Prevent log propagation to root logger (avoids duplicate output)
     logger.propagate = False
 
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,153 @@
+from pathlib import Path
+from typing import Optional
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger("pixelframe")
+
+# Sidecar file kept next to the screenshots of every run
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+_HASH_BLOCK = 1 << 20
+_PIXEL_BAND_ROWS = 512
+
+
+def file_digest(path) -> str:
+    """sha256 of the file bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pixel_digest(path) -> str:
+    """
+    sha256 of the decoded RGB pixels and the image size.
+
+    Two files with the same pixel digest diff to 100% even when their encodings
+    differ (compression level, metadata chunks, another format). PNGs are
+    decoded band by band so this stays cheap on very tall pages.
+    """
+    # Pillow is only needed here; run listing and gc read manifests without it
+    from PIL import Image
+    from pixelframe.engine.pngstream import PNGBandReader, UnsupportedPNG
+
+    digest = hashlib.sha256()
+    try:
+        reader = PNGBandReader(path)
+        size = reader.size
+        bands = (band for _, band in reader.bands(_PIXEL_BAND_ROWS))
+    except UnsupportedPNG:
+        image = Image.open(path)
+        size = image.size
+        bands = [image]
+    digest.update(f"{size[0]}x{size[1]}:".encode())
+    for band in bands:
+        digest.update(band.convert("RGB").tobytes())
+    return digest.hexdigest()
+
+
+class RunManifest:
+    """
+    Index of the screenshots of one run, kept in ``screenshots/manifest.json``.
+
+    Capture writes an entry per screenshot (page, breakpoint, viewport, DPR,
+    image size, format, sha256, capture and encode time, and the page
+    fingerprint of incremental runs) plus the run's
+    ``encoding`` totals, and marks the manifest as ``indexed``; ``diff run``
+    then plans from the index instead of scanning the directory. Hashes are
+    also cached here on demand for older runs.
+
+    Entries are keyed by path relative to the screenshots directory and are
+    trusted only while the file's size and mtime are unchanged, so a baseline
+    is hashed once no matter how many runs are compared against it.
+    """
+
+    def __init__(self, screenshots_dir):
+        self.root = Path(screenshots_dir)
+        self.path = self.root / MANIFEST_NAME
+        self.files = {}
+        self.indexed = False
+        self.url = None
+        # Screenshot encoding settings and their total cost, written by capture
+        self.encoding = None
+        # Object store the screenshots are linked from, relative to this directory
+        self.store = None
+        # This run's share of a sharded capture (see shard.shard_info)
+        self.shard = None
+        self._dirty = False
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == MANIFEST_VERSION:
+                self.files = data.get("files", {})
+                self.indexed = data.get("indexed", False)
+                self.url = data.get("url")
+                self.encoding = data.get("encoding")
+                self.store = data.get("store")
+                self.shard = data.get("shard")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"PixelFrame Engine: Ignoring unreadable manifest {self.path}: {e}")
+
+    def key(self, path) -> str:
+        return Path(path).relative_to(self.root).as_posix()
+
+    def entry(self, path) -> dict:
+        """The cached entry for ``path``, reset if the file changed since it was hashed."""
+        path = Path(path)
+        key = self.key(path)
+        stat = path.stat()
+        entry = self.files.get(key)
+        if not entry or entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            self.files[key] = entry
+            self._dirty = True
+        return entry
+
+    def file_hash(self, path) -> str:
+        entry = self.entry(path)
+        if "sha256" not in entry:
+            entry["sha256"] = file_digest(path)
+            self._dirty = True
+        return entry["sha256"]
+
+    def pixel_hash(self, path) -> Optional[str]:
+        """The cached pixel digest, or None if it has not been computed yet."""
+        return self.entry(path).get("pixels")
+
+    def record_pixel_hash(self, path, digest):
+        entry = self.entry(path)
+        if entry.get("pixels") != digest:
+            entry["pixels"] = digest
+            self._dirty = True
+
+    def record_capture(self, path, image_size, **meta):
+        """Index a freshly captured screenshot."""
+        entry = self.entry(path)
+        entry.update(meta, image_size=list(image_size))
+        self.file_hash(path)
+        self.indexed = True
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        data = {"version": MANIFEST_VERSION, "indexed": self.indexed, "url": self.url, "files": self.files}
+        if self.encoding:
+            data["encoding"] = self.encoding
+        if self.store:
+            data["store"] = self.store
+        if self.shard:
+            data["shard"] = self.shard
+        try:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, indent=1), encoding="utf-8")
+            tmp.replace(self.path)
+            self._dirty = False
+        except OSError as e:
+            # A read-only baseline (e.g. restored from a CI cache) just stays uncached
+            logger.warning(f"PixelFrame Engine: Could not write manifest {self.path}: {e}")
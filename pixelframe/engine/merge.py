@@ -0,0 +1,146 @@
+"""
+Combining the outputs of sharded CI nodes.
+
+``pixelframe merge`` takes the diff output directories of every shard, or
+their capture run directories. It checks that the shards cover every
+screenshot exactly once and writes one report with one verdict. Diff
+overlays and thumbnails are copied into the merged directory, and image links
+are rewritten to point from there.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+import json
+import logging
+import shutil
+
+from pixelframe.engine.compare import DIFF_REPORT_NAME, DIFF_RESULTS_NAME, write_diff_report
+from pixelframe.engine.manifest import MANIFEST_NAME, RunManifest
+from pixelframe.engine.report import rebase_asset
+from pixelframe.engine.run_manager import create_run_directory
+from pixelframe.engine.shard import check_coverage, unit_name
+from pixelframe.engine.store import link_or_copy
+from pixelframe.engine.timing import TIMINGS_NAME, TRACE_NAME
+
+logger = logging.getLogger("pixelframe")
+
+# Index fields describing a file on disk rather than the capture
+_FILE_FIELDS = ("size", "mtime_ns", "image_size", "object")
+
+
+@dataclass
+class MergeResult:
+    # "diff" or "run"
+    kind: str
+    # The merged diff directory, or the merged run directory
+    path: Path
+    shards: int
+    problems: List[str] = field(default_factory=list)
+    # diff_results.json content of a merged diff
+    summary: Optional[dict] = None
+
+    @property
+    def passed(self) -> bool:
+        return not self.problems and (self.summary is None or self.summary["status"] == "PASSED")
+
+
+def input_kind(path) -> str:
+    """Whether ``path`` is a diff output directory ("diff") or a capture run ("run")."""
+    path = Path(path)
+    if (path / DIFF_RESULTS_NAME).is_file():
+        return "diff"
+    if (path / "screenshots" / MANIFEST_NAME).is_file():
+        return "run"
+    raise ValueError(f"{path} is neither a diff output ({DIFF_RESULTS_NAME}) nor an indexed capture run.")
+
+
+def _copy_assets(shard_dir, out_dir):
+    """Copy a shard's diff overlays and thumbnails, but not its report, into ``out_dir``."""
+    if shard_dir.resolve() == out_dir.resolve():
+        return
+    shutil.copytree(
+        shard_dir, out_dir, dirs_exist_ok=True,
+        ignore=shutil.ignore_patterns(DIFF_RESULTS_NAME, DIFF_REPORT_NAME, TIMINGS_NAME, TRACE_NAME),
+    )
+
+
+def merge_diffs(inputs, out_dir) -> MergeResult:
+    """Combine the diff outputs of every shard into one diff report in ``out_dir``."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    shards = [(Path(p), json.loads((Path(p) / DIFF_RESULTS_NAME).read_text(encoding="utf-8"))) for p in inputs]
+    problems = check_coverage([summary.get("shard") for _, summary in shards])
+
+    thresholds = sorted({summary["threshold"] for _, summary in shards})
+    if len(thresholds) > 1:
+        problems.append(f"shards used different thresholds ({', '.join(map(str, thresholds))})")
+    scores = {json.dumps(summary.get("score"), sort_keys=True) for _, summary in shards}
+    if len(scores) > 1:
+        problems.append("shards used different diff modes")
+
+    results = {}
+    for shard_dir, summary in shards:
+        _copy_assets(shard_dir, out_dir)
+        for result in summary["results"]:
+            if result["name"] in results:
+                problems.append(f"{result['name']} was diffed by more than one shard")
+                continue
+            results[result["name"]] = {
+                **result, **{key: rebase_asset(result.get(key), shard_dir, out_dir) for key in ("img1", "img2", "diff")},
+            }
+
+    merged = {
+        "version": 1,
+        "status": "FAILED" if problems or not all(r["passed"] for r in results.values()) else "PASSED",
+        "created": max(summary["created"] for _, summary in shards),
+        "run1": ", ".join(sorted({summary["run1"] for _, summary in shards})),
+        "run2": ", ".join(sorted({summary["run2"] for _, summary in shards})),
+        "threshold": thresholds[-1],
+        "score": shards[0][1].get("score"),
+        "results": [results[name] for name in sorted(results)],
+        "gated": sum(1 for r in results.values() if r.get("gated")),
+        "added": sorted({name for _, summary in shards for name in summary["added"]}),
+        "removed": sorted({name for _, summary in shards for name in summary["removed"]}),
+        "shard": None,
+        "shards": len(shards),
+        "problems": problems,
+    }
+    write_diff_report(out_dir, merged)
+    return MergeResult("diff", out_dir, len(shards), problems, merged)
+
+
+def _merge_encoding(encodings):
+    encodings = [e for e in encodings if e]
+    if not encodings:
+        return None
+    merged = dict(encodings[0])
+    for key in ("screenshots", "bytes", "capture_ms", "encode_ms"):
+        merged[key] = round(sum(e.get(key) or 0 for e in encodings), 1)
+    return merged
+
+
+def merge_runs(inputs, output_dir) -> MergeResult:
+    """Combine sharded capture runs into a new run in ``output_dir``; reports are left to the caller."""
+    manifests = [RunManifest(Path(p) / "screenshots") for p in inputs]
+    problems = check_coverage([manifest.shard for manifest in manifests])
+
+    run_path = create_run_directory(output_dir, suffix="-merged")
+    merged = RunManifest(run_path / "screenshots")
+    merged.url = next((m.url for m in manifests if m.url), None)
+    for manifest in manifests:
+        for key, entry in manifest.files.items():
+            source = manifest.root / key
+            if "breakpoint" not in entry or not source.is_file():
+                continue
+            if key in merged.files:
+                problems.append(f"{unit_name(key)} was captured by more than one shard")
+                continue
+            target = merged.root / key
+            link_or_copy(source, target)
+            meta = {k: v for k, v in entry.items() if k not in _FILE_FIELDS}
+            merged.record_capture(target, entry["image_size"], **meta)
+    merged.encoding = _merge_encoding([m.encoding for m in manifests])
+    merged.save()
+    if not merged.files:
+        problems.append("the shards hold no captured screenshots")
+    return MergeResult("run", run_path, len(manifests), problems)
@@ -0,0 +1,205 @@
+"""
+Request interception for captures: an on-disk response cache and host blocking.
+
+Every breakpoint of a run loads the same HTML, CSS, JS, fonts and images.
+With a caching network mode each page routes its requests through a
+ResponseCache, so a response is downloaded once and replayed to every later
+breakpoint and run. A recorded cache is a snapshot that makes repeated
+captures deterministic and lets them run offline.
+
+Entries are keyed by method and URL. Documents are also keyed by user agent,
+because servers may send emulated mobile devices different markup.
+"""
+from dataclasses import replace
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("pixelframe")
+
+NETWORK_CACHE_DIR = "network-cache"
+
+# The stored body is already decoded and its length is known when it is replayed
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+def resolve_network(config):
+    """``config.network`` with absolute paths and the default cache directory filled in."""
+    network = config.network
+    cache_dir = network.cache_dir or Path(config.output_dir) / NETWORK_CACHE_DIR
+    har = str(Path(network.har).resolve()) if network.har else None
+    return replace(network, cache_dir=str(Path(cache_dir).resolve()), har=har)
+
+
+class ResponseCache:
+    """
+    Recorded responses under ``<root>/<key[:2]>/<key>.json`` plus a ``.body`` file.
+
+    One instance serves every page of a run (or daemon job), across capture
+    threads, so its counters describe that run alone.
+    """
+
+    def __init__(self, root, mode="cache", block=(), har=None):
+        self.root = Path(root)
+        self.mode = mode
+        self.block = tuple(block)
+        self.har = har
+        self.hits = 0
+        self.misses = 0
+        self.blocked = 0
+        self.downloaded_bytes = 0
+        self.served_bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_network(cls, network) -> Optional["ResponseCache"]:
+        """A cache for a resolved NetworkConfig, or None if it intercepts nothing."""
+        if network.mode == "live" and not network.block:
+            return None
+        return cls(network.cache_dir, network.mode, network.block, network.har)
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def is_blocked(self, url) -> bool:
+        host = (urlsplit(url).hostname or "").lower()
+        return any(fnmatch(host, pattern) for pattern in self.block)
+
+    def key(self, request) -> str:
+        parts = [request.method, request.url]
+        if request.resource_type == "document":
+            parts.append(request.headers.get("user-agent", ""))
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def _path(self, key) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def lookup(self, request) -> Optional[dict]:
+        """Keyword arguments for ``route.fulfill`` replaying the recorded response, or None."""
+        meta_path = self._path(self.key(request))
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = meta_path.with_suffix(".body").read_bytes()
+        except (OSError, ValueError):
+            return None
+        return {"status": meta["status"], "headers": meta["headers"], "body": body}
+
+    def store(self, request, status, headers, body):
+        """Record a response; the body is written before the metadata that makes it visible."""
+        meta_path = self._path(self.key(request))
+        meta = {
+            "url": request.url,
+            "method": request.method,
+            "status": status,
+            "headers": headers,
+            "stored": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            meta_path.parent.mkdir(parents=True, exist_ok=True)
+            body_tmp = meta_path.with_suffix(".body" + suffix)
+            body_tmp.write_bytes(body)
+            body_tmp.replace(meta_path.with_suffix(".body"))
+            meta_tmp = meta_path.with_suffix(".json" + suffix)
+            meta_tmp.write_text(json.dumps(meta), encoding="utf-8")
+            meta_tmp.replace(meta_path)
+        except OSError as e:
+            logger.warning(f"PixelFrame Engine: Could not record {request.url}: {e}")
+
+    def _decide(self, request):
+        """What to do with a request: ("abort", code), ("fulfill", kwargs), ("fallback", None) or ("fetch", None)."""
+        if self.is_blocked(request.url):
+            self._count(blocked=1)
+            return "abort", "blockedbyclient"
+        if self.mode == "live":
+            return "fallback", None
+        if request.method != "GET":
+            return ("abort", "internetdisconnected") if self.mode == "offline" else ("fallback", None)
+        if self.mode != "record":
+            cached = self.lookup(request)
+            if cached is not None:
+                self._count(hits=1, served_bytes=len(cached["body"]))
+                return "fulfill", cached
+        self._count(misses=1)
+        if self.har and self.mode != "record":
+            # The HAR route answers, or aborts offline, or goes to the network
+            return "fallback", None
+        if self.mode == "offline":
+            logger.warning(f"PixelFrame Engine: Not recorded, blocked offline: {request.url}")
+            return "abort", "internetdisconnected"
+        return "fetch", None
+
+    def _record(self, request, response, body) -> dict:
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS}
+        self._count(downloaded_bytes=len(body))
+        # Server errors are passed through but never replayed
+        if response.status < 500:
+            self.store(request, response.status, headers, body)
+        return {"status": response.status, "headers": headers, "body": body}
+
+    def handle(self, route):
+        """Route handler for playwright.sync_api pages."""
+        action, arg = self._decide(route.request)
+        if action == "abort":
+            route.abort(arg)
+        elif action == "fulfill":
+            route.fulfill(**arg)
+        elif action == "fallback":
+            route.fallback()
+        else:
+            # Redirects are recorded as such, and the browser requests their target through the cache
+            try:
+                response = route.fetch(max_redirects=0)
+                fulfill = self._record(route.request, response, response.body())
+            except Exception as e:
+                # An unanswered route would hang the page; fail the request as the browser would uncached
+                logger.warning(f"PixelFrame Engine: Could not fetch {route.request.url}: {e}")
+                route.abort("failed")
+                return
+            route.fulfill(**fulfill)
+
+    async def handle_async(self, route):
+        """Route handler for playwright.async_api pages."""
+        action, arg = self._decide(route.request)
+        if action == "abort":
+            await route.abort(arg)
+        elif action == "fulfill":
+            await route.fulfill(**arg)
+        elif action == "fallback":
+            await route.fallback()
+        else:
+            try:
+                response = await route.fetch(max_redirects=0)
+                fulfill = self._record(route.request, response, await response.body())
+            except Exception as e:
+                logger.warning(f"PixelFrame Engine: Could not fetch {route.request.url}: {e}")
+                await route.abort("failed")
+                return
+            await route.fulfill(**fulfill)
+
+    def attach(self, page):
+        """Route every request of ``page`` through the cache."""
+        if self.har and self.mode != "record":
+            page.route_from_har(self.har, not_found="abort" if self.mode == "offline" else "fallback")
+        # Registered last, so it sees each request before the HAR route
+        page.route("**/*", self.handle)
+
+    async def attach_async(self, page):
+        if self.har and self.mode != "record":
+            await page.route_from_har(self.har, not_found="abort" if self.mode == "offline" else "fallback")
+        await page.route("**/*", self.handle_async)
+
+    def summary(self) -> str:
+        return (
+            f"PixelFrame Engine: Network ({self.mode}): {self.hits} cached, {self.misses} not cached, "
+            f"{self.blocked} blocked; {self.downloaded_bytes / (1 << 20):.1f} MB downloaded, "
+            f"{self.served_bytes / (1 << 20):.1f} MB served from {self.root}"
+        )
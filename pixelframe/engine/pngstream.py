@@ -0,0 +1,182 @@
+"""
+Band-by-band PNG decoding and encoding.
+
+Pillow always decodes a PNG in one piece. For very tall full-page screenshots
+that means gigabytes of RGB data before a single pixel is compared. The reader
+here inflates the IDAT stream incrementally and hands Pillow one band of
+scanlines at a time, so peak memory follows the band height instead of the
+page height. The writer does the reverse for generated images.
+"""
+from PIL import Image
+import io
+import struct
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # Only PNGWriter needs numpy; callers check for it first
+    np = None
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 8-bit, non-interlaced colour types whose raw scanlines Pillow round-trips
+# byte for byte through tobytes(): PNG colour type -> (mode, bytes per pixel)
+_COLOR_TYPES = {0: ("L", 1), 2: ("RGB", 3), 3: ("P", 1), 4: ("LA", 2), 6: ("RGBA", 4)}
+
+# Upper bound on inflated bytes pulled from zlib per call, so a highly
+# compressible IDAT chunk cannot balloon the buffer past a band.
+_INFLATE_STEP = 1 << 20
+
+
+class UnsupportedPNG(ValueError):
+    """The file is not a PNG this module can stream (interlaced, 16-bit, ...)."""
+
+
+def _chunk(ctype, data):
+    return (
+        struct.pack(">I", len(data)) + ctype + data
+        + struct.pack(">I", zlib.crc32(ctype + data) & 0xFFFFFFFF)
+    )
+
+
+def _iter_chunks(f):
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        length, ctype = struct.unpack(">I4s", header)
+        data = f.read(length)
+        f.read(4)  # CRC; Pillow verifies the chunks we re-emit
+        yield ctype, data
+        if ctype == b"IEND":
+            return
+
+
+class PNGBandReader:
+    """Decode a PNG as consecutive bands of rows."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(8) != PNG_SIGNATURE:
+                raise UnsupportedPNG(f"{path} is not a PNG file")
+            ctype, data = next(_iter_chunks(f), (None, b""))
+        if ctype != b"IHDR":
+            raise UnsupportedPNG(f"{path} has no IHDR chunk")
+
+        width, height, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", data)
+        if depth != 8 or color not in _COLOR_TYPES or interlace:
+            raise UnsupportedPNG(f"{path}: only 8-bit non-interlaced PNGs can be streamed")
+
+        self.size = (width, height)
+        self._ihdr = data
+        self._mode, channels = _COLOR_TYPES[color]
+        self._row_bytes = width * channels
+
+    def bands(self, rows):
+        """Yield ``(y, image)`` for bands of ``rows`` rows (the last may be shorter)."""
+        width, height = self.size
+        stride = self._row_bytes + 1
+        inflate = zlib.decompressobj()
+        palette = []
+        buffer = bytearray()
+        previous = None
+        y = 0
+
+        def take(count):
+            nonlocal previous, y
+            raw = bytes(buffer[:count * stride])
+            del buffer[:count * stride]
+            image, previous = self._decode(raw, count, previous, palette)
+            band = (y, image)
+            y += count
+            return band
+
+        with open(self.path, "rb") as f:
+            f.read(len(PNG_SIGNATURE))
+            for ctype, data in _iter_chunks(f):
+                if ctype in (b"PLTE", b"tRNS"):
+                    palette.append(_chunk(ctype, data))
+                elif ctype == b"IDAT":
+                    while data:
+                        buffer += inflate.decompress(data, _INFLATE_STEP)
+                        data = inflate.unconsumed_tail
+                        while y < height and len(buffer) >= min(rows, height - y) * stride:
+                            yield take(min(rows, height - y))
+
+        buffer += inflate.flush()
+        while y < height and len(buffer) >= stride:
+            yield take(min(rows, height - y, len(buffer) // stride))
+        if y < height:
+            raise UnsupportedPNG(f"{self.path} is truncated ({y} of {height} rows)")
+
+    def _decode(self, raw, count, previous, palette):
+        """
+        Decode ``count`` filtered scanlines with Pillow's own unfilter code.
+
+        Up/Average/Paeth filters refer to the previous row, so the last row of
+        the previous band is prepended unfiltered (filter type 0) and cropped
+        off again after decoding.
+        """
+        width = self.size[0]
+        if previous is not None:
+            raw = b"\x00" + previous + raw
+            count += 1
+        png = b"".join([
+            PNG_SIGNATURE,
+            _chunk(b"IHDR", struct.pack(">II", width, count) + self._ihdr[8:]),
+            *palette,
+            _chunk(b"IDAT", zlib.compress(raw, 0)),
+            _chunk(b"IEND", b""),
+        ])
+        image = Image.open(io.BytesIO(png))
+        image.load()
+        if previous is not None:
+            image = image.crop((0, 1, width, count))
+        last_row = image.crop((0, image.height - 1, width, image.height)).tobytes()
+        return image, last_row
+
+
+class PNGWriter:
+    """Encode an 8-bit RGB PNG incrementally from (rows, width, 3) uint8 arrays."""
+
+    def __init__(self, path, width, height, compress_level=6):
+        self.size = (width, height)
+        self._file = open(path, "wb")
+        self._file.write(PNG_SIGNATURE)
+        self._file.write(_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        self._deflate = zlib.compressobj(compress_level)
+        self._pending = []
+        self._pending_bytes = 0
+        self._previous = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, rows):
+        """Append a band of rows, Up-filtered against the previous row."""
+        flat = np.ascontiguousarray(rows, dtype=np.uint8).reshape(rows.shape[0], -1)
+        filtered = np.empty((flat.shape[0], flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[0, 1:] = flat[0] if self._previous is None else flat[0] - self._previous
+        filtered[1:, 1:] = flat[1:] - flat[:-1]
+        self._previous = flat[-1].copy()
+        self._emit(self._deflate.compress(filtered.tobytes()))
+
+    def _emit(self, data, force=False):
+        if data:
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+        if self._pending and (force or self._pending_bytes >= 1 << 18):
+            self._file.write(_chunk(b"IDAT", b"".join(self._pending)))
+            self._pending, self._pending_bytes = [], 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._emit(self._deflate.flush(), force=True)
+        self._file.write(_chunk(b"IEND", b""))
+        self._file.close()
@@ -0,0 +1,147 @@
+import logging
+import time
+
+logger = logging.getLogger("pixelframe")
+
+# Runs in the page after 'load'. Waits for web fonts, decodes every eager image
+# and then watches a cheap layout signature until it is unchanged for N
+# consecutive animation frames. Every phase shares one deadline, so a page that
+# never settles costs at most `timeout` ms and is then captured as-is.
+SETTLE_SCRIPT = """
+async ({ fonts, images, frames, timeout }) => {
+  const deadline = performance.now() + timeout;
+  const remaining = () => Math.max(0, deadline - performance.now());
+  const within = (promise) => Promise.race([
+    promise.then((value) => value !== false, () => true),
+    new Promise((resolve) => setTimeout(() => resolve(false), remaining())),
+  ]);
+  const result = { fonts: true, images: true, stable: true };
+
+  if (fonts && document.fonts) {
+    result.fonts = await within(document.fonts.ready);
+  }
+
+  if (images) {
+    const pending = Array.from(document.images)
+      .filter((img) => (img.currentSrc || img.src) && !(img.loading === "lazy" && !img.complete))
+      .map((img) => img.decode().catch(() => null));
+    result.images = await within(Promise.all(pending));
+  }
+
+  if (frames > 0) {
+    const signature = () => {
+      const root = document.documentElement;
+      const body = document.body;
+      return [
+        root.scrollWidth,
+        root.scrollHeight,
+        body ? body.getBoundingClientRect().height : 0,
+        document.getElementsByTagName("*").length,
+      ].join(",");
+    };
+    result.stable = await within(new Promise((resolve) => {
+      let last = null;
+      let count = 0;
+      const tick = () => {
+        if (performance.now() >= deadline) return resolve(false);
+        const current = signature();
+        count = current === last ? count + 1 : 0;
+        last = current;
+        if (count >= frames) return resolve(true);
+        requestAnimationFrame(tick);
+      };
+      requestAnimationFrame(tick);
+    }));
+  }
+
+  return result;
+}
+"""
+
+
+def _plan(wait):
+    """Playwright waits to run before the settle script, as (label, method, args, kwargs)."""
+    steps = []
+    if wait.network_idle:
+        steps.append(("network idle", "wait_for_load_state", ("networkidle",), {}))
+    if wait.selector:
+        steps.append((f"selector {wait.selector!r}", "wait_for_selector", (wait.selector,), {"state": "visible"}))
+    if wait.predicate:
+        steps.append(("predicate", "wait_for_function", (wait.predicate,), {}))
+    return steps
+
+
+def _settle_args(wait, remaining_ms):
+    return {
+        "fonts": wait.fonts,
+        "images": wait.images,
+        "frames": wait.stable_frames,
+        "timeout": remaining_ms,
+    }
+
+
+def _needs_settle(wait):
+    return wait.fonts or wait.images or wait.stable_frames > 0
+
+
+def _report_settle(label, result):
+    unsettled = [k for k, ok in (result or {}).items() if not ok]
+    if unsettled:
+        logger.warning(f"PixelFrame Engine: {label} did not settle ({', '.join(unsettled)}); capturing anyway")
+
+
+def wait_for_ready(page, wait, label=""):
+    """
+    Block until ``page`` is ready to screenshot according to ``wait``.
+
+    Timeouts are logged and never fatal. Returns the time spent waiting in ms.
+    """
+    start = time.perf_counter()
+    deadline = start + wait.timeout / 1000
+
+    def remaining():
+        # Playwright treats a timeout of 0 as "wait forever"
+        return max(1, int((deadline - time.perf_counter()) * 1000))
+
+    for step, method, args, kwargs in _plan(wait):
+        try:
+            getattr(page, method)(*args, timeout=remaining(), **kwargs)
+        except Exception as e:
+            logger.warning(f"PixelFrame Engine: {label} wait for {step} gave up: {e}")
+
+    if _needs_settle(wait):
+        try:
+            _report_settle(label, page.evaluate(SETTLE_SCRIPT, _settle_args(wait, remaining())))
+        except Exception as e:
+            logger.warning(f"PixelFrame Engine: {label} settle check failed: {e}")
+
+    if wait.delay:
+        page.wait_for_timeout(wait.delay)
+
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+async def wait_for_ready_async(page, wait, label=""):
+    """Async variant of wait_for_ready for playwright.async_api pages."""
+    start = time.perf_counter()
+    deadline = start + wait.timeout / 1000
+
+    def remaining():
+        return max(1, int((deadline - time.perf_counter()) * 1000))
+
+    for step, method, args, kwargs in _plan(wait):
+        try:
+            await getattr(page, method)(*args, timeout=remaining(), **kwargs)
+        except Exception as e:
+            logger.warning(f"PixelFrame Engine: {label} wait for {step} gave up: {e}")
+
+    if _needs_settle(wait):
+        try:
+            _report_settle(label, await page.evaluate(SETTLE_SCRIPT, _settle_args(wait, remaining())))
+        except Exception as e:
+            logger.warning(f"PixelFrame Engine: {label} settle check failed: {e}")
+
+    if wait.delay:
+        await page.wait_for_timeout(wait.delay)
+
+    return round((time.perf_counter() - start) * 1000, 1)
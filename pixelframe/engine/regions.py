@@ -0,0 +1,87 @@
+"""
+Resolving diff masks and regions to pixel boxes at capture time.
+
+Selectors only mean something in the live page, so each one is resolved
+right before the screenshot, to the boxes of the elements it matches. The
+boxes are stored in the run's manifest with the screenshot, as
+``[x, y, width, height]`` in image pixels. ``diff run`` reads them back
+from there (see diff.DiffMask).
+"""
+from math import ceil, floor
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger("pixelframe")
+
+# Boxes per selector, in CSS pixels of the screenshot; null for an invalid selector
+_SCRIPT = """([selectors, fullPage]) => selectors.map((selector) => {
+    let elements;
+    try {
+        elements = document.querySelectorAll(selector);
+    } catch (e) {
+        return null;
+    }
+    const dx = fullPage ? scrollX : 0;
+    const dy = fullPage ? scrollY : 0;
+    const boxes = [];
+    for (const el of elements) {
+        const r = el.getBoundingClientRect();
+        if (r.width > 0 && r.height > 0) boxes.push([r.left + dx, r.top + dy, r.width, r.height]);
+    }
+    return boxes;
+})"""
+
+
+def _selectors(task) -> List[str]:
+    return list(dict.fromkeys(r.selector for r in task.mask + task.regions if r.selector))
+
+
+def _pixels(box, scale) -> Optional[list]:
+    """A CSS-pixel box as whole image pixels, grown to cover partly covered pixels."""
+    x, y, width, height = box
+    left, top = max(0, floor(x * scale)), max(0, floor(y * scale))
+    right, bottom = ceil((x + width) * scale), ceil((y + height) * scale)
+    if right <= left or bottom <= top:
+        return None
+    return [left, top, right - left, bottom - top]
+
+
+def _resolve(task, found) -> Optional[dict]:
+    if not task.mask and not task.regions:
+        return None
+    scale = task.breakpoint.device_scale_factor
+    resolved = {}
+    for key, regions in (("mask", task.mask), ("regions", task.regions)):
+        if not regions:
+            continue
+        boxes = []
+        for region in regions:
+            if region.rect:
+                css = [region.rect]
+            else:
+                css = found.get(region.selector)
+                if css is None:
+                    logger.warning(f"PixelFrame Engine: Invalid diff {key} selector '{region.selector}' on {task.label}")
+                    continue
+                if not css:
+                    logger.warning(f"PixelFrame Engine: Diff {key} selector '{region.selector}' matched nothing on {task.label}")
+            boxes += [b for b in (_pixels(box, scale) for box in css) if b]
+        resolved[key] = boxes
+    return resolved
+
+
+def resolve_regions(page, task) -> Optional[dict]:
+    """
+    ``{"mask": [...], "regions": [...]}`` boxes for ``task`` on a ready
+    playwright.sync_api page, or None when it has neither. A key is present
+    whenever the task configures it, even if nothing matched.
+    """
+    selectors = _selectors(task)
+    boxes = page.evaluate(_SCRIPT, [selectors, task.full_page]) if selectors else []
+    return _resolve(task, dict(zip(selectors, boxes)))
+
+
+async def resolve_regions_async(page, task) -> Optional[dict]:
+    selectors = _selectors(task)
+    boxes = await page.evaluate(_SCRIPT, [selectors, task.full_page]) if selectors else []
+    return _resolve(task, dict(zip(selectors, boxes)))
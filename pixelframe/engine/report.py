@@ -1,8 +1,25 @@
 from pathlib import Path
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
+from urllib.parse import quote, unquote
+from PIL import Image
 import base64
+import hashlib
+import json
 import logging
+import math
+import os
+import shutil
+import subprocess
+import sys
+
+from pixelframe.engine.capture import group_by_page
+from pixelframe.engine.config import resolve_pages
+from pixelframe.engine.diff import TILED_MIN_PIXELS, _image_size
+from pixelframe.engine.manifest import file_digest
+from pixelframe.engine.pngstream import PNGBandReader, UnsupportedPNG
+from pixelframe.engine.thumbcache import ThumbnailCache
+from pixelframe.engine.timing import span
 
 logger = logging.getLogger("pixelframe")
 
@@ -24,57 +41,276 @@ def _image_to_base64(image_path):
     return f"data:{mime};base64,{encoded}"
 
 
-def generate_report(config, run_path, composite_path, image_paths, browser_manager):
-    """Generate an HTML report and convert it to PDF."""
+# Target width of report thumbnails; the real width is the source width
+# divided by the nearest integer factor at or above it.
+THUMBNAIL_WIDTH = 640
+THUMBNAIL_VARIANT = f"report-w{THUMBNAIL_WIDTH}.jpg"
+
+
+def _relative_url(path, base_dir):
+    try:
+        rel = os.path.relpath(Path(path).resolve(), Path(base_dir).resolve())
+    except ValueError:  # Different drives on Windows
+        return Path(path).resolve().as_uri()
+    return quote(Path(rel).as_posix())
+
+
+def _reduced(path, factor):
+    """
+    Downscale an image by an integer ``factor`` with a box filter.
+
+    Very large PNGs are reduced band by band, so full-page screenshots that
+    Pillow would refuse to open whole (decompression-bomb guard) still get a
+    thumbnail without being decoded in one piece.
+    """
+    width, height = _image_size(path)
+    try:
+        if width * height <= TILED_MIN_PIXELS:
+            raise UnsupportedPNG("small enough to decode whole")
+        reader = PNGBandReader(path)
+    except UnsupportedPNG:
+        with Image.open(path) as img:
+            return img.convert("RGB").reduce(factor)
+
+    thumb = Image.new("RGB", (math.ceil(width / factor), math.ceil(height / factor)))
+    for y, band in reader.bands(factor * 64):
+        thumb.paste(band.convert("RGB").reduce(factor), (0, y // factor))
+    return thumb
+
+
+def _thumbnail(path, report_dir):
+    """
+    Write (or reuse) a JPEG thumbnail of ``path`` under ``report_dir/thumbs``.
+
+    Thumbnails are taken from the content-addressed ThumbnailCache when it
+    has one for the same file contents, e.g. from an earlier report on the
+    same baseline, and stored there otherwise.
+    """
+    source = Path(path).resolve()
+    key = hashlib.sha1(str(source).encode("utf-8")).hexdigest()[:12]
+    thumb_path = Path(report_dir) / "thumbs" / f"{key}-{source.stem}.jpg"
+    if thumb_path.exists() and thumb_path.stat().st_mtime_ns >= source.stat().st_mtime_ns:
+        return thumb_path
+    thumb_path.parent.mkdir(parents=True, exist_ok=True)
+
+    cache = ThumbnailCache.default()
+    digest = file_digest(source) if cache else None
+    cached = cache.lookup(digest, THUMBNAIL_VARIANT) if cache else None
+    if cached is None:
+        width = _image_size(source)[0]
+        thumb = _reduced(source, max(1, math.ceil(width / THUMBNAIL_WIDTH)))
+        cached = cache.store(thumb, digest, THUMBNAIL_VARIANT, quality=85) if cache else None
+        if cached is None:
+            thumb.save(thumb_path, "JPEG", quality=85)
+            return thumb_path
+    shutil.copyfile(cached, thumb_path)
+    return thumb_path
+
+
+def image_asset(image_path, report_dir, mode="linked"):
+    """
+    How a report in ``report_dir`` references ``image_path``.
+
+    Returns ``{"src": ..., "href": ...}`` for the templates' ``image`` macro;
+    ``href`` (the full-size image opened on click) is None for inline assets.
+    """
+    path = Path(image_path)
+    if mode == "inline":
+        return {"src": _image_to_base64(path), "href": None}
+    if not path.exists():
+        logger.warning(f"Image not found: {image_path}")
+        return {"src": "", "href": None}
+    href = _relative_url(path, report_dir)
+    if mode == "thumbnails":
+        try:
+            return {"src": _relative_url(_thumbnail(path, report_dir), report_dir), "href": href}
+        except Exception as e:
+            logger.warning(f"Could not create a thumbnail for {image_path}: {e}")
+    return {"src": href, "href": href}
+
+
+def rebase_asset(asset, old_dir, new_dir):
+    """
+    An image_asset() of a report in ``old_dir``, for a report in ``new_dir``.
+
+    Files inside ``old_dir`` are assumed to have been copied along to the same
+    place under ``new_dir``; anything else is referenced where it is.
+    """
+    if not asset:
+        return asset
+
+    def rebase(url):
+        if not url or ":" in url.split("/", 1)[0]:  # data: URIs and absolute file: URLs
+            return url
+        target = (Path(old_dir) / unquote(url)).resolve()
+        try:
+            target = Path(new_dir) / target.relative_to(Path(old_dir).resolve())
+        except ValueError:
+            pass
+        return _relative_url(target, new_dir)
+
+    return {**asset, "src": rebase(asset.get("src")), "href": rebase(asset.get("href"))}
+
+
+def render_html(config, run_path, composites, results):
+    """Render the HTML report and return the path it was written to."""
     templates_dir = Path(__file__).parent.parent / "templates"
     env = Environment(loader=FileSystemLoader(templates_dir))
     template = env.get_template("report.html")
 
-    # Build screenshot data with base64-encoded images
-    screenshots_data = []
-    for bp, img_path in zip(config.breakpoints, image_paths):
-        img_path = Path(img_path)
-        file_size_kb = round(img_path.stat().st_size / 1024, 1) if img_path.exists() else 0
-
-        screenshots_data.append({
-            "name": bp.name,
-            "width": bp.width,
-            "height": bp.height,
-            "path": _image_to_base64(img_path),
-            "file_size_kb": file_size_kb,
-        })
+    page_urls = {page.name: page.url for page in resolve_pages(config)}
 
-    composite_b64 = _image_to_base64(composite_path)
+    report_dir = run_path / "report"
+    report_dir.mkdir(exist_ok=True)
+    assets = config.report_assets
+
+    # Build screenshot data, one section per page
+    pages_data = []
+    for page_name, page_results in group_by_page(results).items():
+        screenshots_data = []
+        for result in page_results:
+            img_path = Path(result.path)
+            file_size_kb = round(img_path.stat().st_size / 1024, 1) if img_path.exists() else 0
+
+            screenshots_data.append({
+                "name": result.breakpoint.name,
+                "width": result.breakpoint.width,
+                "height": result.breakpoint.height,
+                "image": image_asset(img_path, report_dir, assets),
+                "file_size_kb": file_size_kb,
+            })
+
+        pages_data.append({
+            "name": page_name,
+            "url": page_urls.get(page_name, config.url),
+            # The composite is already downscaled; a thumbnail of it would be unreadable
+            "composite": image_asset(composites[page_name], report_dir, "linked" if assets == "thumbnails" else assets),
+            "screenshots": screenshots_data,
+        })
 
     html_content = template.render(
-        url=config.url,
+        url=config.url or pages_data[0]["url"],
         timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        composite_path=composite_b64,
-        screenshots=screenshots_data,
+        pages=pages_data,
+        screenshot_count=len(results),
     )
 
-    report_dir = run_path / "report"
-    report_dir.mkdir(exist_ok=True)
-
     html_file = report_dir / "report.html"
     html_file.write_text(html_content, encoding="utf-8")
+    return html_file
+
+
+# Lazy images below the fold are not fetched by the time the PDF is printed
+EAGER_IMAGES_SCRIPT = """
+() => Promise.all(Array.from(document.images).map((img) => {
+  img.loading = "eager";
+  return img.decode().catch(() => null);
+}))
+"""
+
+PDF_OPTIONS = {
+    "format": "A4",
+    "print_background": True,
+    "margin": {"top": "15mm", "bottom": "15mm", "left": "10mm", "right": "10mm"},
+}
+
+
+PDF_NAME = "pixelframe-report.pdf"
 
-    pdf_file = report_dir / "pixelframe-report.pdf"
 
-    # Use existing browser to generate PDF
+def render_json(config, run_path, composites, results):
+    """Write a machine-readable summary of the run next to the HTML report."""
+    page_urls = {page.name: page.url for page in resolve_pages(config)}
+    pages_data = []
+    for page_name, page_results in group_by_page(results).items():
+        pages_data.append({
+            "name": page_name,
+            "url": page_urls.get(page_name, config.url),
+            "composite": composites[page_name].relative_to(run_path).as_posix(),
+            "screenshots": [{
+                "breakpoint": r.breakpoint.name,
+                "width": r.breakpoint.width,
+                "height": r.breakpoint.height,
+                "device_scale_factor": r.breakpoint.device_scale_factor,
+                "path": Path(r.path).relative_to(run_path).as_posix(),
+                "file_size_kb": round(Path(r.path).stat().st_size / 1024, 1),
+                "wait_ms": r.wait_ms,
+                "capture_ms": r.capture_ms,
+                "encode_ms": r.encode_ms,
+            } for r in page_results],
+        })
+
+    json_file = run_path / "report" / "report.json"
+    json_file.parent.mkdir(exist_ok=True)
+    json_file.write_text(json.dumps({
+        "url": config.url or pages_data[0]["url"],
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "screenshot_count": len(results),
+        "pages": pages_data,
+    }, indent=2), encoding="utf-8")
+    return json_file
+
+
+def render_pdf(html_file, browser_manager):
+    """
+    Print ``html_file`` to PDF with a started BrowserManager.
+
+    Errors are raised, so ``pixelframe report render`` (and the background
+    process that runs it) exits non-zero when no PDF was written.
+    """
+    pdf_file = html_file.parent / PDF_NAME
+
     page = browser_manager.browser.new_page()
     try:
-        page.goto(html_file.resolve().as_uri(), wait_until="networkidle")
-        page.pdf(
-            path=str(pdf_file),
-            format="A4",
-            print_background=True,
-            margin={"top": "15mm", "bottom": "15mm", "left": "10mm", "right": "10mm"},
-        )
+        with span("report.pdf"):
+            page.goto(html_file.resolve().as_uri(), wait_until="networkidle")
+            page.evaluate(EAGER_IMAGES_SCRIPT)
+            page.pdf(path=str(pdf_file), **PDF_OPTIONS)
         logger.info(f"PDF report saved to {pdf_file}")
-    except Exception as e:
-        logger.error(f"Failed to generate PDF: {e}")
     finally:
         page.close()
 
-    return pdf_file
\ No newline at end of file
+    return pdf_file
+
+
+def _spawn_pdf_render(run_path):
+    """Print the PDF from a detached `pixelframe report render` process."""
+    log_file = run_path / "report" / "pdf-render.log"
+    with open(log_file, "w", encoding="utf-8") as log:
+        subprocess.Popen(
+            [sys.executable, "-m", "pixelframe.cli.main", "report", "render", str(run_path), "--format", "pdf"],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    return log_file
+
+
+def generate_report(config, run_path, composites, results, defer_pdf=False):
+    """
+    Write the reports listed in ``config.report_formats``.
+
+    ``composites`` maps each page name to its composite grid and ``results``
+    are the CaptureResults returned by capture_screenshots. HTML and JSON are
+    written immediately. A PDF is printed from the HTML by a background
+    process, or left for ``pixelframe report render`` when ``defer_pdf`` is
+    set, so capture never waits on it. Returns ``{format: path}``.
+    """
+    formats = config.report_formats
+    outputs = {}
+    if "html" in formats or "pdf" in formats:
+        with span("report.html"):
+            outputs["html"] = render_html(config, run_path, composites, results)
+    if "json" in formats:
+        with span("report.json"):
+            outputs["json"] = render_json(config, run_path, composites, results)
+    if "pdf" in formats:
+        outputs["pdf"] = run_path / "report" / PDF_NAME
+        if defer_pdf:
+            logger.info(f"PDF report deferred; run `pixelframe report render {run_path}` to create it")
+        else:
+            with span("report.pdf.spawn"):
+                log_file = _spawn_pdf_render(run_path)
+            logger.info(f"PDF report rendering in the background (log: {log_file})")
+    return outputs
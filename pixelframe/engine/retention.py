@@ -0,0 +1,211 @@
+"""
+Retention policies and garbage collection for an output directory.
+
+Runs are expired by policy and removed whole. The object store is then swept
+mark-and-sweep style: every object named by a surviving run's manifest is
+marked, and unmarked objects no run links to any more are deleted.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, List
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+
+from pixelframe.engine.manifest import MANIFEST_NAME
+from pixelframe.engine.store import ObjectStore
+
+logger = logging.getLogger("pixelframe")
+
+# Marker file that exempts a run (e.g. the baseline) from garbage collection
+PIN_NAME = ".pinned"
+RUN_PREFIX = "run-"
+RUN_TIME_FORMAT = "%Y-%m-%d-%H%M%S"
+# Length of a formatted run time; sharded runs append a suffix after it
+_RUN_TIME_LENGTH = len("2000-01-01-000000")
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*$", re.IGNORECASE)
+_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+@dataclass
+class Run:
+    path: Path
+    created: datetime
+    pinned: bool = False
+
+
+@dataclass
+class GCResult:
+    deleted: List[Path] = field(default_factory=list)
+    kept: List[Path] = field(default_factory=list)
+    run_bytes: int = 0
+    objects_deleted: int = 0
+    object_bytes: int = 0
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.run_bytes + self.object_bytes
+
+
+def parse_duration(value) -> timedelta:
+    """Parse an age such as '36h', '7d' or '2w'."""
+    match = _DURATION.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid duration '{value}'. Use a number followed by s, m, h, d or w (e.g. 7d).")
+    return timedelta(**{_UNITS[match.group(2).lower()]: float(match.group(1))})
+
+
+def _run_time(entry) -> datetime:
+    stamp = entry.name[len(RUN_PREFIX):len(RUN_PREFIX) + _RUN_TIME_LENGTH]
+    try:
+        return datetime.strptime(stamp, RUN_TIME_FORMAT)
+    except ValueError:
+        return datetime.fromtimestamp(entry.stat().st_mtime)
+
+
+def list_runs(output_dir) -> List[Run]:
+    """Every ``run-*`` directory in ``output_dir``, oldest first, from a single directory scan."""
+    runs = []
+    try:
+        entries = list(os.scandir(output_dir))
+    except FileNotFoundError:
+        return runs
+    for entry in entries:
+        if entry.name.startswith(RUN_PREFIX) and entry.is_dir(follow_symlinks=False):
+            path = Path(entry.path)
+            runs.append(Run(path, _run_time(entry), (path / PIN_NAME).exists()))
+    return sorted(runs, key=lambda r: (r.created, r.path.name))
+
+
+def pin(run_path, note=""):
+    (Path(run_path) / PIN_NAME).write_text(note or f"pinned {datetime.now().isoformat(timespec='seconds')}\n", encoding="utf-8")
+
+
+def unpin(run_path):
+    (Path(run_path) / PIN_NAME).unlink(missing_ok=True)
+
+
+def select_expired(runs, keep_last=None, keep_newer_than=None, keep: Iterable = (), now=None) -> List[Run]:
+    """
+    The runs no retention rule keeps.
+
+    A run is kept when it is pinned, listed in ``keep``, among the newest
+    ``keep_last`` runs, or younger than ``keep_newer_than``.
+    """
+    now = now or datetime.now()
+    keep = {Path(p).resolve() for p in keep}
+    newest = {r.path for r in runs[-keep_last:]} if keep_last else set()
+    expired = []
+    for run in runs:
+        if run.pinned or run.path in newest or run.path.resolve() in keep:
+            continue
+        if keep_newer_than is not None and now - run.created < keep_newer_than:
+            continue
+        expired.append(run)
+    return expired
+
+
+def _tally_links(path, inodes=None) -> dict:
+    """Count the links to each file under ``path``: (st_dev, st_ino) -> [links seen, st_nlink, size]."""
+    inodes = {} if inodes is None else inodes
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            _tally_links(entry.path, inodes)
+        else:
+            # os.stat, not DirEntry.stat: the latter reports no link count or inode on Windows
+            st = os.stat(entry.path, follow_symlinks=False)
+            inodes.setdefault((st.st_dev, st.st_ino), [0, st.st_nlink, st.st_size])[0] += 1
+    return inodes
+
+
+def _freed_bytes(inodes) -> int:
+    """
+    Bytes freed by deleting every tallied link: a file counts once, and only
+    if no link to it is left outside the deleted runs (e.g. in the store).
+    """
+    return sum(size for seen, nlink, size in inodes.values() if seen >= nlink)
+
+
+def _objects(path) -> List[str]:
+    """Object keys the run's manifest links to."""
+    try:
+        data = json.loads((Path(path) / "screenshots" / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+    return [entry["object"] for entry in data.get("files", {}).values() if entry.get("object")]
+
+
+def _remove_tree(path):
+    def clear_readonly(func, target, _):
+        # Store links are read-only, which Windows refuses to delete
+        os.chmod(target, stat.S_IWRITE)
+        func(target)
+    shutil.rmtree(path, onerror=clear_readonly)
+
+
+def _sweep(objects_dir, marked, released, dry_run):
+    """
+    Delete unmarked objects that nothing links to any more.
+
+    ``released`` counts the links the deleted runs held, so a dry run can
+    tell which objects would become unreferenced.
+    """
+    count = size = 0
+    if not objects_dir.is_dir():
+        return count, size
+    for prefix in os.scandir(objects_dir):
+        if not prefix.is_dir(follow_symlinks=False):
+            continue
+        for entry in os.scandir(prefix.path):
+            if entry.name in marked or not entry.is_file(follow_symlinks=False):
+                continue
+            st = os.stat(entry.path)
+            # Links not accounted for belong to runs or copies we don't know about
+            if st.st_nlink - (released[entry.name] if dry_run else 0) > 1:
+                continue
+            count += 1
+            size += st.st_size
+            if not dry_run:
+                os.chmod(entry.path, stat.S_IWRITE | stat.S_IREAD)
+                os.unlink(entry.path)
+    return count, size
+
+
+def collect(output_dir, keep_last=None, keep_newer_than=None, keep: Iterable = (), dry_run=False) -> GCResult:
+    """Delete expired runs in ``output_dir``, then sweep its object store."""
+    runs = list_runs(output_dir)
+    expired = select_expired(runs, keep_last, keep_newer_than, keep)
+    expired_paths = {r.path for r in expired}
+    result = GCResult(kept=[r.path for r in runs if r.path not in expired_paths])
+
+    released = Counter()
+    inodes = {}
+    for run in expired:
+        try:
+            links = _tally_links(run.path)
+            objects = _objects(run.path)
+            if not dry_run:
+                _remove_tree(run.path)
+            result.deleted.append(run.path)
+        except OSError as e:
+            logger.warning(f"PixelFrame Engine: Could not remove {run.path}: {e}")
+            result.kept.append(run.path)
+            continue
+        released.update(objects)
+        for key, (seen, nlink, size) in links.items():
+            # Runs deleted earlier lowered st_nlink; the first count is the full one
+            total = inodes.setdefault(key, [0, nlink, size])
+            total[0] += seen
+            total[1] = max(total[1], nlink)
+    result.run_bytes = _freed_bytes(inodes)
+
+    marked = {key for path in result.kept for key in _objects(path)}
+    objects_dir = ObjectStore.for_output(output_dir).root
+    result.objects_deleted, result.object_bytes = _sweep(objects_dir, marked, released, dry_run)
+    return result
@@ -1,12 +1,13 @@
 from pathlib import Path
 from datetime import datetime
 
-def create_run_directory(base_output: str) -> Path:
+def create_run_directory(base_output: str, suffix: str = "") -> Path:
     base_path = Path(base_output)
     base_path.mkdir(parents=True, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y-%m-%d-%H%M%S")
-    run_path = base_path / f"run-{timestamp}"
+    # Shards started in the same second get their own directories
+    run_path = base_path / f"run-{timestamp}{suffix}"
     
     (run_path / "screenshots").mkdir(parents=True, exist_ok=True)
     (run_path / "composite").mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,94 @@
+"""
+Splitting capture and diff work across CI nodes.
+
+With ``--shard i/N`` each node handles a stable share of the screenshots.
+Units are named like diff results (``page/breakpoint``, or ``breakpoint`` for
+single-URL runs) and assigned longest-first: the heaviest unit goes to the
+least-loaded shard, and ties go to the lowest index. Units without a known
+weight count as the average of those with one.
+
+Every node must compute the same assignment, so weights come only from
+inputs all nodes share: the capture times of a run passed explicitly with
+``--shard-timings``, or the sizes of the screenshots being diffed. A node's
+local run history is never used, since another node may not have it. ``pixelframe merge`` checks that the shards
+it combines cover every unit exactly once.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pixelframe.engine.manifest import RunManifest
+
+
+def unit_name(key) -> str:
+    """The shard unit (and diff result) name of a screenshot path relative to ``screenshots/``."""
+    return Path(key).with_suffix("").as_posix()
+
+
+def assign(weights: Dict[str, Optional[float]], count) -> List[List[str]]:
+    """Split the units in ``weights`` into ``count`` shards of about equal total weight."""
+    known = [w for w in weights.values() if w]
+    default = sum(known) / len(known) if known else 1.0
+    loads = [0.0] * count
+    shards = [[] for _ in range(count)]
+    for name in sorted(weights, key=lambda n: (-(weights[n] or default), n)):
+        target = min(range(count), key=lambda i: (loads[i], i))
+        shards[target].append(name)
+        loads[target] += weights[name] or default
+    return [sorted(names) for names in shards]
+
+
+def select(names, shard, weights=None) -> set:
+    """The subset of ``names`` that belongs to ``shard``."""
+    weights = weights or {}
+    return set(assign({name: weights.get(name) for name in names}, shard.count)[shard.index - 1])
+
+
+def capture_weights(run_path) -> Dict[str, float]:
+    """Capture time per unit recorded by an earlier run, or {} if there is none."""
+    if run_path is None:
+        return {}
+    manifest = RunManifest(Path(run_path) / "screenshots")
+    return {
+        unit_name(key): entry["capture_ms"]
+        for key, entry in manifest.files.items() if entry.get("capture_ms")
+    }
+
+
+def shard_info(shard, units, total) -> dict:
+    """What a sharded run or diff records about its share of ``total`` units, for ``pixelframe merge``."""
+    return {"index": shard.index, "count": shard.count, "total": total, "units": sorted(units)}
+
+
+def check_coverage(infos) -> List[str]:
+    """
+    Problems with a set of shards to merge: missing or repeated shards, and
+    units claimed by several shards or by none (nodes that saw different
+    weights). ``infos`` are shard_info() dicts, or None for inputs that were
+    not sharded.
+    """
+    infos = [info for info in infos if info]
+    if not infos:
+        return []
+    problems = []
+    counts = {info["count"] for info in infos}
+    if len(counts) > 1:
+        problems.append(f"shards come from different splits ({', '.join(f'/{c}' for c in sorted(counts))})")
+    count = max(counts)
+    seen = [info["index"] for info in infos]
+    missing = sorted(set(range(1, count + 1)) - set(seen))
+    repeated = sorted({i for i in seen if seen.count(i) > 1})
+    if missing:
+        problems.append(f"missing shard(s) {', '.join(f'{i}/{count}' for i in missing)}")
+    if repeated:
+        problems.append(f"shard(s) given more than once: {', '.join(f'{i}/{count}' for i in repeated)}")
+    owners = {}
+    for info in infos:
+        for unit in info["units"]:
+            owners.setdefault(unit, set()).add(info["index"])
+    overlapping = sorted(unit for unit, shards in owners.items() if len(shards) > 1)
+    if overlapping:
+        problems.append(f"{len(overlapping)} screenshot(s) assigned to several shards, e.g. {overlapping[0]}")
+    total = max(info.get("total", 0) for info in infos)
+    if not missing and len(owners) < total:
+        problems.append(f"{total - len(owners)} screenshot(s) assigned to no shard")
+    return problems
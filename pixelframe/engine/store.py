@@ -0,0 +1,101 @@
+"""
+Content-addressed store for screenshots shared by every run in an output directory.
+
+Each distinct screenshot is kept once as ``<output>/objects/<sha256[:2]>/<sha256>.<ext>``.
+A run's ``screenshots/`` entries are hard links to those objects, so unchanged
+breakpoints cost no extra disk space. Diffing, compositing and reporting still
+read ordinary paths, and the run manifest records which object each one is.
+"""
+from pathlib import Path
+from typing import Optional
+import logging
+import os
+import shutil
+import stat
+
+logger = logging.getLogger("pixelframe")
+
+OBJECTS_DIR = "objects"
+
+
+class ObjectStore:
+    """Screenshots stored once by sha256 under ``root``."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.added = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+        self._linkable = True
+
+    @classmethod
+    def for_output(cls, output_dir) -> "ObjectStore":
+        return cls(Path(output_dir) / OBJECTS_DIR)
+
+    @staticmethod
+    def key(digest, suffix) -> str:
+        """The object name recorded in run manifests, e.g. ``<sha256>.png``."""
+        return f"{digest}{suffix.lower()}"
+
+    def path(self, key) -> Path:
+        return self.root / key[:2] / key
+
+    def put(self, path, digest) -> Optional[str]:
+        """
+        Move the file at ``path`` into the store and leave a hard link in its place.
+
+        If the object already exists, ``path`` is replaced by a link to it. Returns
+        the object key, or None if this filesystem cannot hard-link, in which
+        case the file stays a plain copy.
+        """
+        if not self._linkable:
+            return None
+        path = Path(path)
+        key = self.key(digest, path.suffix)
+        obj = self.path(key)
+        try:
+            if obj.exists():
+                size = path.stat().st_size
+                tmp = path.with_name(f".{path.name}.link")
+                tmp.unlink(missing_ok=True)
+                os.link(obj, tmp)
+                tmp.replace(path)
+                self.deduplicated += 1
+                self.bytes_saved += size
+            else:
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                os.link(path, obj)
+                # Objects are shared between runs: never let a write to one run's file change another's
+                os.chmod(obj, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+                self.added += 1
+        except FileExistsError:
+            # Another process stored the same object first; link to theirs
+            return self.put(path, digest)
+        except OSError as e:
+            self._linkable = False
+            logger.warning(f"PixelFrame Engine: Cannot hard-link into {self.root}, keeping plain copies: {e}")
+            return None
+        return key
+
+    def contains(self, key) -> bool:
+        return self.path(key).is_file()
+
+
+def same_object(path1, path2) -> bool:
+    """True when both paths are links to the same stored file."""
+    try:
+        return os.path.samefile(path1, path2)
+    except OSError:
+        return False
+
+
+
+def link_or_copy(source, target):
+    """Hard-link ``source`` to ``target`` (replacing it), or copy it where links are not possible."""
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
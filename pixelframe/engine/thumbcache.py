@@ -0,0 +1,134 @@
+"""
+Content-addressed cache of downscaled screenshots.
+
+Composite tiles and report thumbnails are keyed by the sha256 of the source
+file plus a variant name that encodes how they were made, so a screenshot
+that has not changed (a baseline, an unchanged breakpoint in a rerun) is
+scaled once and reused by every later composite and report.
+"""
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+import logging
+import os
+import time
+
+logger = logging.getLogger("pixelframe")
+
+# Where the cache lives; "off" disables it
+CACHE_ENV = "PIXELFRAME_CACHE_DIR"
+# Bump when thumbnail rendering changes, so stale entries are not reused
+THUMBS_VERSION = 1
+
+# `pixelframe runs gc` deletes thumbnails unused for this long, then the least
+# recently used ones until the cache fits in THUMBS_MAX_BYTES
+THUMBS_MAX_AGE = timedelta(days=30)
+THUMBS_MAX_BYTES = 1 << 30
+
+_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP"}
+
+_shared = {}
+
+
+def user_cache_dir() -> Path:
+    """The platform's per-user cache directory for PixelFrame."""
+    if os.name == "nt":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / "pixelframe"
+
+
+def cache_root() -> Optional[Path]:
+    """The cache directory from $PIXELFRAME_CACHE_DIR or the platform default, or None if disabled."""
+    configured = os.environ.get(CACHE_ENV)
+    if configured:
+        return None if configured.lower() == "off" else Path(configured)
+    return user_cache_dir()
+
+
+class ThumbnailCache:
+    """
+    Thumbnails stored as ``thumbs/<sha256[:2]>/<sha256>-v<N>-<variant>``.
+
+    ``variant`` names the recipe and ends in the file extension, e.g.
+    ``grid-500x800.png``. A cache that cannot be written to only warns, and
+    callers fall back to using the image they just built. A hit refreshes the
+    entry's mtime, which prune() reads as its last use.
+    """
+
+    def __init__(self, root=None):
+        self.directory = Path(root or cache_root()) / "thumbs"
+        self._writable = True
+
+    @classmethod
+    def default(cls) -> Optional["ThumbnailCache"]:
+        """The shared cache at ``cache_root()``, or None if caching is disabled."""
+        root = cache_root()
+        if root is None:
+            return None
+        if root not in _shared:
+            _shared[root] = cls(root)
+        return _shared[root]
+
+    def path(self, digest, variant) -> Path:
+        return self.directory / digest[:2] / f"{digest}-v{THUMBS_VERSION}-{variant}"
+
+    def lookup(self, digest, variant) -> Optional[Path]:
+        path = self.path(digest, variant)
+        if not path.is_file():
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def store(self, image, digest, variant, **save_options) -> Optional[Path]:
+        """Save ``image`` under its key; returns the cached path, or None if the cache is not writable."""
+        if not self._writable:
+            return None
+        path = self.path(digest, variant)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            image.save(tmp, format=_FORMATS.get(path.suffix.lower()), **save_options)
+            tmp.replace(path)
+            return path
+        except OSError as e:
+            self._writable = False
+            logger.warning(f"PixelFrame Engine: Thumbnail cache {self.directory} is not writable, not caching: {e}")
+            tmp.unlink(missing_ok=True)
+            return None
+
+    def prune(self, max_age=THUMBS_MAX_AGE, max_bytes=THUMBS_MAX_BYTES, dry_run=False) -> Tuple[int, int]:
+        """
+        Delete entries unused for longer than ``max_age``, then the least
+        recently used ones until the rest fit in ``max_bytes``; either limit
+        may be None. Returns the number of files and bytes deleted.
+        """
+        entries = []
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        cutoff = time.time() - max_age.total_seconds() if max_age is not None else None
+        remaining = sum(size for _, size, _ in entries)
+        files = freed = 0
+        for mtime, size, path in entries:
+            expired = cutoff is not None and mtime < cutoff
+            if not expired and (max_bytes is None or remaining <= max_bytes):
+                break
+            try:
+                if not dry_run:
+                    path.unlink()
+            except OSError as e:
+                logger.warning(f"PixelFrame Engine: Could not remove cached thumbnail {path}: {e}")
+                continue
+            files += 1
+            freed += size
+            remaining -= size
+        return files, freed
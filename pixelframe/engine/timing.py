@@ -0,0 +1,142 @@
+"""
+Per-stage timing spans for capture and diff runs.
+
+Instrumented code wraps each stage in ``span(...)``. Nothing is recorded
+unless a Timings recorder is active (see ``record``), so library callers pay
+only for a global lookup. Spans use ``time.perf_counter``, which is a
+system-wide monotonic clock on Linux, macOS and Windows, so spans recorded in
+diff worker processes line up with the parent's.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import json
+import os
+import threading
+import time
+
+TIMINGS_NAME = "timings.json"
+TRACE_NAME = "trace.json"
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    duration: float
+    # Row the span is drawn on in a trace: a breakpoint label, or the thread name
+    track: str
+    pid: int = 0
+    args: Dict = field(default_factory=dict)
+
+
+class Timings:
+    """Thread-safe collector of Spans."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end, track=None, **args):
+        span = Span(name, start, end - start, track or threading.current_thread().name, os.getpid(), args)
+        with self._lock:
+            self.spans.append(span)
+
+    def extend(self, spans):
+        with self._lock:
+            self.spans.extend(spans)
+
+    def summary(self) -> Dict:
+        """Per-stage count, total and max in ms, plus the wall time so far."""
+        stages = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] += span.duration * 1000
+            stage["max_ms"] = max(stage["max_ms"], span.duration * 1000)
+        for stage in stages.values():
+            stage["total_ms"] = round(stage["total_ms"], 1)
+            stage["max_ms"] = round(stage["max_ms"], 1)
+        return {"wall_ms": round((time.perf_counter() - self.origin) * 1000, 1), "stages": stages}
+
+    def write(self, path):
+        """Write the summary and every span (ms relative to the start) as JSON."""
+        data = self.summary()
+        data["spans"] = [{
+            "name": s.name,
+            "track": s.track,
+            "start_ms": round((s.start - self.origin) * 1000, 3),
+            "duration_ms": round(s.duration * 1000, 3),
+            **({"args": s.args} if s.args else {}),
+        } for s in sorted(self.spans, key=lambda s: s.start)]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        return path
+
+    def write_chrome_trace(self, path):
+        """Write the spans in Chrome's Trace Event format (chrome://tracing, Perfetto)."""
+        tracks = {}
+        events = []
+        for s in sorted(self.spans, key=lambda s: s.start):
+            tid = tracks.setdefault((s.pid, s.track), len(tracks) + 1)
+            events.append({
+                "name": s.name,
+                "cat": s.name.split(".")[0],
+                "ph": "X",
+                "ts": round((s.start - self.origin) * 1e6, 1),
+                "dur": round(s.duration * 1e6, 1),
+                "pid": s.pid,
+                "tid": tid,
+                "args": s.args,
+            })
+        for (pid, track), tid in tracks.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": track}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+
+_active: Optional[Timings] = None
+
+# Track inherited by nested spans that don't name their own. A ContextVar
+# rather than a thread-local, so interleaved asyncio captures keep theirs.
+_track: ContextVar[Optional[str]] = ContextVar("pixelframe_track", default=None)
+
+
+def record() -> Timings:
+    """Start recording spans into a fresh Timings and return it."""
+    global _active
+    _active = Timings()
+    return _active
+
+
+def stop():
+    global _active
+    _active = None
+
+
+def active() -> Optional[Timings]:
+    return _active
+
+
+@contextmanager
+def span(name, track=None, **args):
+    """
+    Time the enclosed block as stage ``name`` if a recorder is active.
+
+    ``track`` (e.g. a breakpoint label) also applies to spans nested inside.
+    """
+    recorder = _active
+    if recorder is None:
+        yield
+        return
+    token = _track.set(track) if track else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add(name, start, time.perf_counter(), track or _track.get(), **args)
+        if token is not None:
+            _track.reset(token)